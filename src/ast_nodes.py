@@ -2,7 +2,10 @@ from typing import List
 
 
 class Node:
-    pass
+    # source position (tokenizer.SourceLocation) of the first token, set by the parser;
+    # compound nodes also get `end_loc` -- position of the closing word (`then`, `until`, `next`, `;`)
+    loc = None
+    end_loc = None
 
 
 class UnitItem(Node):
@@ -94,12 +97,13 @@ class Variable(Declaration):
 
 
 class StringLiteral(Declaration):
-    def __init__(self, ident: Ident, string: String):
+    def __init__(self, ident: Ident, string: String, packed: bool = False):
         self.ident = ident
         self.string = string
+        self.packed = packed
 
     def __repr__(self):
-        return f"StringLiteral(ident={self.ident}, string={self.string})"
+        return f"StringLiteral(ident={self.ident}, string={self.string}, packed={self.packed})"
 
 
 class Const(Declaration):
@@ -0,0 +1,56 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Callable, Iterable
+
+from image import ProgramImage, SharedImage, SharedHandle, attach_image
+
+
+# runner(image, run_input) -> {"output": ..., "ticks": int, "status": str}
+Runner = Callable[[ProgramImage, Any], Dict[str, Any]]
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+_worker_image: ProgramImage = None
+_worker_segments = None
+
+
+def _attach_worker(handle: SharedHandle):
+    global _worker_image, _worker_segments
+    _worker_image, _worker_segments = attach_image(handle)
+
+
+def _run_one(job) -> Dict[str, Any]:
+    index, runner, run_input = job
+    try:
+        result = dict(runner(_worker_image, run_input))
+        result.setdefault("status", STATUS_OK)
+    except Exception as error:
+        result = {"output": None, "ticks": None, "status": f"{STATUS_ERROR}: {error}"}
+
+    result["index"] = index
+    return result
+
+
+def run_batch(image: ProgramImage, inputs: Iterable[Any], runner: Runner,
+              processes: int = None, chunksize: int = 1) -> List[Dict[str, Any]]:
+    """Запускает одну программу на множестве входных данных в пуле процессов.
+
+    Образ загружается и декодируется один раз и передаётся процессам через
+    разделяемую память. `runner` должен быть функцией уровня модуля (pickle).
+    Результаты возвращаются в порядке `inputs`; ошибка одного запуска
+    попадает в его `status` и не прерывает остальные.
+    """
+    jobs = [(index, runner, run_input) for index, run_input in enumerate(inputs)]
+    if not jobs:
+        return []
+
+    processes = processes or os.cpu_count() or 1
+
+    with SharedImage(image) as shared:
+        with ProcessPoolExecutor(
+            max_workers=min(processes, len(jobs)),
+            initializer=_attach_worker,
+            initargs=(shared.handle,),
+        ) as pool:
+            return list(pool.map(_run_one, jobs, chunksize=chunksize))
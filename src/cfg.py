@@ -0,0 +1,374 @@
+"""Граф потока управления и анализ потоков данных над кодом `Emitter`.
+
+Граф строится по инструкциям транслятора до разрешения меток (`Emitter.code`,
+`label_index`, `patches`), поэтому годится и для кода модуля, и для
+скомпонованной программы. Базовый блок начинается с метки, с начала кода или
+после перехода/`ret`/`iret`/`halt`; блоки обозначаются индексом первой инструкции.
+
+- условный переход и `loop` -- ребро на цель и ребро дальше по коду
+- `jmp` -- ребро на цель; переход на метку вне кода -- выход из кода
+- вызов (`push_rs #L_ret` + `jmp proc`, `L_ret` сразу за переходом) -- ребро на `L_ret`,
+  вызываемая процедура записывается в блок; переход на начало одной из `procedures` --
+  хвостовой вызов (выход)
+- `ret`, `iret` -- выход, `halt` -- конец программы
+
+Анализ задаётся шагом по одной инструкции, функцией слияния и значением на
+границе (на входах для прямого анализа, на выходах для обратного) и решается
+итеративно по списку блоков (`solve`). Готовые анализы -- живые регистры
+(`liveness`) и достигающие определения (`reaching_definitions`) для EAX..EFX и DR;
+SP и RP (указатели стеков) не отслеживаются. Асинхронный вход в обработчик
+прерывания не учитывается: `iret` восстанавливает EAX..EFX.
+
+Вызываемая процедура по умолчанию непрозрачна (`OPAQUE_CALL`): может читать и
+менять любой регистр. Процедуры транслятора передают значения через стек данных,
+но вынесенные подпрограммы (`outliner.py`) работают с регистрами вызывающего кода.
+"""
+
+from collections import deque
+from typing import List, Dict, Any, Tuple, Optional, Set, FrozenSet, NamedTuple, Callable, Iterable
+
+from isa import Opcode, Register, JUMP_OPS, STRING_OUT_OPS, opcode_uses_rs1, opcode_uses_rs2
+from definitions import *
+from codegen import Emitter
+
+
+REGISTERS: FrozenSet[Register] = frozenset(
+    (Register.EAX, Register.EBX, Register.ECX, Register.EDX, Register.EFX, Register.DR)
+)
+SAVED_REGISTERS: FrozenSet[Register] = REGISTERS - {Register.DR}  # restored by `iret`
+
+END_OPS = {Opcode.JMP, Opcode.RET, Opcode.IRET, Opcode.HALT}
+EXIT_OPS = {Opcode.RET, Opcode.IRET}
+
+# opcodes that write the rd register (rd of the others is an address)
+WRITES_RD = {
+    Opcode.MOV, Opcode.ADD, Opcode.ADC, Opcode.SUB, Opcode.MUL, Opcode.DIV, Opcode.MOD,
+    Opcode.AND, Opcode.OR, Opcode.XOR, Opcode.NEG, Opcode.NOT,
+    Opcode.SHL, Opcode.SHR, Opcode.SAR, Opcode.POP_DS, Opcode.POP_RS, Opcode.LDB,
+}
+READS_RD = {Opcode.MOVS, Opcode.FILLS, Opcode.STB}
+
+
+class RegisterEffect(NamedTuple):
+    uses: FrozenSet[Register]
+    defs: FrozenSet[Register]                   # always written
+    clobbers: FrozenSet[Register] = frozenset()  # may be written
+
+
+OPAQUE_CALL = RegisterEffect(REGISTERS, frozenset(), REGISTERS)
+
+
+def register_effect(instruction: Dict[str, Any]) -> RegisterEffect:
+    """Регистры, которые инструкция читает и пишет (вызов здесь -- обычный `jmp`)"""
+    opcode = instruction["opcode"]
+    uses: Set[Register] = set()
+    defs: Set[Register] = set()
+
+    def operand(field: str, addr_field: str) -> Optional[Register]:
+        if instruction.get(addr_field, REG_TO_REG_ADDR_T) == IMMEDIATE_ADDR_T:
+            return None
+        return instruction.get(field)
+
+    rd = operand(DST_REG, DST_REG_ADDR_T)
+    if rd is not None and (opcode in WRITES_RD or opcode in READS_RD):
+        if opcode in WRITES_RD and instruction.get(DST_REG_ADDR_T, REG_TO_REG_ADDR_T) == REG_TO_REG_ADDR_T:
+            defs.add(rd)
+        else:
+            uses.add(rd)  # address of the destination
+    if opcode_uses_rs1(opcode) or opcode in STRING_OUT_OPS:
+        uses.add(operand(SRC1_REG, SRC1_REG_ADDR_T))
+    if opcode_uses_rs2(opcode) and opcode not in (Opcode.NEG, Opcode.NOT):
+        uses.add(operand(SRC2_REG, SRC2_REG_ADDR_T))
+
+    if opcode == Opcode.OUT:
+        uses.add(Register.DR)
+    elif opcode == Opcode.IN:
+        defs.add(Register.DR)
+    elif opcode == Opcode.IRET:
+        defs |= SAVED_REGISTERS
+
+    return RegisterEffect(frozenset(uses) & REGISTERS, frozenset(defs) & REGISTERS)
+
+
+class Block(NamedTuple):
+    start: int                      # index of the first instruction
+    end: int                        # index after the last instruction
+    labels: Tuple[str, ...]
+    successors: Tuple[int, ...]
+    predecessors: Tuple[int, ...]
+    callee: Optional[str] = None    # procedure called (or tail-called) by the last instruction
+    exits: bool = False             # control may leave the code after the block
+
+
+class CFG:
+    """Граф потока управления кода `em.code[start:end]`.
+
+    - `blocks` -- начало блока -> блок, в порядке кода
+    - `calls` -- индекс перехода -> вызываемая процедура (в том числе хвостовые вызовы)
+    """
+
+    def __init__(self, em: Emitter, start: int = 0, end: int = None, procedures: Iterable[str] = ()):
+        self.em = em
+        self.code = em.code
+        self.start = start
+        self.end = len(em.code) if end is None else end
+        self.procedures = set(procedures)
+        self.calls: Dict[int, str] = {}
+        self.blocks: Dict[int, Block] = {}
+        self.__build()
+
+    def __target(self, index: int) -> Optional[int]:
+        label = self.__jump_labels.get(index)
+        if label is None or label not in self.em.label_index:
+            return None
+        target = self.em.label_index[label]
+        return target if self.start <= target < self.end else None
+
+    def __is_call(self, index: int) -> bool:
+        if index == self.start or self.code[index - 1]["opcode"] != Opcode.PUSH_RS:
+            return False
+        label = self.__jump_labels.get(index - 1)
+        return label is not None and self.em.label_index.get(label) == index + 1
+
+    def __build(self):
+        self.__jump_labels: Dict[int, str] = {
+            patch["idx"]: patch["label"] for patch in self.em.patches if "label" in patch
+        }
+        marks: Dict[int, List[str]] = {}
+        for label, index in self.em.label_index.items():
+            marks.setdefault(index, []).append(label)
+
+        leaders = {self.start} | {index for index in marks if self.start <= index < self.end}
+        for index in range(self.start, self.end):
+            opcode = self.code[index]["opcode"]
+            if opcode in JUMP_OPS or opcode in END_OPS:
+                leaders.add(index + 1)
+                target = self.__target(index)
+                if target is not None:
+                    leaders.add(target)
+        leaders = sorted(leader for leader in leaders if leader < self.end)
+
+        successors: Dict[int, List[int]] = {}
+        extra: Dict[int, Dict[str, Any]] = {}
+        for k, start in enumerate(leaders):
+            end = leaders[k + 1] if k + 1 < len(leaders) else self.end
+            last = end - 1
+            opcode = self.code[last]["opcode"]
+            label = self.__jump_labels.get(last)
+            target = self.__target(last)
+            following = [end] if end < self.end else []
+            callee, exits = None, False
+
+            if opcode == Opcode.JMP and self.__is_call(last):
+                callee = label
+                self.calls[last] = label
+                succ = following
+                exits = not following
+            elif opcode == Opcode.JMP and label in self.procedures:
+                callee = label
+                self.calls[last] = label
+                succ, exits = [], True
+            elif opcode == Opcode.JMP:
+                succ = [target] if target is not None else []
+                exits = target is None
+            elif opcode in JUMP_OPS:
+                succ = ([target] if target is not None else []) + [s for s in following if s != target]
+                exits = target is None or not following
+            elif opcode in EXIT_OPS:
+                succ, exits = [], True
+            elif opcode == Opcode.HALT:
+                succ = []
+            else:
+                succ = following
+                exits = not following
+
+            successors[start] = succ
+            extra[start] = {"end": end, "callee": callee, "exits": exits}
+
+        predecessors: Dict[int, List[int]] = {start: [] for start in leaders}
+        for start in leaders:
+            for successor in successors[start]:
+                predecessors[successor].append(start)
+
+        for start in leaders:
+            self.blocks[start] = Block(
+                start, extra[start]["end"], tuple(marks.get(start, ())),
+                tuple(successors[start]), tuple(predecessors[start]),
+                extra[start]["callee"], extra[start]["exits"]
+            )
+
+    def block_at(self, label: str) -> Optional[Block]:
+        return self.blocks.get(self.em.label_index.get(label))
+
+    def instructions(self, block: Block) -> List[Tuple[int, Dict[str, Any]]]:
+        return [(index, self.code[index]) for index in range(block.start, block.end)]
+
+    def effect(self, index: int, call_effect: Callable[[str], RegisterEffect] = lambda callee: OPAQUE_CALL) -> RegisterEffect:
+        if index in self.calls:
+            return call_effect(self.calls[index])
+        return register_effect(self.code[index])
+
+    def reachable(self, roots: Iterable[int] = None) -> Set[int]:
+        """Блоки, достижимые из `roots` (по умолчанию -- из начала кода) по рёбрам и вызовам"""
+        seen: Set[int] = set()
+        work = [self.start] if roots is None else list(roots)
+        while work:
+            start = work.pop()
+            if start in seen or start not in self.blocks:
+                continue
+            seen.add(start)
+            block = self.blocks[start]
+            work += block.successors
+            if block.callee is not None and self.em.label_index.get(block.callee) in self.blocks:
+                work.append(self.em.label_index[block.callee])
+        return seen
+
+    def postorder(self) -> List[int]:
+        order: List[int] = []
+        seen: Set[int] = set()
+        roots = [start for start, block in self.blocks.items() if start == self.start or not block.predecessors]
+        for root in roots + list(self.blocks):
+            if root in seen:
+                continue
+            seen.add(root)
+            stack = [(root, iter(self.blocks[root].successors))]
+            while stack:
+                start, successors = stack[-1]
+                successor = next(successors, None)
+                if successor is None:
+                    stack.pop()
+                    order.append(start)
+                elif successor not in seen:
+                    seen.add(successor)
+                    stack.append((successor, iter(self.blocks[successor].successors)))
+        return order
+
+    def __str__(self) -> str:
+        lines = []
+        for start, block in self.blocks.items():
+            labels = f" ({', '.join(block.labels)})" if block.labels else ""
+            successors = ", ".join(str(successor) for successor in block.successors) or "-"
+            call = f" call {block.callee}" if block.callee is not None else ""
+            exits = " exit" if block.exits else ""
+            lines.append(f"{start}..{block.end - 1}{labels} -> {successors}{call}{exits}")
+        return "\n".join(lines)
+
+
+# --- dataflow ---
+
+class Analysis(NamedTuple):
+    """Задача анализа потоков данных.
+
+    - `step(index, instruction, value)` -- значение по другую сторону инструкции
+      (после неё для прямого анализа, перед ней -- для обратного)
+    - `meet(values)` -- слияние значений на стыке блоков
+    - `boundary` -- значение на входах кода (прямой анализ) или на выходах (обратный)
+    - `initial` -- начальное значение остальных блоков
+    """
+    step: Callable[[int, Dict[str, Any], Any], Any]
+    meet: Callable[[List[Any]], Any]
+    boundary: Any
+    initial: Any
+    forward: bool = True
+
+
+class Solution(NamedTuple):
+    before: Dict[int, Any]  # start of block -> value at its first instruction
+    after: Dict[int, Any]   # start of block -> value after its last instruction
+
+
+def union(values: List[FrozenSet]) -> FrozenSet:
+    return frozenset().union(*values)
+
+
+def __transfer(cfg: CFG, analysis: Analysis, block: Block, value):
+    indices = range(block.start, block.end)
+    for index in (indices if analysis.forward else reversed(indices)):
+        value = analysis.step(index, cfg.code[index], value)
+    return value
+
+
+def solve(cfg: CFG, analysis: Analysis) -> Solution:
+    """Неподвижная точка задачи `analysis` (обход по списку блоков)"""
+    forward = analysis.forward
+    inputs: Dict[int, Any] = {start: analysis.initial for start in cfg.blocks}
+    outputs: Dict[int, Any] = {start: analysis.initial for start in cfg.blocks}
+
+    order = cfg.postorder()
+    if forward:
+        order.reverse()
+    work = deque(order)
+    queued = set(order)
+
+    while work:
+        start = work.popleft()
+        queued.discard(start)
+        block = cfg.blocks[start]
+
+        sources = block.predecessors if forward else block.successors
+        values = [outputs[source] for source in sources]
+        border = (start == cfg.start or not block.predecessors) if forward else block.exits
+        if border:
+            values.append(analysis.boundary)
+        inputs[start] = analysis.meet(values) if values else analysis.initial
+
+        value = __transfer(cfg, analysis, block, inputs[start])
+        if value == outputs[start]:
+            continue
+        outputs[start] = value
+        for target in (block.successors if forward else block.predecessors):
+            if target not in queued:
+                queued.add(target)
+                work.append(target)
+
+    # the first pass visits every block, so unchanged outputs are still final
+    if forward:
+        return Solution(inputs, outputs)
+    return Solution(outputs, inputs)
+
+
+def at_instructions(cfg: CFG, analysis: Analysis, solution: Solution) -> Dict[int, Any]:
+    """Значения у каждой инструкции: перед ней для прямого анализа, после неё -- для обратного"""
+    values: Dict[int, Any] = {}
+    for start, block in cfg.blocks.items():
+        indices = range(block.start, block.end)
+        if analysis.forward:
+            value = solution.before[start]
+            for index in indices:
+                values[index] = value
+                value = analysis.step(index, cfg.code[index], value)
+        else:
+            value = solution.after[start]
+            for index in reversed(indices):
+                values[index] = value
+                value = analysis.step(index, cfg.code[index], value)
+    return values
+
+
+def liveness(cfg: CFG, exit_live: FrozenSet[Register] = REGISTERS,
+             call_effect: Callable[[str], RegisterEffect] = lambda callee: OPAQUE_CALL) -> Analysis:
+    """Живые регистры; `exit_live` -- живые на выходах из кода (`ret`, переход вовне)"""
+    def step(index: int, instruction: Dict[str, Any], live: FrozenSet[Register]) -> FrozenSet[Register]:
+        effect = cfg.effect(index, call_effect)
+        return (live - effect.defs) | effect.uses
+
+    return Analysis(step, union, frozenset(exit_live), frozenset(), forward=False)
+
+
+# (index of the defining instruction, register); ENTRY_DEFINITION -- value from before the code
+Definition = Tuple[int, Register]
+ENTRY_DEFINITION = -1
+
+
+def reaching_definitions(cfg: CFG,
+                         call_effect: Callable[[str], RegisterEffect] = lambda callee: OPAQUE_CALL) -> Analysis:
+    """Достигающие определения регистров (вызов -- возможное определение затираемых регистров)"""
+    def step(index: int, instruction: Dict[str, Any], reaching: FrozenSet[Definition]) -> FrozenSet[Definition]:
+        effect = cfg.effect(index, call_effect)
+        if not effect.defs and not effect.clobbers:
+            return reaching
+        kept = frozenset(definition for definition in reaching if definition[1] not in effect.defs)
+        return kept | {(index, register) for register in effect.defs | effect.clobbers}
+
+    boundary = frozenset((ENTRY_DEFINITION, register) for register in REGISTERS)
+    return Analysis(step, union, boundary, frozenset(), forward=True)
@@ -1,9 +1,9 @@
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, NamedTuple
 
-from isa import Opcode, Register
+from isa import Opcode, Register, JUMP_OPS, PORT_OPS, is_short_imm, fits_short_imm
 from definitions import *
-from ast_nodes import Definition, Vector, StringLiteral, Const, Variable, Alloc
 from ast_nodes import Body, Number, Ident, IfStatement, BeginLoop, TimesLoop, String
+from tokenizer import SourceLocation
 
 
 STDIN_PORT  = 1
@@ -18,6 +18,7 @@ DR = Register.DR
 R10 = Register.r10
 
 ENTRY_LABEL = "__entry_main"
+VECTORS_LABEL = "__vectors"
 
 VECTOR_BASE = 0x1
 
@@ -92,6 +93,19 @@ def __in_port(port: int) -> Dict[str, Any]:
     }
 
 
+# movs/fills rd, rs1, rs2 (rs2 -- number of cells)
+def __block_op(opcode: Opcode, rd: Register, rs1: Register, rs2: Register) -> Dict[str, Any]:
+    return {
+        "opcode": opcode,
+        "rd_addr_t": REG_TO_REG_ADDR_T,
+        "rs1_addr_t": REG_TO_REG_ADDR_T,
+        "rs2_addr_t": REG_TO_REG_ADDR_T,
+        "rd": rd,
+        "rs1": rs1,
+        "rs2": rs2
+    }
+
+
 #   pop b
 #   pop a
 #   op a,a,b
@@ -133,11 +147,13 @@ def __unop_template(opcode: Opcode) -> List[Dict[str, Any]]:
 # get length of instruction in words
 def instruction_len(instruction: Dict[str, Any]) -> int:
     opcode = instruction["opcode"]
-    if opcode in (Opcode.IN, Opcode.OUT):
+    if opcode in PORT_OPS:
+        return 1
+
+    if is_short_imm(instruction):
         return 1
 
-    if opcode in (Opcode.JMP, Opcode.JCC, Opcode.JCS, Opcode.JEQ, Opcode.JNE,
-              Opcode.JLT, Opcode.JGT, Opcode.JLE, Opcode.JGE):
+    if opcode in JUMP_OPS:
         return 2
 
     for addressing in (DST_REG_ADDR_T, SRC1_REG_ADDR_T, SRC2_REG_ADDR_T):
@@ -152,6 +168,11 @@ class DataLayout:
         self.mem: List[int] = []
         self.cursor = 0
         self.symbols: Dict[str, Dict[str, Any]] = {}
+        # zero-initialized vars/allocs follow the initialized data and are not stored in `mem`
+        self.bss_size = 0
+        # exact stack sizes in cells (stack_effect analysis); None -- not bounded statically
+        self.data_stack_size: Optional[int] = None
+        self.return_stack_size: Optional[int] = None
 
     def dump_symbols(self, hex_mode: bool = False) -> None:
         def fmt(n: int) -> str:
@@ -159,13 +180,20 @@ class DataLayout:
 
         print("DM symbols:")
         for name, meta in self.symbols.items():
+            if meta.get("extern"):
+                continue
             base = meta["addr"]
             size = meta.get("size", 1)
             end  = base + size - 1
             kind = meta["kind"]
             print(f"{fmt(base)}..{fmt(end)} {kind:>5} {name}")
 
+    def __check_no_bss(self, name: str):
+        if self.bss_size:
+            raise ValueError(f"инициализированные данные `{name}` должны размещаться до bss!")
+
     def add_const(self, name: str, value: int):
+        self.__check_no_bss(name)
         base = self.cursor
         self.mem.append(int(value) & 0xFFFFFFFF)
         self.symbols[name] = {
@@ -176,42 +204,62 @@ class DataLayout:
         }
         self.cursor = len(self.mem)
 
-    def add_var(self, name: str):
+    def __add_bss(self, name: str, kind: str, size: int):
         base = self.cursor
-        self.mem.append(0)
+        self.bss_size += size
         self.symbols[name] = {
-            "kind": VAR_KIND,
+            "kind": kind,
             "addr": base,
-            "size": 1
+            "size": size,
+            "bss": True
         }
-        self.cursor = len(self.mem)
+        self.cursor = len(self.mem) + self.bss_size
+
+    def add_var(self, name: str):
+        self.__add_bss(name, VAR_KIND, 1)
 
     def add_alloc(self, name: str, size: int):
         size = int(size)
-        base = self.cursor
-        self.mem.extend([0] * size)
-        self.symbols[name] = {
-            "kind": ALLOC_KIND,
-            "addr": base,
-            "size": size
-        }
-        self.cursor = len(self.mem)
+        if size < 0:
+            raise ValueError(f"alloc {name}: отрицательный размер {size}!")
+        self.__add_bss(name, ALLOC_KIND, size)
 
-    def add_pstr(self, name: str, string: str):
+    # packed: BYTES_PER_WORD chars per word, char i at byte address (addr + 1) * BYTES_PER_WORD + i
+    def add_pstr(self, name: str, string: str, packed: bool = False):
+        self.__check_no_bss(name)
         base = self.cursor
         self.mem.append(len(string) & 0xFFFFFFFF) # pascal-length
 
-        for char in string:
-            self.mem.append(ord(char) & 0xFFFFFFFF)
+        if packed:
+            for start in range(0, len(string), BYTES_PER_WORD):
+                word = 0
+                for k, char in enumerate(string[start : start + BYTES_PER_WORD]):
+                    if ord(char) > 0xFF:
+                        raise ValueError(f"символ `{char}` строки `{name}` не помещается в байт!")
+                    word |= ord(char) << (8 * k)
+                self.mem.append(word)
+        else:
+            for char in string:
+                self.mem.append(ord(char) & 0xFFFFFFFF)
 
         self.symbols[name] = {
             "kind": STR_KIND,
             "addr": base,
             "len": len(string),
-            "size": 1 + len(string)
+            "size": len(self.mem) - base,
+            "packed": packed
         }
         self.cursor = len(self.mem)
 
+    # symbol of another module: kind (and const value) are known, the address is resolved by the linker
+    def add_extern(self, name: str, meta: Dict[str, Any]):
+        if name in self.symbols:
+            raise ValueError(f"символ `{name}` уже определён!")
+        self.symbols[name] = dict(meta, extern=True)
+
+    def local_symbols(self) -> Dict[str, Dict[str, Any]]:
+        return {name: meta for name, meta in self.symbols.items() if not meta.get("extern")}
+
     def resolve_addr(self, name: str) -> int:
         if name not in self.symbols:
             raise ValueError(f"символ `{name}` не определён!")
@@ -222,51 +270,136 @@ class DataLayout:
             raise ValueError(f"`{name}` не является константой!")
         return int(self.symbols[name]["value"])
 
+    # initialized words only; `bss_size` zero words follow them in data memory
     def words(self) -> List[int]:
         return self.mem
 
 
+class UnrollPolicy(NamedTuple):
+    """Развёртка циклов `times` с константным числом итераций (см. `gen_body`)"""
+    factor: int = 4     # body copies per iteration of a partially unrolled loop (1 -- no partial unrolling)
+    budget: int = 64    # extra code words allowed per loop (0 -- no unrolling)
+
+
+DEFAULT_UNROLL = UnrollPolicy()
+TIMES_LOOP_WORDS = 5  # push #n, pop ECX, push_rs ECX, loop, pop_rs ECX
+
+
 class Emitter:
     def __init__(self):
         self.code: List[Dict[str, Any]] = []
         self.labels: Dict[str, int] = {}
+        self.label_index: Dict[str, int] = {}
         self.patches: List[Dict[str, Any]] = []
         self.pc_words = 0
+        # data symbol -> address, for instructions emitted with `emit_with_symbol`
+        self.symbols: Dict[str, int] = {}
+        # source position stamped on emitted instructions
+        self.location: Optional[SourceLocation] = None
+        self.unroll = DEFAULT_UNROLL
 
+    # label addresses are tentative until patch_all() relaxes the branches
     def mark(self, label: str):
         self.labels[label] = self.pc_words
+        self.label_index[label] = len(self.code)
 
     def emit(self, instruction: Dict[str, Any]):
+        if self.location is not None:
+            instruction.setdefault(LOCATION, self.location)
         self.code.append(instruction)
         self.pc_words += instruction_len(instruction)
 
-    def emit_jmp_to_label(self, label: str, opcode: Opcode):
-        index = len(self.code)
-
+    # relative jumps start in the short form and are widened by patch_all() if needed;
+    # absolute ones (vectors table) keep the long form and a fixed position
+    def emit_jmp_to_label(self, label: str, opcode: Opcode, relative: bool = True):
         instruction = {
             "opcode": opcode,
             "rs1_addr_t": IMMEDIATE_ADDR_T,
             "imm": 0
         }
+        if relative:
+            instruction[RELATIVE] = True
 
-        self.code.append(instruction)
+        self.emit_with_label(instruction, label, relative)
+
+    # instruction whose immediate is the address of `label`
+    def emit_with_label(self, instruction: Dict[str, Any], label: str, relative: bool = False):
         self.patches.append(
             {
-                "idx": index,
+                "idx": len(self.code),
                 "label": label,
+                "field": IMMEDIATE,
+                "relative": relative
+            }
+        )
+        self.emit(instruction)
+
+    # instruction whose immediate is the address of data symbol `symbol`
+    def emit_with_symbol(self, instruction: Dict[str, Any], symbol: str):
+        self.patches.append(
+            {
+                "idx": len(self.code),
+                "symbol": symbol,
                 "field": IMMEDIATE
             }
         )
-        self.pc_words += instruction_len(instruction)
+        self.emit(instruction)
 
+    def __layout(self) -> List[int]:
+        addresses = []
+        address = 0
+        for instruction in self.code:
+            addresses.append(address)
+            address += instruction_len(instruction)
+        addresses.append(address)
+
+        return addresses
+
+    # branch relaxation: lengths only grow (short -> long), so the loop converges
     def patch_all(self):
         for patch in self.patches:
-            label = patch["label"]
+            if "symbol" in patch:
+                if patch["symbol"] not in self.symbols:
+                    raise ValueError(f"неизвестный символ данных: {patch['symbol']}!")
+            elif patch["label"] not in self.label_index:
+                raise ValueError(f"неизвестная метка: {patch['label']}!")
+
+        addresses = self.__layout()
+        while True:
+            labels = {label: addresses[index] for label, index in self.label_index.items()}
+
+            for patch in self.patches:
+                instruction = self.code[patch["idx"]]
+                if "symbol" in patch:
+                    instruction[patch["field"]] = self.symbols[patch["symbol"]]
+                    continue
+
+                target = labels[patch["label"]]
+                instruction[patch["field"]] = target
+
+                if patch["relative"] and instruction.get(RELATIVE) and \
+                        not fits_short_imm(target - addresses[patch["idx"]]):
+                    instruction[RELATIVE] = False
 
-            if label not in self.labels:
-                raise ValueError(f"неизвестная метка: {label}!")
+            new_addresses = self.__layout()
+            if new_addresses == addresses:
+                break
+            addresses = new_addresses
 
-            self.code[patch["idx"]][patch["field"]] = self.labels[label]
+        self.labels = labels
+        self.pc_words = addresses[-1]
+
+    # procedure name -> [start, end) instruction address range
+    def symbol_map(self, names: List[str]) -> Dict[str, Tuple[int, int]]:
+        starts = sorted((self.labels[name], name) for name in names if name in self.labels)
+        symbols: Dict[str, Tuple[int, int]] = {}
+
+        # folded procedures share a start: the range runs up to the next different one
+        for k, (start, name) in enumerate(starts):
+            end = next((other for other, _ in starts[k + 1:] if other > start), self.pc_words)
+            symbols[name] = (start, end)
+
+        return symbols
 
 
 #  [ ... a ] ->
@@ -356,6 +489,16 @@ def gen_xor(em: Emitter):
         em.emit(instruction)
 
 
+def gen_lshift(em: Emitter):
+    for instruction in __binop_template(Opcode.SHL):
+        em.emit(instruction)
+
+
+def gen_rshift(em: Emitter):
+    for instruction in __binop_template(Opcode.SHR):
+        em.emit(instruction)
+
+
 def gen_not(em: Emitter):
     for instruction in __unop_template(Opcode.NOT):
         em.emit(instruction)
@@ -438,6 +581,65 @@ def gen_print_string(em: Emitter, string: str):
         em.emit(__out_port(STDOUT_PORT))
 
 
+# [... pstr] -> STDOUT <- M[pstr+1..pstr+M[pstr]]
+# packed (outsb): STDOUT <- bytes of M[pstr+1..], M[pstr] chars
+def gen_type(em: Emitter, packed: bool = False):
+    em.emit(__pop_to_reg(EAX))
+    em.emit(
+        {
+            "opcode": Opcode.OUTSB if packed else Opcode.OUTS,
+            "rs1": EAX,
+            "port": STDOUT_PORT
+        }
+    )
+
+
+# [... baddr] -> [... byte]
+def gen_c_fetch(em: Emitter):
+    em.emit(__pop_to_reg(EDX))
+    em.emit(
+        {
+            "opcode": Opcode.LDB,
+            "rd_addr_t": REG_TO_REG_ADDR_T,
+            "rs1_addr_t": REG_TO_REG_ADDR_T,
+            "rd": EAX,
+            "rs1": EDX
+        }
+    )
+    em.emit(__push_reg(EAX))
+
+
+# [... char baddr] -> byte at baddr <- char
+def gen_c_store(em: Emitter):
+    em.emit(__pop_to_reg(EDX))
+    em.emit(__pop_to_reg(EAX))
+    em.emit(
+        {
+            "opcode": Opcode.STB,
+            "rd_addr_t": REG_TO_REG_ADDR_T,
+            "rs1_addr_t": REG_TO_REG_ADDR_T,
+            "rd": EDX,
+            "rs1": EAX
+        }
+    )
+
+
+# [... src dst n] -> M[dst..dst+n-1] <- M[src..src+n-1]
+def gen_cmove(em: Emitter):
+    em.emit(__pop_to_reg(ECX))
+    em.emit(__pop_to_reg(EBX))
+    em.emit(__pop_to_reg(EAX))
+    em.emit(__block_op(Opcode.MOVS, EBX, EAX, ECX))
+
+
+# [... addr n value] -> M[addr..addr+n-1] <- value
+def gen_fill(em: Emitter):
+    em.emit(__pop_to_reg(EAX))
+    em.emit(__pop_to_reg(ECX))
+    em.emit(__pop_to_reg(EBX))
+    em.emit(__block_op(Opcode.FILLS, EBX, EAX, ECX))
+
+
 # \r\n
 def gen_cr(em: Emitter):
     em.emit(__mov_imm_to_dst(CR_CHAR, DR))
@@ -448,20 +650,21 @@ def gen_cr(em: Emitter):
 
 
 # procedure call: 
-#       push_rs addr(next)
+#       push_rs addr(L_ret)
 #       jmp label
-#
-# next_addr = current_pc + length of 2 instructions (push_rs imm (2) + jmp (2) = 4)
+#   L_ret:
 def gen_call(em: Emitter, label: str):
-    next_addr = em.pc_words + 4
+    L_ret = fresh_label("call_ret")
 
-    em.emit(
+    em.emit_with_label(
         {"opcode": Opcode.PUSH_RS,
          "rs1_addr_t": IMMEDIATE_ADDR_T,
-         "imm": next_addr
-        }
+         "imm": 0
+        },
+        L_ret
     )
     em.emit_jmp_to_label(label, Opcode.JMP)
+    em.mark(L_ret)
 
 
 _label_counter = 0
@@ -471,102 +674,278 @@ def fresh_label(prefix: str) -> str:
     return f"{prefix}_{_label_counter}"
 
 
-def compile_program(ast) -> Tuple[List[Dict[str, Any]], List[int]]:
-    dm = DataLayout()
-    em = Emitter()
-
-    em.emit_jmp_to_label(ENTRY_LABEL, Opcode.JMP)
-
-    vectors: Dict[int, str] = {}
-    procedure_bodies: Dict[str, Any] = {}
-
-    # consts
-    for binding in ast.bindings:
-        if isinstance(binding, Const):
-            if not isinstance(binding.number, Number):
-                raise ValueError(f"const {binding.ident.value} должен иметь числовое значение!")
-            dm.add_const(binding.ident.value, binding.number.value)
-
-    # str_lits
-    for binding in ast.bindings:
-        if isinstance(binding, StringLiteral):
-            string = binding.string.value
-            dm.add_pstr(binding.ident.value, string)
-
-    # vars
-    for binding in ast.bindings:
-        if isinstance(binding, Variable):
-            dm.add_var(binding.ident.value)
-
-    # allocs
-    for binding in ast.bindings:
-        if isinstance(binding, Alloc):
-            size = None
-            if isinstance(binding.number, Number):
-                size = binding.number.value
-            elif isinstance(binding.number, Const):
-                if (binding.number.number is not None) and isinstance(binding.number.number, Number):
-                    size = binding.number.number.value
-                else:
-                    size = dm.resolve_const_value(binding.number.ident.value)
-            else:
-                raise ValueError(f"alloc {binding.ident.value} требует число или const!")
-            dm.add_alloc(binding.ident.value, size)
-
-    # procedures/vectors
-    procedure_bodies: Dict[str, Any] = {}
-    for binding in ast.bindings:
-        if isinstance(binding, Definition):
-            procedure_bodies[binding.ident.value] = binding.body
-
-        elif isinstance(binding, Vector):
-            if isinstance(binding.port, Number):
-                port_val = int(binding.port.value)
-            elif isinstance(binding.port, Const):
-                if (binding.port.number is not None) and isinstance(binding.port.number, Number):
-                    port_val = int(binding.port.number.value)
-                else:
-                    port_val = int(dm.resolve_const_value(binding.port.ident.value))
-            else:
-                raise ValueError("vector <num|const> : <handler> — неверный тип порта!")
+# number or const: value known at compile time
+def __literal_value(node, dm: DataLayout):
+    if isinstance(node, Number):
+        return node.value
+    if isinstance(node, Ident) and dm.symbols.get(node.value, {}).get("kind") == CONST_KIND:
+        return dm.symbols[node.value]["value"]
+    return None
 
-            if port_val in vectors:
-                raise ValueError(f"повторное определение обработчика порта {port_val}!")
-            vectors[port_val] = binding.ident.value
 
-    # vectors table
-    while em.pc_words < VECTOR_BASE:
-        em.emit(
-            {"opcode": Opcode.NOP}
-        )
+def __alu_reg_imm(opcode: Opcode, dst: Register, src: Register, value: int) -> Dict[str, Any]:
+    return {
+        "opcode": opcode,
+        "rd_addr_t": REG_TO_REG_ADDR_T,
+        "rs1_addr_t": REG_TO_REG_ADDR_T,
+        "rs2_addr_t": IMMEDIATE_ADDR_T,
+        "rd": dst,
+        "rs1": src,
+        "imm": int(value) & 0xFFFFFFFF
+    }
 
-    for port, handler in sorted(vectors.items()):
-        while em.pc_words < VECTOR_BASE + port:
-            em.emit(
-                {"opcode": Opcode.NOP}
-            )
-        em.emit_jmp_to_label(handler, Opcode.JMP)
-
-    # 2nd traverse: generating code for procedures (`ret` in the end)
-    for name, body in procedure_bodies.items():
-        em.mark(name)
-        gen_body(em, body, procedure_bodies, dm)
-        em.emit(
-            {"opcode": Opcode.RET}
-        )
 
-    # 3) top-level body
-    em.mark(ENTRY_LABEL)
-    gen_body(em, ast.body, procedure_bodies, dm)
+def __alu_reg_reg(opcode: Opcode, dst: Register, src1: Register, src2: Register) -> Dict[str, Any]:
+    return {
+        "opcode": opcode,
+        "rd_addr_t": REG_TO_REG_ADDR_T,
+        "rs1_addr_t": REG_TO_REG_ADDR_T,
+        "rs2_addr_t": REG_TO_REG_ADDR_T,
+        "rd": dst,
+        "rs1": src1,
+        "rs2": src2
+    }
+
+
+STRENGTH_REDUCED_OPS = ("*", "/", "mod")
+
+
+#   <2^k> * / mod -> shifts and masks (div and mod truncate toward zero):
+#       pop EAX
+#       *:   shl EAX, EAX, #k
+#       /:   sar EBX, EAX, #31       ; EBX = 2^k - 1 for negative EAX, else 0
+#            shr EBX, EBX, #(32-k)
+#            add EAX, EAX, EBX
+#            sar EAX, EAX, #k
+#       mod: <bias as for />
+#            and EAX, EAX, #(2^k-1)
+#            sub EAX, EAX, EBX
+#       push EAX
+def __gen_strength_reduced(em: Emitter, statements, i: int, dm: DataLayout) -> bool:
+    if i + 1 >= len(statements):
+        return False
+
+    op = statements[i + 1]
+    if not isinstance(op, Ident) or op.value not in STRENGTH_REDUCED_OPS:
+        return False
+
+    value = __literal_value(statements[i], dm)
+    if value is None or value <= 0 or value & (value - 1) or value >= 1 << 31:
+        return False
+    k = value.bit_length() - 1
+
+    if k == 0:
+        # x * 1 = x / 1 = x, x mod 1 = 0
+        if op.value == "mod":
+            em.emit(__pop_to_reg(R10))
+            em.emit(__push_imm(0))
+        return True
+
+    em.emit(__pop_to_reg(EAX))
+    if op.value == "*":
+        em.emit(__alu_reg_imm(Opcode.SHL, EAX, EAX, k))
+    else:
+        em.emit(__alu_reg_imm(Opcode.SAR, EBX, EAX, 31))
+        em.emit(__alu_reg_imm(Opcode.SHR, EBX, EBX, 32 - k))
+        em.emit(__alu_reg_reg(Opcode.ADD, EAX, EAX, EBX))
+        if op.value == "/":
+            em.emit(__alu_reg_imm(Opcode.SAR, EAX, EAX, k))
+        else:
+            em.emit(__alu_reg_imm(Opcode.AND, EAX, EAX, value - 1))
+            em.emit(__alu_reg_reg(Opcode.SUB, EAX, EAX, EBX))
+    em.emit(__push_reg(EAX))
+    return True
+
+
+MEM_UPDATE_OPS = {
+    "+": Opcode.ADD,
+    "-": Opcode.SUB,
+    "and": Opcode.AND,
+    "or": Opcode.OR,
+    "xor": Opcode.XOR,
+}
+
+# <var> @ <number|const> <op> <var> !
+MEM_UPDATE_PATTERN = ("var", "@", "arg", "op", "var", "!")
+
+
+#   <var> @ <n> <op> <var> !  ->
+#       mov EDX, #addr(var)
+#       op [EDX], [EDX], #n
+def __gen_mem_update(em: Emitter, statements, i: int, dm: DataLayout) -> bool:
+    window = statements[i : i + len(MEM_UPDATE_PATTERN)]
+    if len(window) != len(MEM_UPDATE_PATTERN):
+        return False
+
+    var, fetch, arg, op, var_again, store = window
+    if not all(isinstance(node, Ident) for node in (var, fetch, op, var_again, store)):
+        return False
+    if fetch.value != "@" or store.value != "!" or op.value not in MEM_UPDATE_OPS:
+        return False
+    if var.value != var_again.value:
+        return False
+
+    sym = dm.symbols.get(var.value)
+    if not sym or sym["kind"] != VAR_KIND:
+        return False
+
+    value = __literal_value(arg, dm)
+    if value is None:
+        return False
+
+    em.emit_with_symbol(__mov_imm_to_dst(0, EDX), var.value)
     em.emit(
-        {"opcode": Opcode.HALT}
+        {
+            "opcode": MEM_UPDATE_OPS[op.value],
+            "rd_addr_t": INDIRECT_ADDR_T,
+            "rs1_addr_t": INDIRECT_ADDR_T,
+            "rs2_addr_t": IMMEDIATE_ADDR_T,
+            "rd": EDX,
+            "rs1": EDX,
+            "imm": int(value) & 0xFFFFFFFF
+        }
     )
+    return True
 
-    # 4) patching
-    em.patch_all()
 
-    dm.dump_symbols(hex_mode=True)
-    return em.code, dm.words()
+#   pop n->C
+#   push_rs C
+#       L: <body> (`copies` times)
+#   loop L
+#   pop_rs C
+def __gen_times(em: Emitter, statement: TimesLoop, procedure_map, dm: DataLayout, copies: int = 1):
+    L_loop = fresh_label("times_loop")
+    em.emit(__pop_to_reg(ECX))
+
+    em.emit(
+        {
+            "opcode": Opcode.PUSH_RS,
+            "rs1_addr_t": REG_TO_REG_ADDR_T,
+            "rs1": ECX
+        }
+    )
+    em.mark(L_loop)
+
+    for _ in range(copies):
+        gen_body(em, statement.body, procedure_map, dm)
+
+    em.location = statement.end_loc
+    em.emit_jmp_to_label(L_loop, Opcode.LOOP)
+    em.emit(
+        {
+            "opcode": Opcode.POP_RS,
+            "rd_addr_t": REG_TO_REG_ADDR_T,
+            "rd": ECX
+        }
+    )
+
+
+# `r@` of the loop itself (not of nested `times`) and `>r`/`r>` anywhere at that level
+def __counter_uses(body: Body) -> Tuple[bool, bool]:
+    peeks = moves = False
+    statements = body.statements
+    i = 0
+    while i < len(statements):
+        statement = statements[i]
+        i += 1
+        if isinstance(statement, Ident) and statement.value == PRINT_STRING_SYM:
+            i += 1  # the string
+        elif isinstance(statement, Ident):
+            peeks = peeks or statement.value == "r@"
+            moves = moves or statement.value in (">r", "r>")
+        elif isinstance(statement, IfStatement):
+            for branch in (statement.ifbody, statement.elsebody):
+                if branch is not None:
+                    branch_peeks, branch_moves = __counter_uses(branch)
+                    peeks, moves = peeks or branch_peeks, moves or branch_moves
+        elif isinstance(statement, BeginLoop):
+            body_peeks, body_moves = __counter_uses(statement.body)
+            peeks, moves = peeks or body_peeks, moves or body_moves
+    return peeks, moves
+
+
+# copy of `body` with `r@` of the loop replaced by the counter value
+def __with_counter(body: Body, value: int) -> Body:
+    statements = []
+    source = body.statements
+    i = 0
+    while i < len(source):
+        statement = source[i]
+        i += 1
+        if isinstance(statement, Ident) and statement.value == PRINT_STRING_SYM:
+            statements += source[i - 1 : i + 1]
+            i += 1
+            continue
+        if isinstance(statement, Ident) and statement.value == "r@":
+            node = Number(value & 0xFFFFFFFF)
+        elif isinstance(statement, IfStatement):
+            node = IfStatement(
+                __with_counter(statement.ifbody, value),
+                __with_counter(statement.elsebody, value) if statement.elsebody is not None else None
+            )
+            node.end_loc = statement.end_loc
+        elif isinstance(statement, BeginLoop):
+            node = BeginLoop(__with_counter(statement.body, value))
+            node.end_loc = statement.end_loc
+        else:
+            statements.append(statement)
+            continue
+        node.loc = statement.loc
+        statements.append(node)
+    return Body(statements)
+
+
+def __body_words(em: Emitter, body: Body, procedure_map, dm: DataLayout) -> int:
+    scratch = Emitter()
+    scratch.unroll = em.unroll
+    gen_body(scratch, body, procedure_map, dm)
+    return scratch.pc_words
+
+
+#   <n> times <body> next, n -- number or const:
+#   full unrolling (counter values n..1 replace `r@`; n <= 0 runs the body once):
+#       <body> <body> ... <body>
+#   partial unrolling by `factor` k (bodies without `r@`):
+#       <body> x (n mod k)
+#       push #(n / k)
+#       <times loop over k copies of the body>
+# the code may grow by at most `budget` words per loop
+def __gen_unrolled_times(em: Emitter, statements, i: int, procedure_map, dm: DataLayout) -> bool:
+    if i + 1 >= len(statements) or not isinstance(statements[i + 1], TimesLoop) or em.unroll.budget <= 0:
+        return False
+
+    count = __literal_value(statements[i], dm)
+    if count is None:
+        return False
+    count &= 0xFFFFFFFF
+    if count >= 1 << 31:
+        count -= 1 << 32
+
+    loop = statements[i + 1]
+    peeks, moves = __counter_uses(loop.body)
+    if moves:
+        return False
+
+    words = __body_words(em, loop.body, procedure_map, dm)
+    loop_words = words + TIMES_LOOP_WORDS
+    iterations = max(count, 1)
+
+    if iterations * words - loop_words <= em.unroll.budget:
+        for value in (range(count, 0, -1) if count > 0 else [count]):
+            gen_body(em, __with_counter(loop.body, value) if peeks else loop.body, procedure_map, dm)
+        return True
+
+    factor = em.unroll.factor
+    if peeks or factor < 2 or iterations < 2 * factor:
+        return False
+    if (factor - 1 + iterations % factor) * words > em.unroll.budget:
+        return False
+
+    for _ in range(iterations % factor):
+        gen_body(em, loop.body, procedure_map, dm)
+    em.emit(__push_imm(iterations // factor))
+    __gen_times(em, loop, procedure_map, dm, factor)
+    return True
 
 
 def gen_body(em: Emitter, body, procedure_map, dm : DataLayout):
@@ -577,6 +956,16 @@ def gen_body(em: Emitter, body, procedure_map, dm : DataLayout):
 
     while i < len(statements):
         statement = statements[i]
+        if statement.loc is not None:
+            em.location = statement.loc
+
+        if __gen_strength_reduced(em, statements, i, dm):
+            i += 2
+            continue
+
+        if __gen_unrolled_times(em, statements, i, procedure_map, dm):
+            i += 2
+            continue
 
         if isinstance(statement, Number):
             em.emit(__push_imm(statement.value))
@@ -613,6 +1002,7 @@ def gen_body(em: Emitter, body, procedure_map, dm : DataLayout):
             if statement.elsebody is not None:
                 em.emit_jmp_to_label(L_else, Opcode.JEQ)
                 gen_body(em, statement.ifbody, procedure_map, dm)
+                em.location = statement.loc
                 em.emit_jmp_to_label(L_end, Opcode.JMP)
                 em.mark(L_else)
                 gen_body(em, statement.elsebody, procedure_map, dm)
@@ -630,6 +1020,7 @@ def gen_body(em: Emitter, body, procedure_map, dm : DataLayout):
             em.mark(L_loop)
 
             gen_body(em, statement.body, procedure_map, dm)
+            em.location = statement.end_loc
             em.emit(__pop_to_reg(EAX))
             em.emit(
                 {
@@ -645,80 +1036,18 @@ def gen_body(em: Emitter, body, procedure_map, dm : DataLayout):
             i += 1
             continue
 
-        #   pop n->C
-        #   push_rs C
-        #       L: <body>
-        #   pop_rs C
-        #   sub C,#1
-        #   push_rs C
-        #   cmp C,#0
-        #   jgt L
-        #   pop_rs C
         if isinstance(statement, TimesLoop):
-            L_loop = fresh_label("times_loop")
-            em.emit(__pop_to_reg(ECX))
-
-            em.emit(
-                {
-                    "opcode": Opcode.PUSH_RS,
-                    "rs1_addr_t": REG_TO_REG_ADDR_T,
-                    "rs1": ECX
-                }
-            )
-            em.mark(L_loop)
-
-            gen_body(em, statement.body, procedure_map, dm)
-
-            em.emit(
-                {
-                    "opcode": Opcode.POP_RS,
-                    "rd_addr_t": REG_TO_REG_ADDR_T,
-                    "rd": ECX
-                }
-            )
-            em.emit(
-                {
-                    "opcode": Opcode.SUB,
-                    "rd_addr_t": REG_TO_REG_ADDR_T,
-                    "rs1_addr_t": REG_TO_REG_ADDR_T,
-                    "rs2_addr_t": IMMEDIATE_ADDR_T,
-                    "rd": ECX,
-                    "rs1": ECX,
-                    "imm": 1
-                }
-            )
-            em.emit(
-                {
-                    "opcode": Opcode.PUSH_RS,
-                    "rs1_addr_t": REG_TO_REG_ADDR_T,
-                    "rs1": ECX
-                }
-            )
-            em.emit(
-                {
-                    "opcode": Opcode.CMP,
-                    "rs1_addr_t": REG_TO_REG_ADDR_T,
-                    "rs2_addr_t": IMMEDIATE_ADDR_T,
-                    "rs1": ECX,
-                    "imm": 0
-                }
-            )
-
-            em.emit_jmp_to_label(L_loop, Opcode.JGT)
-            em.emit(
-                {
-                    "opcode": Opcode.POP_RS,
-                    "rd_addr_t": REG_TO_REG_ADDR_T,
-                    "rd": ECX
-                }
-            )
-
+            __gen_times(em, statement, procedure_map, dm)
             i += 1
             continue
 
         if isinstance(statement, Ident):
             word = statement.value
 
+            if __gen_mem_update(em, statements, i, dm):
+                i += len(MEM_UPDATE_PATTERN)
+                continue
+
             if word == PRINT_STRING_SYM:
                 if i + 1 >= len(statements):
                     raise ValueError(f'после ." ожидается строка!')
@@ -747,6 +1076,36 @@ def gen_body(em: Emitter, body, procedure_map, dm : DataLayout):
                 i += 1
                 continue
 
+            if word == "type":
+                gen_type(em)
+                i += 1
+                continue
+
+            if word == "ctype":
+                gen_type(em, packed=True)
+                i += 1
+                continue
+
+            if word == "c@":
+                gen_c_fetch(em)
+                i += 1
+                continue
+
+            if word == "c!":
+                gen_c_store(em)
+                i += 1
+                continue
+
+            if word == "cmove":
+                gen_cmove(em)
+                i += 1
+                continue
+
+            if word == "fill":
+                gen_fill(em)
+                i += 1
+                continue
+
             if word == "key":
                 em.emit(__in_port(STDIN_PORT))
                 em.emit(__push_reg(DR))
@@ -842,9 +1201,10 @@ def gen_body(em: Emitter, body, procedure_map, dm : DataLayout):
                 i += 1
                 continue
 
+            # [... value addr] -> M[addr] = value
             if word == "!":
-                em.emit(__pop_to_reg(EAX)) # value
                 em.emit(__pop_to_reg(EDX)) # addr
+                em.emit(__pop_to_reg(EAX)) # value
                 em.emit(__mov_reg_to_mem(EDX, EAX))
                 i += 1
                 continue
@@ -884,6 +1244,16 @@ def gen_body(em: Emitter, body, procedure_map, dm : DataLayout):
                 i += 1
                 continue
 
+            if word == "lshift":
+                gen_lshift(em)
+                i += 1
+                continue
+
+            if word == "rshift":
+                gen_rshift(em)
+                i += 1
+                continue
+
             if word == "not":
                 gen_not(em)
                 i += 1
@@ -950,8 +1320,8 @@ def gen_body(em: Emitter, body, procedure_map, dm : DataLayout):
                     # const -> put
                     em.emit(__push_imm(sym["value"]))
                 else:
-                    # var/str/alloc -> put addr on stack
-                    em.emit(__push_imm(sym["addr"]))
+                    # var/str/alloc -> put addr on stack (resolved in patch_all/by the linker)
+                    em.emit_with_symbol(__push_imm(0), word)
                 i += 1
                 continue
 
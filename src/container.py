@@ -0,0 +1,244 @@
+#!/usr/bin/python3
+
+import mmap
+import struct
+import sys
+import zlib
+from typing import List, Dict, Tuple, Optional
+
+from image import ProgramImage, predecode, bytes_to_words_be
+
+
+CONTAINER_MAGIC = b"FCSA"
+CONTAINER_VERSION = 1
+
+SECTION_ALIGN = 16
+
+# header: magic, version, section count, entry point, vector base,
+#         code words, data words (initialized + bss)
+HEADER = struct.Struct(">4sHHIIII")
+
+# section table entry: kind, item count, offset, size in bytes, crc32 of the payload
+SECTION = struct.Struct(">IIIII")
+
+SECTION_CODE = 1    # instruction memory image (isa.to_bytes)
+SECTION_DATA = 2    # initialized data words, big-endian
+SECTION_BSS = 3     # no payload, item count = zero words after the data
+SECTION_SYMBOLS = 4
+SECTION_LINES = 5   # optional: (pc, file, line) sorted by pc, see linemap.LineTable
+SECTION_FILES = 6   # optional: source file names of the lines section, utf-8, one per line
+SECTION_STACKS = 7  # optional: data and return stack sizes in cells (static analysis)
+
+SECTION_NAMES = {
+    SECTION_CODE: "code",
+    SECTION_DATA: "data",
+    SECTION_BSS: "bss",
+    SECTION_SYMBOLS: "symbols",
+    SECTION_LINES: "lines",
+    SECTION_FILES: "files",
+    SECTION_STACKS: "stacks",
+}
+
+# symbol entry: space, kind length, name length, address, size; then kind and name (utf-8)
+SYMBOL = struct.Struct(">BBHII")
+SPACE_CODE = 0
+SPACE_DATA = 1
+
+LINE = struct.Struct(">III")
+
+STACKS = struct.Struct(">II")
+
+
+class ContainerError(Exception):
+    pass
+
+
+def __align(offset: int) -> int:
+    return (offset + SECTION_ALIGN - 1) // SECTION_ALIGN * SECTION_ALIGN
+
+
+def pack_symbols(symbols: List[Tuple[int, str, str, int, int]]) -> bytes:
+    """(space, kind, name, address, size) -> таблица символов"""
+    out = bytearray()
+    for space, kind, name, address, size in symbols:
+        kind_bytes = kind.encode("utf-8")
+        name_bytes = name.encode("utf-8")
+        out += SYMBOL.pack(space, len(kind_bytes), len(name_bytes), address, size)
+        out += kind_bytes + name_bytes
+    return bytes(out)
+
+
+def unpack_symbols(payload) -> List[Tuple[int, str, str, int, int]]:
+    symbols = []
+    offset = 0
+    while offset < len(payload):
+        space, kind_len, name_len, address, size = SYMBOL.unpack_from(payload, offset)
+        offset += SYMBOL.size
+        kind = bytes(payload[offset : offset + kind_len]).decode("utf-8")
+        offset += kind_len
+        name = bytes(payload[offset : offset + name_len]).decode("utf-8")
+        offset += name_len
+        symbols.append((space, kind, name, address, size))
+    return symbols
+
+
+def build_container(code: bytes, data: bytes, bss_size: int, entry: int, vector_base: int,
+                    symbols: List[Tuple[int, str, str, int, int]] = (),
+                    lines: Optional[List[Tuple[int, int, int]]] = None, files: List[str] = (),
+                    stacks: Optional[Tuple[int, int]] = None) -> bytes:
+    """Собирает контейнер: заголовок, таблица секций, секции с выравниванием SECTION_ALIGN"""
+    sections = [
+        (SECTION_CODE, len(code) // 4, bytes(code)),
+        (SECTION_DATA, len(data) // 4, bytes(data)),
+        (SECTION_BSS, bss_size, b""),
+        (SECTION_SYMBOLS, len(symbols), pack_symbols(symbols)),
+    ]
+    if lines is not None:
+        sections.append((SECTION_LINES, len(lines), b"".join(LINE.pack(*entry) for entry in lines)))
+        sections.append((SECTION_FILES, len(files), "\n".join(files).encode("utf-8")))
+    if stacks is not None:
+        sections.append((SECTION_STACKS, 2, STACKS.pack(*stacks)))
+
+    header = HEADER.pack(
+        CONTAINER_MAGIC, CONTAINER_VERSION, len(sections),
+        entry, vector_base, len(code) // 4, len(data) // 4 + bss_size
+    )
+
+    offset = __align(HEADER.size + SECTION.size * len(sections))
+    table = bytearray()
+    for kind, count, payload in sections:
+        table += SECTION.pack(kind, count, offset, len(payload), zlib.crc32(payload))
+        offset = __align(offset + len(payload))
+
+    out = bytearray(header + table)
+    for _, _, payload in sections:
+        out += bytes(__align(len(out)) - len(out))
+        out += payload
+    return bytes(out)
+
+
+def is_container(path: str) -> bool:
+    with open(path, "rb") as file:
+        return file.read(len(CONTAINER_MAGIC)) == CONTAINER_MAGIC
+
+
+class Container:
+    """Контейнер, отображённый в память (`mmap`).
+
+    Секции -- срезы `memoryview` поверх отображения, без копирования.
+    Контрольные суммы проверяются при открытии (`verify=True`).
+    """
+
+    def __init__(self, path: str, verify: bool = True):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.slices: List[memoryview] = []
+
+        try:
+            self.__parse(verify)
+        except Exception:
+            self.close()
+            raise
+
+    def __parse(self, verify: bool):
+        if len(self.view) < HEADER.size:
+            raise ContainerError("файл короче заголовка контейнера!")
+
+        magic, version, section_count, entry, vector_base, code_words, data_words = \
+            HEADER.unpack_from(self.view)
+        if magic != CONTAINER_MAGIC:
+            raise ContainerError(f"неверное магическое число контейнера: {magic!r}!")
+        if version != CONTAINER_VERSION:
+            raise ContainerError(f"неподдерживаемая версия контейнера: {version}!")
+
+        self.entry = entry
+        self.vector_base = vector_base
+        self.code_words = code_words
+        self.data_words = data_words
+        self.sections: Dict[int, Tuple[int, int, int, int]] = {}
+
+        for k in range(section_count):
+            kind, count, offset, size, crc = SECTION.unpack_from(self.view, HEADER.size + k * SECTION.size)
+            if offset + size > len(self.view):
+                raise ContainerError(f"секция {SECTION_NAMES.get(kind, kind)} выходит за пределы файла!")
+            self.sections[kind] = (count, offset, size, crc)
+
+            if verify and zlib.crc32(self.view[offset : offset + size]) != crc:
+                raise ContainerError(f"неверная контрольная сумма секции {SECTION_NAMES.get(kind, kind)}!")
+
+    def section(self, kind: int) -> memoryview:
+        if kind not in self.sections:
+            return memoryview(b"")
+        _, offset, size, _ = self.sections[kind]
+        part = self.view[offset : offset + size]
+        self.slices.append(part)
+        return part
+
+    def count(self, kind: int) -> int:
+        return self.sections.get(kind, (0, 0, 0, 0))[0]
+
+    @property
+    def code(self) -> memoryview:
+        return self.section(SECTION_CODE)
+
+    @property
+    def data(self) -> memoryview:
+        return self.section(SECTION_DATA)
+
+    @property
+    def bss_size(self) -> int:
+        return self.count(SECTION_BSS)
+
+    def symbols(self) -> List[Tuple[int, str, str, int, int]]:
+        return unpack_symbols(self.section(SECTION_SYMBOLS))
+
+    @property
+    def stacks(self) -> Optional[Tuple[int, int]]:
+        if SECTION_STACKS not in self.sections:
+            return None
+        return STACKS.unpack(self.section(SECTION_STACKS))
+
+    def lines(self) -> List[Tuple[int, int, int]]:
+        payload = self.section(SECTION_LINES)
+        return [LINE.unpack_from(payload, offset) for offset in range(0, len(payload), LINE.size)]
+
+    def files(self) -> List[str]:
+        if not self.count(SECTION_FILES):
+            return []
+        return bytes(self.section(SECTION_FILES)).decode("utf-8").split("\n")
+
+    def image(self) -> ProgramImage:
+        """Образ программы для моделей (код и данные копируются из отображения)"""
+        code = bytes(self.code)
+        return ProgramImage(code, predecode(code), bytes_to_words_be(self.data), self.bss_size, self.stacks)
+
+    def close(self):
+        for part in self.slices:
+            part.release()
+        self.slices = []
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self) -> "Container":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_image(path: str) -> ProgramImage:
+    with Container(path) as container:
+        return container.image()
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) == 2, "Неверные аргументы: container.py <container_file>"
+
+    with Container(sys.argv[1]) as container:
+        print(f"entry: {container.entry}, vector base: {container.vector_base}")
+        print(f"code: {container.code_words} words, data: {container.data_words} words (bss {container.bss_size})")
+        for kind, (count, offset, size, crc) in sorted(container.sections.items()):
+            print(f"{SECTION_NAMES.get(kind, kind):>8}: offset {offset:#08x}, {size} bytes, {count} items, crc32 {crc:08X}")
+        for space, kind, name, address, size in container.symbols():
+            print(f"{'code' if space == SPACE_CODE else 'data'} {address:04X}..{address + size:04X} {kind:>5} {name}")
@@ -0,0 +1,352 @@
+#!/usr/bin/python3
+
+"""Статическая оценка стоимости процедур в тактах (без запуска модели).
+
+Код процедуры делится на базовые блоки; стоимость инструкции берётся из той же
+модели, что и в симуляторе (`ticks.instruction_ticks`). Вызов (`push_rs #ret` +
+`jmp`) стоит как вызываемая процедура, переход на начало другой процедуры --
+хвостовой вызов.
+
+Для процедуры считаются наименьшая и наибольшая стоимость пути от входа до
+выхода (`ret`, `iret`, `halt`), где каждый цикл проходится один раз (тела
+`begin/until` и `times/next` исполняются хотя бы один раз). Каждая следующая
+итерация цикла добавляет стоимость пути от его начала до обратного перехода;
+блочные инструкции добавляют стоимость, пропорциональную числу ячеек. Итог
+записывается символьно: `best..worst + (n1 - 1)·(a..b) + ...`.
+
+Рекурсия статически не оценивается (стоимость `?`).
+"""
+
+import sys
+from typing import List, Dict, Tuple, Optional, NamedTuple
+
+from isa import Opcode, JUMP_OPS, BLOCK_OPS, addr_kind, binary_to_opcode
+from definitions import *
+from image import predecode, F_OPCODE, F_RD_T, F_RS1_T, F_RS2_T, F_IMM, F_LEN, ROW_SIZE, NO_INSTRUCTION
+from ticks import instruction_ticks, BLOCK_TICKS
+from codegen import VECTORS_LABEL, VECTOR_BASE
+from container import Container, is_container, SPACE_CODE
+from profiler import load_symbol_map
+from linemap import LineTable
+
+
+UNKNOWN_COST = "?"
+PROGRAM = "<program>"  # start jump at address 0 and the code it leads to
+
+EXIT_OPS = {Opcode.RET, Opcode.IRET, Opcode.HALT}
+
+
+class Block(NamedTuple):
+    start: int
+    end: int                      # address after the last instruction
+    ticks: int                    # own instructions, callee not included
+    successors: Tuple[int, ...]   # starts of blocks of the same procedure
+    callee: Optional[str] = None  # procedure called (or tail-called) at the end
+    exits: bool = False           # control leaves the procedure after the block
+    block_ops: Tuple[Tuple[int, Opcode], ...] = ()
+
+
+class Loop(NamedTuple):
+    head: int                     # target of the backward jump
+    latch: int                    # address of the backward jump
+    best: Optional[int]           # one more iteration
+    worst: Optional[int]
+    location: Optional[Tuple[str, int]] = None
+
+
+class ProcedureCost(NamedTuple):
+    name: str
+    start: int
+    end: int
+    blocks: List[Block]
+    best: Optional[int]
+    worst: Optional[int]
+    loops: List[Loop]
+    block_ops: List[Tuple[int, Opcode]]
+    calls: List[str]
+    variable: bool                # loops or block instructions here or in callees
+
+    def formula(self) -> str:
+        terms = [cost_range(self.best, self.worst)]
+        terms += [f"(n{k} - 1)·{cost_range(loop.best, loop.worst)}" for k, loop in enumerate(self.loops, 1)]
+        terms += [per_cell(opcode, f"c{k}") for k, (_, opcode) in enumerate(self.block_ops, 1)]
+        if self.variable and not self.loops and not self.block_ops:
+            terms.append("...")  # callees only
+        return " + ".join(terms)
+
+
+def cost_range(best: Optional[int], worst: Optional[int]) -> str:
+    if best is None or worst is None:
+        return UNKNOWN_COST
+    return str(best) if best == worst else f"{best}..{worst}"
+
+
+def per_cell(opcode: Opcode, count: str) -> str:
+    """Переменная часть стоимости блочной инструкции (см. `ticks.block_ticks`)"""
+    term = f"{BLOCK_TICKS[opcode]}·{count}"
+    if opcode == Opcode.OUTSB:
+        term += f" + ⌈{count}/{BYTES_PER_WORD}⌉"
+    return term
+
+
+class CostModel:
+    """Стоимость процедур программы по предекодированной таблице (`image.predecode`).
+
+    - `symbol_map` -- процедура -> `[start, end)` (карта `.sym` транслятора)
+    - `line_table` -- карта строк, если есть: ею подписываются циклы
+    """
+
+    def __init__(self, table, symbol_map: Dict[str, Tuple[int, int]], line_table: Optional[LineTable] = None):
+        self.table = table
+        self.code_words = len(table) // ROW_SIZE
+        self.symbol_map = symbol_map
+        self.entries = {start: name for name, (start, _) in symbol_map.items()}
+        self.line_table = line_table
+        self.costs: Dict[str, Optional[ProcedureCost]] = {}
+        self.active: List[str] = []
+
+    def __field(self, pc: int, field: int) -> int:
+        return int(self.table[pc * ROW_SIZE + field])
+
+    def opcode(self, pc: int) -> Optional[Opcode]:
+        code = self.__field(pc, F_OPCODE)
+        if code == NO_INSTRUCTION:
+            return None
+        return binary_to_opcode.get(code)
+
+    def ticks(self, pc: int) -> int:
+        return instruction_ticks(
+            self.opcode(pc), self.__field(pc, F_LEN),
+            self.__field(pc, F_RD_T), self.__field(pc, F_RS1_T), self.__field(pc, F_RS2_T)
+        )
+
+    def __instructions(self, start: int, end: int) -> List[int]:
+        pcs = []
+        pc = start
+        while pc < min(end, self.code_words):
+            if self.opcode(pc) is None:
+                break
+            pcs.append(pc)
+            pc += self.__field(pc, F_LEN)
+        return pcs
+
+    def __is_call(self, prev: Optional[int], pc: int) -> bool:
+        return (
+            self.opcode(pc) == Opcode.JMP and prev is not None and self.opcode(prev) == Opcode.PUSH_RS
+            and self.__field(prev, F_RS1_T) == addr_kind[IMMEDIATE_ADDR_T]
+        )
+
+    def blocks(self, start: int, end: int) -> List[Block]:
+        """Базовые блоки кода `[start, end)`"""
+        pcs = self.__instructions(start, end)
+        leaders = {start}
+        for k, pc in enumerate(pcs):
+            opcode = self.opcode(pc)
+            if opcode in JUMP_OPS or opcode in EXIT_OPS:
+                if k + 1 < len(pcs):
+                    leaders.add(pcs[k + 1])
+            if opcode in JUMP_OPS:
+                target = self.__field(pc, F_IMM)
+                if start <= target < end and not self.__is_call(pcs[k - 1] if k else None, pc):
+                    leaders.add(target)
+
+        blocks = []
+        current: List[int] = []
+        for k, pc in enumerate(pcs):
+            current.append(pc)
+            if k + 1 < len(pcs) and pcs[k + 1] not in leaders:
+                continue
+            blocks.append(self.__block(current, pcs[k + 1] if k + 1 < len(pcs) else None, start, end))
+            current = []
+        return blocks
+
+    def __block(self, pcs: List[int], next_pc: Optional[int], start: int, end: int) -> Block:
+        last = pcs[-1]
+        opcode = self.opcode(last)
+        target = self.__field(last, F_IMM)
+        ticks = sum(self.ticks(pc) for pc in pcs)
+        block_ops = tuple((pc, self.opcode(pc)) for pc in pcs if self.opcode(pc) in BLOCK_OPS)
+        falls = (next_pc,) if next_pc is not None else ()
+        block = Block(pcs[0], last + self.__field(last, F_LEN), ticks, (), block_ops=block_ops)
+
+        if opcode in EXIT_OPS:
+            return block._replace(exits=True)
+
+        if opcode not in JUMP_OPS:
+            return block._replace(successors=falls, exits=next_pc is None)
+
+        if self.__is_call(pcs[-2] if len(pcs) > 1 else None, last):
+            # the return address is the next instruction (see `codegen.gen_call`)
+            return block._replace(successors=falls, callee=self.entries.get(target), exits=next_pc is None)
+
+        if not start <= target < end:
+            # tail call, or a jump out of the procedure
+            callee = self.entries.get(target) if opcode == Opcode.JMP else None
+            return block._replace(
+                successors=() if opcode == Opcode.JMP else falls,
+                callee=callee, exits=opcode == Opcode.JMP or next_pc is None
+            )
+
+        if opcode == Opcode.JMP:
+            return block._replace(successors=(target,))
+        return block._replace(successors=tuple(dict.fromkeys((target,) + falls)))
+
+    def procedure(self, name: str) -> Optional[ProcedureCost]:
+        """Стоимость процедуры; `None` -- при рекурсии"""
+        if name in self.costs:
+            return self.costs[name]
+        if name in self.active:
+            return None
+
+        self.active.append(name)
+        start, end = self.symbol_map[name] if name != PROGRAM else (0, VECTOR_BASE)
+        blocks = self.blocks(start, end)
+        cost = self.__procedure(name, start, end, blocks)
+        self.active.pop()
+
+        self.costs[name] = cost
+        return cost
+
+    # (best, worst) of a block with its callee; None if the callee is not bounded
+    def __block_cost(self, block: Block) -> Tuple[Optional[int], Optional[int], bool]:
+        if block.callee is None:
+            return block.ticks, block.ticks, False
+        callee = self.procedure(block.callee)
+        if callee is None or callee.best is None:
+            return None, None, False
+        return block.ticks + callee.best, block.ticks + callee.worst, callee.variable
+
+    # forward paths only: blocks are laid out in address order, backward jumps close loops
+    def __paths(self, blocks: List[Block], costs, source: int, stop: Optional[int] = None):
+        """Наименьшая и наибольшая стоимость от начала блока `source` до конца каждого блока"""
+        reach: Dict[int, Tuple[int, int]] = {source: (0, 0)}
+        done: Dict[int, Tuple[int, int]] = {}
+        for block in blocks:
+            if block.start not in reach or (stop is not None and block.start > stop):
+                continue
+            best, worst = reach[block.start]
+            own_best, own_worst = costs[block.start]
+            done[block.start] = (best + own_best, worst + own_worst)
+            for successor in block.successors:
+                if successor <= block.start:
+                    continue
+                if successor in reach:
+                    low, high = reach[successor]
+                    reach[successor] = (min(low, best + own_best), max(high, worst + own_worst))
+                else:
+                    reach[successor] = (best + own_best, worst + own_worst)
+        return done
+
+    def __procedure(self, name: str, start: int, end: int, blocks: List[Block]) -> ProcedureCost:
+        costs: Dict[int, Tuple[int, int]] = {}
+        variable = False
+        bounded = True
+        for block in blocks:
+            best, worst, callee_variable = self.__block_cost(block)
+            if best is None:
+                bounded = False
+                best = worst = 0
+            costs[block.start] = (best, worst)
+            variable = variable or callee_variable
+
+        calls = list(dict.fromkeys(block.callee for block in blocks if block.callee is not None))
+        block_ops = [op for block in blocks for op in block.block_ops]
+        done = self.__paths(blocks, costs, start) if blocks else {}
+        exits = [done[block.start] for block in blocks if block.exits and block.start in done]
+
+        loops = []
+        for block in blocks:
+            for successor in block.successors:
+                if successor > block.start or block.start not in done:
+                    continue
+                iteration = self.__paths(blocks, costs, successor, block.start).get(block.start)
+                latch = self.__instructions(block.start, block.end)[-1]
+                location = self.line_table.lookup(latch) if self.line_table is not None else None
+                loops.append(Loop(successor, latch, *(iteration or (None, None)), location))
+
+        best = min((cost[0] for cost in exits), default=None) if bounded else None
+        worst = max((cost[1] for cost in exits), default=None) if bounded else None
+        if any(loop.best is None for loop in loops):
+            best = worst = None
+
+        return ProcedureCost(
+            name, start, end, blocks, best, worst, loops, block_ops, calls,
+            variable or bool(loops) or bool(block_ops)
+        )
+
+    def all(self) -> List[ProcedureCost]:
+        """Вся программа (`PROGRAM`) и все процедуры, кроме таблицы векторов"""
+        result = []
+        for name in [PROGRAM] + list(self.symbol_map):
+            if name == VECTORS_LABEL:
+                continue
+            cost = self.procedure(name)
+            if cost is None:
+                start, end = self.symbol_map[name]
+                cost = ProcedureCost(name, start, end, self.blocks(start, end), None, None, [], [], [], True)
+            result.append(cost)
+        return result
+
+
+def report(costs: List[ProcedureCost], with_blocks: bool = False) -> str:
+    """Таблица по убыванию наибольшей стоимости (неоценённые -- сначала)"""
+    ordered = sorted(costs, key=lambda cost: (cost.worst is not None, -(cost.worst or 0), cost.name))
+    lines = [f"{'best':>8} {'worst':>8} {'blocks':>6} {'loops':>5}  procedure"]
+
+    for cost in ordered:
+        best = UNKNOWN_COST if cost.best is None else cost.best
+        worst = UNKNOWN_COST if cost.worst is None else cost.worst
+        mark = "+" if cost.variable else " "
+        lines.append(f"{best:>8} {worst:>8}{mark}{len(cost.blocks):>6} {len(cost.loops):>5}  {cost.name}")
+
+    details = [cost for cost in ordered if cost.variable or with_blocks]
+    for cost in details:
+        lines.append("")
+        lines.append(f"{cost.name}: {cost.formula()}")
+        for k, loop in enumerate(cost.loops, 1):
+            where = f"{loop.location[0]}:{loop.location[1]}" if loop.location is not None else f"{loop.latch:#06x}"
+            lines.append(f"    n{k}: цикл {loop.head:#06x}..{loop.latch:#06x} ({where}), итерация {cost_range(loop.best, loop.worst)}")
+        for k, (pc, opcode) in enumerate(cost.block_ops, 1):
+            lines.append(f"    c{k}: число ячеек {opcode.name.lower()} по адресу {pc:#06x}")
+        if cost.calls:
+            lines.append(f"    вызовы: {', '.join(cost.calls)}")
+        if with_blocks:
+            for block in cost.blocks:
+                callee = f" -> {block.callee}" if block.callee is not None else ""
+                successors = " ".join(f"{successor:#06x}" for successor in block.successors) or "выход"
+                lines.append(f"    [{block.start:#06x}, {block.end:#06x}) {block.ticks:>5}{callee}  => {successors}")
+
+    return "\n".join(lines)
+
+
+def load_program(args: List[str]):
+    """(таблица, карта процедур, карта строк) из контейнера или файлов транслятора"""
+    if is_container(args[0]):
+        with Container(args[0]) as container:
+            table = predecode(bytes(container.code))
+            symbol_map = {
+                name: (address, address + size)
+                for space, kind, name, address, size in container.symbols() if space == SPACE_CODE
+            }
+            line_table = LineTable(container.files(), container.lines())
+        return table, symbol_map, line_table
+
+    assert len(args) >= 2, "Неверные аргументы: не задана карта процедур"
+    with open(args[0], "rb") as file:
+        table = predecode(file.read())
+    line_table = LineTable.load(args[2]) if len(args) >= 3 else None
+    return table, load_symbol_map(args[1]), line_table
+
+
+BLOCKS_FLAG = "--blocks"
+
+
+if __name__ == "__main__":
+    options = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    assert (
+        1 <= len(args) <= 3 and set(options) <= {BLOCKS_FLAG}
+    ), f"Неверные аргументы: cost.py [{BLOCKS_FLAG}] (<container_file> | <instructions_file> <symbols_file> [<lines_file>])"
+
+    table, symbol_map, line_table = load_program(args)
+    print(report(CostModel(table, symbol_map, line_table).all(), BLOCKS_FLAG in options))
@@ -15,6 +15,9 @@ STRING_QUOTE = "\""
 
 HEX_DIGITS = 'abcdef'
 
+# words made of letters and symbols, tokenized as a whole when delimited by whitespace
+COMPOUND_WORDS = ("c@", "c!", "r@", ">r", "r>", "<=", ">=")
+
 DST_REG = "rd"
 SRC1_REG = "rs1"
 SRC2_REG = "rs2"
@@ -34,10 +37,15 @@ IMMEDIATE = "imm"
 ADDRESS = "addr"
 ARGUMENT = "arg"
 
+RELATIVE = "rel"
+LOCATION = "loc"  # source position of the instruction (tokenizer.SourceLocation)
+
 VAR_KIND = "var"
 CONST_KIND = "const"
 ALLOC_KIND = "alloc"
 STR_KIND = "str"
 
+BYTES_PER_WORD = 4
+
 CR_CHAR = 13
 NL_CHAR = 10
\ No newline at end of file
@@ -0,0 +1,232 @@
+import sys
+from typing import List, Tuple, Optional, BinaryIO, Iterable
+
+from codegen import STDIN_PORT, STDOUT_PORT
+from schedule import EventQueue, read_schedule
+
+
+PORT_COUNT = 1024  # port is encoded in 10 bits
+
+
+class DeviceError(Exception):
+    pass
+
+
+class Device:
+    """Внешнее устройство, подключённое к одному или нескольким портам.
+
+    Модель процессора вызывает `read` на `in <port>`, `write` на `out <port>`,
+    а `interrupt_tick` сообщает такт следующего запроса прерывания (`intrq`),
+    чтобы модель не опрашивала устройства на каждом такте.
+    """
+
+    def read(self, port: int, tick: int) -> int:
+        return 0
+
+    def write(self, port: int, tick: int, value: int):
+        pass
+
+    def interrupt_tick(self) -> Optional[int]:
+        return None
+
+    def interrupt_port(self, port: int) -> int:
+        """Порт запроса прерывания; `port` -- порт, к которому подключено устройство"""
+        return port
+
+    def intack(self, port: int, tick: int):
+        pass
+
+    def flush(self):
+        pass
+
+
+class NullDevice(Device):
+    pass
+
+
+class StdoutCapture(Device):
+    """Накапливает выведенные токены в `bytearray` и сбрасывает их пачками;
+    сами токены -- в `tokens`"""
+
+    def __init__(self, stream: BinaryIO = None, flush_threshold: int = 1 << 16):
+        self.buffer = bytearray()
+        self.captured = bytearray()
+        self.tokens: List[int] = []
+        self.stream = stream
+        self.flush_threshold = flush_threshold
+
+    def write(self, port: int, tick: int, value: int):
+        value &= 0xFFFFFFFF
+        self.tokens.append(value)
+        if value < 0x80:
+            self.buffer.append(value)
+        elif value < 0x110000:
+            self.buffer += chr(value).encode("utf-8")
+        else:
+            self.buffer += str(value).encode("utf-8")
+
+        if len(self.buffer) >= self.flush_threshold:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.stream is not None:
+            self.stream.write(self.buffer)
+            self.stream.flush()
+        self.captured += self.buffer
+        self.buffer.clear()
+
+    def text(self) -> str:
+        self.flush()
+        return self.captured.decode("utf-8", errors="replace")
+
+
+class FileInputStream(Device):
+    """Поток ввода из файла: по токену каждые `period` тактов начиная с `start_tick`.
+
+    Каждый токен сопровождается запросом прерывания (`trap`-ввод);
+    после конца файла `read` возвращает 0 и прерывания прекращаются.
+    """
+
+    def __init__(self, path: str, start_tick: int = 0, period: int = 1):
+        if period <= 0:
+            raise DeviceError(f"период устройства ввода должен быть положительным: {period}!")
+
+        with open(path, "rb") as file:
+            self.data = file.read()
+        self.pos = 0
+        self.next_tick = start_tick
+        self.period = period
+
+    def read(self, port: int, tick: int) -> int:
+        if self.pos >= len(self.data):
+            return 0
+        token = self.data[self.pos]
+        self.pos += 1
+        return token
+
+    def interrupt_tick(self) -> Optional[int]:
+        if self.pos >= len(self.data):
+            return None
+        return self.next_tick
+
+    def intack(self, port: int, tick: int):
+        self.next_tick = tick + self.period
+
+
+class ScheduledInput(Device):
+    """Ввод по расписанию (`schedule.EventQueue`), подключается к портам `ports`.
+
+    Запрос прерывания стоит с такта ближайшего события по его порту, пока событие
+    не прочитано: `in` на этом порту забирает токен наступившего события.
+    """
+
+    def __init__(self, queue: EventQueue, ports: Iterable[int] = (STDIN_PORT,)):
+        self.queue = queue
+        self.ports = sorted(set(ports))
+
+    @classmethod
+    def from_tokens(cls, tokens: Iterable[int], port: int = STDIN_PORT) -> "ScheduledInput":
+        """Все токены доступны с такта 0 -- по одному на прерывание"""
+        return cls(EventQueue([((0, port, token & 0xFFFFFFFF) for token in tokens)]), [port])
+
+    @classmethod
+    def from_file(cls, path: str) -> "ScheduledInput":
+        """Расписание из файла (см. `schedule.read_schedule`); порты -- все, что в нём встречаются"""
+        ports = {port for _, port, _ in read_schedule(path)}
+        return cls(EventQueue([read_schedule(path)]), ports)
+
+    def read(self, port: int, tick: int) -> int:
+        event = self.queue.peek(tick)
+        if event is None or event[1] != port:
+            return 0
+        self.queue.pop(tick)
+        return event[2]
+
+    def interrupt_tick(self) -> Optional[int]:
+        return self.queue.next_tick()
+
+    def interrupt_port(self, port: int) -> int:
+        _, event_port, _ = self.queue.peek(self.queue.next_tick())
+        return event_port
+
+
+class CounterTimer(Device):
+    """Счётчик тактов с таймером.
+
+    `in` возвращает число тактов с момента сброса, `out` задаёт период
+    прерываний (0 -- таймер выключен) и сбрасывает счётчик.
+    """
+
+    def __init__(self):
+        self.base_tick = 0
+        self.period = 0
+
+    def read(self, port: int, tick: int) -> int:
+        return (tick - self.base_tick) & 0xFFFFFFFF
+
+    def write(self, port: int, tick: int, value: int):
+        self.base_tick = tick
+        self.period = value & 0xFFFFFFFF
+
+    def interrupt_tick(self) -> Optional[int]:
+        if self.period == 0:
+            return None
+        return self.base_tick + self.period
+
+    def intack(self, port: int, tick: int):
+        self.base_tick = tick
+
+
+class PortBus:
+    """Контроллер внешних устройств: таблица порт -> устройство"""
+
+    def __init__(self):
+        self.null = NullDevice()
+        self.ports: List[Device] = [self.null] * PORT_COUNT
+        self.devices: List[Device] = []
+        self.attached: List[Tuple[int, Device]] = []
+
+    def attach(self, port: int, device: Device) -> Device:
+        if not 0 <= port < PORT_COUNT:
+            raise DeviceError(f"некорректный порт {port}: доступны 0..{PORT_COUNT - 1}!")
+        if self.ports[port] is not self.null:
+            raise DeviceError(f"порт {port} уже занят!")
+
+        self.ports[port] = device
+        self.attached.append((port, device))
+        if device not in self.devices:
+            self.devices.append(device)
+        return device
+
+    def read(self, port: int, tick: int) -> int:
+        return self.ports[port].read(port, tick) & 0xFFFFFFFF
+
+    def write(self, port: int, tick: int, value: int):
+        self.ports[port].write(port, tick, value)
+
+    def next_interrupt(self) -> Optional[Tuple[int, int]]:
+        """Ближайший запрос прерывания: (такт, порт) или `None`"""
+        best = None
+        for port, device in self.attached:
+            tick = device.interrupt_tick()
+            if tick is not None and (best is None or tick < best[0]):
+                best = (tick, device.interrupt_port(port))
+        return best
+
+    def intack(self, port: int, tick: int):
+        self.ports[port].intack(port, tick)
+
+    def flush(self):
+        for device in self.devices:
+            device.flush()
+
+
+def default_bus(input_path: str = None, stream: BinaryIO = None) -> PortBus:
+    """STDOUT_PORT -- захват вывода, STDIN_PORT -- ввод из файла (если задан)"""
+    bus = PortBus()
+    bus.attach(STDOUT_PORT, StdoutCapture(stream if stream is not None else sys.stdout.buffer))
+    if input_path is not None:
+        bus.attach(STDIN_PORT, FileInputStream(input_path))
+    return bus
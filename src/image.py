@@ -0,0 +1,174 @@
+import struct
+from array import array
+from multiprocessing import shared_memory
+from typing import List, Tuple, Sequence, Optional
+
+from isa import Opcode, PORT_OPS, opcode_to_binary, from_bytes
+from definitions import *
+
+
+# predecoded table: one row of ROW_SIZE ints per instruction memory word
+F_OPCODE = 0
+F_RD_T = 1
+F_RS1_T = 2
+F_RS2_T = 3
+F_RD = 4
+F_RS1 = 5
+F_RS2 = 6
+F_IMM = 7
+F_LEN = 8
+F_PORT = 9
+ROW_SIZE = 10
+
+NO_INSTRUCTION = -1  # row of an immediate word
+
+
+def predecode(binary_code: bytes) -> array:
+    """Таблица декодированных инструкций, адресуемая номером слова памяти команд"""
+    code_words = len(binary_code) // 4
+    table = array("q", [0] * (code_words * ROW_SIZE))
+    for address in range(code_words):
+        table[address * ROW_SIZE + F_OPCODE] = NO_INSTRUCTION
+
+    instructions = from_bytes(binary_code)
+    for k, instr in enumerate(instructions):
+        address = instr["index"]
+        next_address = instructions[k + 1]["index"] if k + 1 < len(instructions) else code_words
+        base = address * ROW_SIZE
+        opcode: Opcode = instr["opcode"]
+
+        table[base + F_OPCODE] = opcode_to_binary[opcode]
+        table[base + F_LEN] = next_address - address
+
+        if opcode in PORT_OPS:
+            table[base + F_PORT] = instr[PORT]
+            table[base + F_RS1] = instr.get(SRC1_REG, 0)
+            continue
+
+        table[base + F_RD_T] = instr[DST_REG_ADDR_T]
+        table[base + F_RS1_T] = instr[SRC1_REG_ADDR_T]
+        table[base + F_RS2_T] = instr[SRC2_REG_ADDR_T]
+        table[base + F_RD] = instr[DST_REG]
+        table[base + F_RS1] = instr[SRC1_REG]
+        table[base + F_RS2] = instr[SRC2_REG]
+        table[base + F_IMM] = instr.get(IMMEDIATE, 0)
+
+    return table
+
+
+# data memory file: header, then initialized words (big-endian); bss words are zero
+DATA_MAGIC = b"FDAT"
+DATA_HEADER = struct.Struct(">4sII")  # magic, initialized words, bss words
+
+
+def data_from_bytes(data: bytes) -> Tuple[array, int]:
+    """Инициализированные слова памяти данных и размер bss (файл без заголовка -- только слова)"""
+    if bytes(data[: len(DATA_MAGIC)]) != DATA_MAGIC:
+        return bytes_to_words_be(data), 0
+
+    if len(data) < DATA_HEADER.size:
+        raise ValueError("заголовок образа памяти данных обрезан!")
+    _, count, bss_size = DATA_HEADER.unpack_from(data)
+    words = bytes_to_words_be(data[DATA_HEADER.size :])
+    if len(words) != count:
+        raise ValueError(f"образ памяти данных: ожидалось {count} слов, прочитано {len(words)}!")
+    return words, bss_size
+
+
+def bytes_to_words_be(data: bytes) -> array:
+    words = array("I")
+    words.frombytes(data[: len(data) - len(data) % 4])  # any buffer, e.g. a memoryview slice
+    if words.itemsize != 4:
+        raise ValueError("тип `I` должен быть 32-битным!")
+    if array("I", [1]).tobytes()[0] == 1:
+        words.byteswap()  # little-endian host
+    return words
+
+
+class ProgramImage:
+    """Загруженная и предекодированная программа: память команд и образ памяти данных"""
+
+    def __init__(self, code: bytes, table: Sequence[int], data: Sequence[int], bss_size: int = 0,
+                 stacks: Optional[Tuple[int, int]] = None):
+        self.code = code
+        self.table = table
+        self.data = data
+        self.bss_size = bss_size
+        self.stacks = stacks  # (data, return) stack sizes in cells, if known statically
+        self.code_words = len(table) // ROW_SIZE
+
+    # bss is never materialized here: data memory of a run starts zeroed
+    @property
+    def data_size(self) -> int:
+        return len(self.data) + self.bss_size
+
+    @classmethod
+    def from_bytes(cls, code: bytes, data: bytes) -> "ProgramImage":
+        words, bss_size = data_from_bytes(data)
+        return cls(bytes(code), predecode(code), words, bss_size)
+
+    @classmethod
+    def from_files(cls, instr_file: str, data_file: str) -> "ProgramImage":
+        with open(instr_file, "rb") as file:
+            code = file.read()
+        with open(data_file, "rb") as file:
+            data = file.read()
+        return cls.from_bytes(code, data)
+
+    def row(self, pc: int) -> Sequence[int]:
+        return self.table[pc * ROW_SIZE : (pc + 1) * ROW_SIZE]
+
+
+# (shared memory name, item count) for code bytes, predecoded table, data words; bss size; stack sizes
+SharedHandle = Tuple[Tuple[str, int], Tuple[str, int], Tuple[str, int], int, Optional[Tuple[int, int]]]
+
+
+class SharedImage:
+    """Размещает образ программы в разделяемой памяти.
+
+    Дочерние процессы подключаются по `handle` через `attach_image` без копирования
+    и повторного декодирования. Владелец освобождает память в `close`.
+    """
+
+    def __init__(self, image: ProgramImage):
+        self.segments: List[shared_memory.SharedMemory] = []
+        parts = (
+            (bytes(image.code), len(image.code)),
+            (array("q", image.table).tobytes(), len(image.table)),
+            (array("I", image.data).tobytes(), len(image.data)),
+        )
+
+        handle = []
+        for payload, count in parts:
+            segment = shared_memory.SharedMemory(create=True, size=max(len(payload), 1))
+            segment.buf[: len(payload)] = payload
+            self.segments.append(segment)
+            handle.append((segment.name, count))
+
+        handle.append(image.bss_size)
+        handle.append(image.stacks)
+        self.handle: SharedHandle = tuple(handle)
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+        self.segments = []
+
+    def __enter__(self) -> "SharedImage":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_image(handle: SharedHandle) -> Tuple[ProgramImage, List[shared_memory.SharedMemory]]:
+    """Образ поверх разделяемой памяти; сегменты нужно держать живыми, пока образ используется"""
+    (code_name, code_len), (table_name, table_len), (data_name, data_len), bss_size, stacks = handle
+    segments = [shared_memory.SharedMemory(name=name) for name in (code_name, table_name, data_name)]
+
+    code = segments[0].buf[:code_len]
+    table = segments[1].buf[: table_len * 8].cast("q")
+    data = segments[2].buf[: data_len * 4].cast("I")
+
+    return ProgramImage(code, table, data, bss_size, stacks), segments
@@ -1,4 +1,6 @@
 from enum import Enum
+from typing import List, Dict, Any, Tuple, Optional
+
 from definitions import *
 
 
@@ -44,6 +46,20 @@ class Opcode(str, Enum):
     DIS_INT = "dis_int"
     IRET = "iret"
 
+    OUTS = "outs"
+    MOVS = "movs"
+    FILLS = "fills"
+
+    LOOP = "loop"
+
+    SHL = "shl"
+    SHR = "shr"
+    SAR = "sar"
+
+    LDB = "ldb"
+    STB = "stb"
+    OUTSB = "outsb"
+
     def __str__(self):
         return str(self.value)
 
@@ -82,32 +98,45 @@ opcode_to_binary = {
     Opcode.IRET: 0x1E,
     Opcode.PUSH_RS: 0x1F,
     Opcode.POP_RS: 0x20,
-    Opcode.RET: 0x21
+    Opcode.RET: 0x21,
+    Opcode.OUTS: 0x22,
+    Opcode.MOVS: 0x23,
+    Opcode.FILLS: 0x24,
+    Opcode.LOOP: 0x25,
+    Opcode.SHL: 0x26,
+    Opcode.SHR: 0x27,
+    Opcode.SAR: 0x28,
+    Opcode.LDB: 0x29,
+    Opcode.STB: 0x2A,
+    Opcode.OUTSB: 0x2B
 }
 
 binary_to_opcode = {v: k for k, v in opcode_to_binary.items()}
 
 
-def __opcode_uses_rd(opcode : Opcode) -> bool:
+def opcode_uses_rd(opcode : Opcode) -> bool:
     return opcode in {
         Opcode.MOV, Opcode.ADD, Opcode.ADC, Opcode.SUB, Opcode.MUL, Opcode.DIV, Opcode.MOD,
         Opcode.AND, Opcode.OR, Opcode.XOR, Opcode.NEG, Opcode.NOT,
-        Opcode.POP_DS, Opcode.POP_RS
+        Opcode.POP_DS, Opcode.POP_RS, Opcode.MOVS, Opcode.FILLS,
+        Opcode.SHL, Opcode.SHR, Opcode.SAR, Opcode.LDB, Opcode.STB
     }
 
 
-def __opcode_uses_rs1(opcode : Opcode) -> bool:
+def opcode_uses_rs1(opcode : Opcode) -> bool:
     return opcode in {
         Opcode.MOV, Opcode.ADD, Opcode.ADC, Opcode.SUB, Opcode.MUL, Opcode.DIV, Opcode.MOD,
         Opcode.AND, Opcode.OR, Opcode.XOR, Opcode.CMP, Opcode.NEG, Opcode.NOT,
-        Opcode.PUSH_DS, Opcode.PUSH_RS
+        Opcode.PUSH_DS, Opcode.PUSH_RS, Opcode.MOVS, Opcode.FILLS,
+        Opcode.SHL, Opcode.SHR, Opcode.SAR, Opcode.LDB, Opcode.STB
     }
 
 
-def __opcode_uses_rs2(opcode : Opcode) -> bool:
+def opcode_uses_rs2(opcode : Opcode) -> bool:
     return opcode in {
         Opcode.ADD, Opcode.ADC, Opcode.SUB, Opcode.MUL, Opcode.DIV, Opcode.MOD,
-        Opcode.AND, Opcode.OR, Opcode.XOR, Opcode.CMP
+        Opcode.AND, Opcode.OR, Opcode.XOR, Opcode.CMP, Opcode.MOVS, Opcode.FILLS,
+        Opcode.SHL, Opcode.SHR, Opcode.SAR
     }
 
 
@@ -177,11 +206,75 @@ def __pack_addr_t(rd_addr_t, rs1_addr_t, rs2_addr_t):
     return ((rd_addr_t & 0b11) << 0) | ((rs1_addr_t & 0b11) << 2) | ((rs2_addr_t & 0b11) << 4)
 
 
+# port-mapped I/O: port in bits 15..6 (outs/outsb: address register in bits 19..16)
+PORT_OPS = {Opcode.IN, Opcode.OUT, Opcode.OUTS, Opcode.OUTSB}
+STRING_OUT_OPS = {Opcode.OUTS, Opcode.OUTSB}
+
+# block instructions: run time is proportional to the number of cells
+BLOCK_OPS = {Opcode.OUTS, Opcode.MOVS, Opcode.FILLS, Opcode.OUTSB}
+
+
 JUMP_OPS = {
     Opcode.JMP, Opcode.JCC, Opcode.JCS, Opcode.JEQ, Opcode.JNE,
-    Opcode.JLT, Opcode.JGT, Opcode.JLE, Opcode.JGE
+    Opcode.JLT, Opcode.JGT, Opcode.JLE, Opcode.JGE, Opcode.LOOP
 }
 
+# short immediate form: bit 31 is set, bits 30..24 hold a signed 7-bit immediate,
+# no extension word follows
+SHORT_IMM_FLAG = 1 << 31
+SHORT_IMM_MIN = -64
+SHORT_IMM_MAX = 63
+
+
+def fits_short_imm(value: int) -> bool:
+    value &= 0xFFFFFFFF
+    if value >= 1 << 31:
+        value -= 1 << 32
+    return SHORT_IMM_MIN <= value <= SHORT_IMM_MAX
+
+
+def instruction_immediate(instr: Dict[str, Any]) -> Optional[int]:
+    if IMMEDIATE in instr:
+        return int(instr[IMMEDIATE])
+    if ADDRESS in instr:
+        return int(instr[ADDRESS])
+    if ARGUMENT in instr:
+        return int(instr[ARGUMENT])
+    return None
+
+
+def uses_immediate(instr: Dict[str, Any]) -> bool:
+    if instr["opcode"] in PORT_OPS:
+        return False
+    if instr["opcode"] in JUMP_OPS:
+        return True
+
+    return any(
+        instr.get(addressing) in (IMMEDIATE_ADDR_T, INDIRECT_IMM_OFFSET_ADDR_T)
+        for addressing in (DST_REG_ADDR_T, SRC1_REG_ADDR_T, SRC2_REG_ADDR_T)
+    )
+
+
+# short jumps are pc-relative: the immediate is `target - address of the jump`;
+# the form is chosen by the emitter's branch relaxation
+def is_short_imm(instr: Dict[str, Any]) -> bool:
+    if instr["opcode"] in JUMP_OPS:
+        return bool(instr.get(RELATIVE))
+    if not uses_immediate(instr):
+        return False
+
+    immediate = instruction_immediate(instr)
+    return immediate is not None and fits_short_imm(immediate)
+
+
+def short_immediate(word: int) -> Optional[int]:
+    if not word & SHORT_IMM_FLAG:
+        return None
+    value = (word >> 24) & 0x7F
+    if value > SHORT_IMM_MAX:
+        value -= 0x80
+    return value & 0xFFFFFFFF
+
 
 def __format_operand(addr_t_kind_bits: int, reg_id: int, immediate: int = None) -> str:
     if addr_t_kind_bits == addr_kind[REG_TO_REG_ADDR_T]:
@@ -204,8 +297,10 @@ def __pack_machine_word(opcode_bin, addr_t_bin, rd, rs1, rs2):
     ┌───────────┬──────────┬───────────┬──────────┬───────────┬──────────┐
     │  31..24   │  23..20  │  19..16   │  15..12  │   11..6   │   5..0   │              
     ├───────────┼──────────┼───────────┼──────────┼───────────┼──────────┤
-    │    0x0    │    rs2   │    rs1    │    rd    │   addr_t  │  opcode  │         
+    │ short imm │    rs2   │    rs1    │    rd    │   addr_t  │  opcode  │         
     └───────────┴──────────┴───────────┴──────────┴───────────┴──────────┘
+
+    short imm: 0x0 or 1 (bit 31) + signed 7-bit immediate (bits 30..24)
     """
     word = 0
     word |= (rs2 & 0xF) << 20
@@ -221,15 +316,18 @@ def to_bytes(code):
     binary_bytes = bytearray()
 
     for instr in code:
+        address = len(binary_bytes) // 4
         opcode : Opcode = instr["opcode"]
         opcode_bin = opcode_to_binary[opcode] & 0x3F
 
-        if opcode in (Opcode.IN, Opcode.OUT):
+        if opcode in PORT_OPS:
             if PORT not in instr:
                 raise ValueError(f"для {opcode} требуется поле `port`!")
             port = int(instr[PORT]) & 0x3FF
 
             word = 0
+            if opcode in STRING_OUT_OPS:
+                word |= (__get_reg_id(instr.get(SRC1_REG)) & 0xF) << 16
             word |= (port << 6)
             word |= opcode_bin
 
@@ -257,16 +355,18 @@ def to_bytes(code):
         addr_t_bin = __pack_addr_t(rd_addr_t=rd_addr_t, rs1_addr_t=rs1_addr_t, rs2_addr_t=rs2_addr_t)
 
         # immediate value field
-        immediate_value = None
-        if IMMEDIATE in instr:
-            immediate_value = int(instr[IMMEDIATE])
-        elif ADDRESS in instr:
-            immediate_value = int(instr[ADDRESS])
-        elif ARGUMENT in instr:
-            immediate_value = int(instr[ARGUMENT])
+        immediate_value = instruction_immediate(instr)
+        short = is_short_imm(instr)
+
+        if short and opcode in JUMP_OPS:
+            immediate_value -= address
+            if not fits_short_imm(immediate_value):
+                raise ValueError(f"смещение короткого перехода не помещается в 7 бит: {instr}!")
 
         # emitting 1st word
         word = __pack_machine_word(opcode_bin, addr_t_bin, rd, rs1, rs2)
+        if short:
+            word |= SHORT_IMM_FLAG | ((immediate_value & 0x7F) << 24)
         binary_bytes.extend(
                 (
                     (word >> 24) & 0xFF,
@@ -283,7 +383,7 @@ def to_bytes(code):
             opcode in JUMP_OPS
         )
 
-        if needs_immediate:
+        if needs_immediate and not short:
             if immediate_value is None:
                 raise ValueError(f"для {opcode} требуется `immediate/port/addr`, но он не задан: {instr}!")
             immediate_word = immediate_value & 0xFFFFFFFF
@@ -298,25 +398,76 @@ def to_bytes(code):
     return bytes(binary_bytes)
 
 
-def to_hex(code):
-    """Преобразует машинный код в текстовый файл с шестнадцатеричным представлением.
-
-    Формат вывода:
-    <address> - <HEXCODE> - <mnemonic>
-    Например:
-    0 - 00010018 - mov EAX, EBX
-    1 - 00002118 - mov ECX, #123456
-    2 - 0001E240 - imm=123456
-    3 - 00010098 - mov [EAX], EBX
-    4 - 00010318 - mov EAX, [EBX+4]
-    5 - 00000004 - imm=4
-    6 - 0000000F - jmp
-    7 - 00000064 - imm=100
-    8 - 0000009A - out port=2
-    9 - 000001DB - in port=7
-    10 - 00000021 - ret
-    """
-    binary_code = to_bytes(code)
+def __word_needs_immediate(word: int) -> bool:
+    opcode = binary_to_opcode.get(word & 0x3F, None)
+    if opcode in PORT_OPS or word & SHORT_IMM_FLAG:
+        return False
+
+    addr_t = (word >> 6) & 0x3F
+    rd_addr_t  = (addr_t >> 0) & 0b11
+    rs1_addr_t = (addr_t >> 2) & 0b11
+    rs2_addr_t = (addr_t >> 4) & 0b11
+
+    return (
+        rd_addr_t  in (addr_kind[IMMEDIATE_ADDR_T], addr_kind[INDIRECT_IMM_OFFSET_ADDR_T]) or
+        rs1_addr_t in (addr_kind[IMMEDIATE_ADDR_T], addr_kind[INDIRECT_IMM_OFFSET_ADDR_T]) or
+        rs2_addr_t in (addr_kind[IMMEDIATE_ADDR_T], addr_kind[INDIRECT_IMM_OFFSET_ADDR_T]) or
+        opcode in JUMP_OPS
+    )
+
+
+def format_instruction(word: int, immediate: int = None, address: int = None) -> str:
+    """Мнемоника инструкции по первому машинному слову (и immediate, если он есть)"""
+    opcode_bin = word & 0x3F
+    addr_t = (word >> 6) & 0x3F
+    rd = (word >> 12) & 0xF
+    rs1 = (word >> 16) & 0xF
+    rs2 = (word >> 20) & 0xF
+
+    opcode = binary_to_opcode.get(opcode_bin, None)
+    if opcode:
+        mnemonic = opcode.value
+    else:
+        mnemonic = f"unk?_{opcode_bin:02X}"
+
+    if opcode in PORT_OPS:
+        port = (word >> 6) & 0x3FF
+        if opcode in STRING_OUT_OPS:
+            return f"{mnemonic} [{__get_reg_name_by_id(rs1)}] port={port}"
+        return f"{mnemonic} port={port}"
+
+    if opcode in JUMP_OPS and word & SHORT_IMM_FLAG:
+        offset = short_immediate(word)
+        if offset > 0x7FFFFFFF:
+            offset -= 1 << 32
+        if address is None:
+            return f"{mnemonic} rel={offset}"
+        return f"{mnemonic} rel={offset} ({address + offset})"
+
+    if immediate is None:
+        immediate = short_immediate(word)
+
+    rd_addr_t  = (addr_t >> 0) & 0b11
+    rs1_addr_t = (addr_t >> 2) & 0b11
+    rs2_addr_t = (addr_t >> 4) & 0b11
+
+    operands = []
+    if opcode_uses_rd(opcode):
+        operands.append(__format_operand(rd_addr_t, rd, immediate))
+
+    if opcode_uses_rs1(opcode):
+        operands.append(__format_operand(rs1_addr_t, rs1, immediate))
+
+    if opcode_uses_rs2(opcode):
+        operands.append(__format_operand(rs2_addr_t, rs2, immediate))
+
+    if operands:
+        return f"{mnemonic} " + ", ".join(operands)
+    return mnemonic
+
+
+def disassemble(binary_code) -> List[Tuple[int, int, str]]:
+    """Разбирает бинарный код на строки листинга: (адрес, машинное слово, мнемоника)"""
     result = []
     i = 0
 
@@ -331,38 +482,7 @@ def to_hex(code):
             | binary_code[i + 3]
         )
 
-        opcode_bin = word & 0x3F
-        addr_t = (word >> 6) & 0x3F
-        rd = (word >> 12) & 0xF
-        rs1 = (word >> 16) & 0xF
-        rs2 = (word >> 20) & 0xF
-
-        opcode = binary_to_opcode.get(opcode_bin, None)
-        if opcode:
-            mnemonic = opcode.value
-        else:
-            mnemonic = f"unk?_{opcode_bin:02X}"
-        
-        address = i // 4
-        hex_word = f"{word:08X}"
-
-        if opcode in (Opcode.IN, Opcode.OUT):
-            port = (word >> 6) & 0x3FF
-            line = f"{address} - {hex_word} - {mnemonic} port={port}"
-            result.append(line)
-            i += 4
-            continue
-
-        rd_addr_t  = (addr_t >> 0) & 0b11
-        rs1_addr_t = (addr_t >> 2) & 0b11
-        rs2_addr_t = (addr_t >> 4) & 0b11
-
-        needs_immediate = (
-            rd_addr_t  in (addr_kind[IMMEDIATE_ADDR_T], addr_kind[INDIRECT_IMM_OFFSET_ADDR_T]) or
-            rs1_addr_t in (addr_kind[IMMEDIATE_ADDR_T], addr_kind[INDIRECT_IMM_OFFSET_ADDR_T]) or
-            rs2_addr_t in (addr_kind[IMMEDIATE_ADDR_T], addr_kind[INDIRECT_IMM_OFFSET_ADDR_T]) or
-            opcode in JUMP_OPS
-        )
+        needs_immediate = __word_needs_immediate(word)
 
         immediate = None
         if needs_immediate:
@@ -376,31 +496,39 @@ def to_hex(code):
                     | binary_code[i + 7]
                 )
 
-        
-
-        operands = []
-        if __opcode_uses_rd(opcode):
-            operands.append(__format_operand(rd_addr_t, rd, immediate))
-
-        if __opcode_uses_rs1(opcode):
-            operands.append(__format_operand(rs1_addr_t, rs1, immediate))
-
-        if __opcode_uses_rs2(opcode):
-            operands.append(__format_operand(rs2_addr_t, rs2, immediate))
-
-        if operands:
-            mnemonic_to_print = f"{mnemonic} " + ", ".join(operands)
-        else:
-            mnemonic_to_print = mnemonic
-
-        result.append(f"{address} - {hex_word} - {mnemonic_to_print}")
+        result.append((i // 4, word, format_instruction(word, immediate, i // 4)))
         i += 4
 
         if needs_immediate and immediate is not None:
-            result.append(f"{i // 4} - {immediate:08X} - imm={immediate}")
+            result.append((i // 4, immediate, f"imm={immediate}"))
             i += 4
 
-    return "\n".join(result)
+    return result
+
+
+def to_hex(code):
+    """Преобразует машинный код в текстовый файл с шестнадцатеричным представлением.
+
+    Формат вывода:
+    <address> - <HEXCODE> - <mnemonic>
+    Например:
+    0 - 00010018 - mov EAX, EBX
+    1 - 00002118 - mov ECX, #123456
+    2 - 0001E240 - imm=123456
+    3 - 00010098 - mov [EAX], EBX
+    4 - 00010318 - mov EAX, [EBX+4]
+    5 - 00000004 - imm=4
+    6 - 0000000F - jmp
+    7 - 00000064 - imm=100
+    8 - 0000009A - out port=2
+    9 - 000001DB - in port=7
+    10 - 00000021 - ret
+    """
+    binary_code = to_bytes(code)
+    return "\n".join(
+        f"{address} - {word:08X} - {mnemonic}"
+        for address, word, mnemonic in disassemble(binary_code)
+    )
 
 
 def from_bytes(binary_code):
@@ -423,11 +551,12 @@ def from_bytes(binary_code):
         opcode_bin = binary_instr & 0x3F
         opcode = binary_to_opcode.get(opcode_bin, Opcode.NOP)
 
-        if opcode in (Opcode.IN, Opcode.OUT):
+        if opcode in PORT_OPS:
             port = (binary_instr >> 6) & 0x3FF
-            structured_code.append(
-                {"index": instr_index, "opcode": opcode, "port": port}
-            )
+            instr = {"index": instr_index, "opcode": opcode, "port": port}
+            if opcode in STRING_OUT_OPS:
+                instr[SRC1_REG] = (binary_instr >> 16) & 0xF
+            structured_code.append(instr)
             instr_index += 1
             continue
 
@@ -460,7 +589,14 @@ def from_bytes(binary_code):
             opcode in JUMP_OPS
         )
 
-        if needs_immediate:
+        if binary_instr & SHORT_IMM_FLAG:
+            instr[IMMEDIATE] = short_immediate(binary_instr)
+            if opcode in JUMP_OPS:
+                # pc-relative -> absolute target
+                instr[IMMEDIATE] = (instr[IMMEDIATE] + instr_index) & 0xFFFFFFFF
+                instr[RELATIVE] = True
+            instr_index += 1
+        elif needs_immediate:
             if i + 3 >= len(binary_code):
                 raise ValueError(f"ожидался immediate для {opcode}, но достигнут EOF!")
 
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+
+import bisect
+import sys
+from typing import List, Dict, Any, Tuple, Optional
+
+from definitions import LOCATION
+from codegen import instruction_len
+
+
+NO_LINE = 0  # entry of code without a source position (vectors table, final halt, stdlib)
+
+
+class LineTable:
+    """Таблица pc -> (файл, строка).
+
+    Хранятся только точки смены позиции: `(pc, номер файла, строка)` по возрастанию pc;
+    позиция действует до следующей записи. Строка `NO_LINE` -- код без позиции.
+
+    Текстовый формат (`.lines`): строки `file <номер> <путь>`, затем `<pc> <номер файла> <строка>`.
+    """
+
+    def __init__(self, files: List[str], entries: List[Tuple[int, int, int]]):
+        self.files = files
+        self.entries = entries
+        self.starts = [pc for pc, _, _ in entries]
+
+    @classmethod
+    def from_code(cls, code: List[Dict[str, Any]]) -> "LineTable":
+        """По коду после `Emitter.patch_all` (длины инструкций окончательные)"""
+        files: List[str] = []
+        file_index: Dict[str, int] = {}
+        entries: List[Tuple[int, int, int]] = []
+
+        pc = 0
+        for instruction in code:
+            location = instruction.get(LOCATION)
+            if location is None:
+                position = (0, NO_LINE)
+            else:
+                if location.file not in file_index:
+                    file_index[location.file] = len(files)
+                    files.append(location.file)
+                position = (file_index[location.file], location.line)
+
+            if not entries or entries[-1][1:] != position:
+                entries.append((pc,) + position)
+            pc += instruction_len(instruction)
+
+        return cls(files, entries)
+
+    def lookup(self, pc: int) -> Optional[Tuple[str, int]]:
+        k = bisect.bisect_right(self.starts, pc) - 1
+        if k < 0:
+            return None
+        _, file, line = self.entries[k]
+        if line == NO_LINE:
+            return None
+        return self.files[file], line
+
+    def to_text(self) -> str:
+        lines = [f"file {k} {name}" for k, name in enumerate(self.files)]
+        lines += [f"{pc} {file} {line}" for pc, file, line in self.entries]
+        return "\n".join(lines)
+
+    @classmethod
+    def from_text(cls, text: str) -> "LineTable":
+        files: List[str] = []
+        entries: List[Tuple[int, int, int]] = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("file "):
+                _, _, name = line.split(maxsplit=2)
+                files.append(name)
+                continue
+            pc, file, number = line.split()
+            entries.append((int(pc), int(file), int(number)))
+        return cls(files, entries)
+
+    @classmethod
+    def load(cls, path: str) -> "LineTable":
+        with open(path, "r", encoding="utf-8") as file:
+            return cls.from_text(file.read())
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 3, "Неверные аргументы: linemap.py <lines_file> <pc> [<pc> ...]"
+
+    table = LineTable.load(sys.argv[1])
+    for pc in sys.argv[2:]:
+        position = table.lookup(int(pc, 0))
+        print(f"{pc}: {'??' if position is None else f'{position[0]}:{position[1]}'}")
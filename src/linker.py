@@ -0,0 +1,591 @@
+#!/usr/bin/python3
+
+import copy
+import hashlib
+import json
+import os
+from typing import List, Dict, Any, Tuple, Optional
+
+from isa import Opcode, Register
+from definitions import *
+from ast_nodes import Definition, Vector, StringLiteral, Const, Variable, Alloc, Number, Program
+from codegen import DataLayout, Emitter, gen_body, instruction_len, UnrollPolicy, DEFAULT_UNROLL
+from codegen import ENTRY_LABEL, VECTORS_LABEL, VECTOR_BASE
+from tokenizer import tokenize, SourceLocation
+from parser import Parser
+from preprocessor import split_requires, PreprocessError
+from stdlib import WORDS as STDLIB_WORDS, STDLIB_NAME, emit_words as emit_stdlib_words
+from stdlib import STACK_EFFECTS as STDLIB_STACK_EFFECTS
+from stack_effect import Effect, NOTHING, StackAnalyzer, stack_usage
+from outliner import outline as outline_code
+from partial_eval import PartialEvaluator
+
+
+OBJECT_MAGIC = "FOBJ"
+OBJECT_VERSION = 3
+OBJECT_EXT = ".fo"
+
+REGISTER_FIELDS = (DST_REG, SRC1_REG, SRC2_REG)
+
+
+class LinkError(Exception):
+    pass
+
+
+# Effect saved as a JSON list
+def effect_from_json(fields) -> Optional[Effect]:
+    if fields is None:
+        return None
+    *counts, falls, irets = fields
+    return Effect(*counts, falls, tuple(irets))
+
+
+class ObjectModule:
+    """Перемещаемый объектный модуль: результат трансляции одного файла до компоновки.
+
+    Код хранится в виде инструкций транслятора (словари, как у `Emitter`) с
+    неразрешёнными метками: длины инструкций (короткие непосредственные значения,
+    короткие переходы) зависят от итоговых адресов и выбираются при компоновке.
+
+    - `code[:body_start]` -- процедуры, `code[body_start:]` -- код верхнего уровня
+    - `labels` -- метка -> индекс инструкции; `procedures` -- экспортируемые метки
+    - `patches` -- записи перемещения: `label` (метка кода, возможно внешняя)
+      или `symbol` (символ данных, возможно внешний)
+    - `data` -- инициализированные слова, `bss_size` -- размер нулевой области,
+      `symbols` -- символы данных с адресами относительно начала `data`
+      (для bss -- относительно `len(data)`)
+    - `effects` -- стековые эффекты процедур, `body_effect` -- кода верхнего уровня
+      (`None` -- глубина не ограничена статически)
+    - `unroll` -- параметры развёртки циклов, с которыми собран модуль
+    """
+
+    def __init__(self, name: str, code: List[Dict[str, Any]], labels: Dict[str, int],
+                 patches: List[Dict[str, Any]], body_start: int, procedures: List[str],
+                 data: List[int], bss_size: int, symbols: Dict[str, Dict[str, Any]],
+                 vectors: Dict[int, str], requires: List[str] = (),
+                 source: str = None,
+                 effects: Dict[str, Optional[Effect]] = None, body_effect: Optional[Effect] = NOTHING,
+                 unroll: Optional[UnrollPolicy] = None):
+        self.name = name
+        self.code = code
+        self.labels = labels
+        self.patches = patches
+        self.body_start = body_start
+        self.procedures = procedures
+        self.data = data
+        self.bss_size = bss_size
+        self.symbols = symbols
+        self.vectors = vectors
+        self.requires = list(requires)
+        self.source = source
+        self.effects = effects or {}
+        self.body_effect = body_effect
+        self.unroll = unroll
+
+    def imports(self) -> List[str]:
+        labels = {patch["label"] for patch in self.patches if "label" in patch} - set(self.labels)
+        symbols = {patch["symbol"] for patch in self.patches if "symbol" in patch} - set(self.symbols)
+        return sorted(labels | symbols)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "magic": OBJECT_MAGIC,
+            "version": OBJECT_VERSION,
+            "name": self.name,
+            "source": self.source,
+            "effects": self.effects,
+            "body_effect": self.body_effect,
+            "unroll": self.unroll,
+            "requires": self.requires,
+            "code": self.code,
+            "labels": self.labels,
+            "patches": self.patches,
+            "body_start": self.body_start,
+            "procedures": self.procedures,
+            "data": self.data,
+            "bss_size": self.bss_size,
+            "symbols": self.symbols,
+            "vectors": {str(port): handler for port, handler in self.vectors.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, obj: Dict[str, Any]) -> "ObjectModule":
+        if obj.get("magic") != OBJECT_MAGIC or obj.get("version") != OBJECT_VERSION:
+            raise LinkError(f"неподдерживаемый объектный файл: {obj.get('magic')} v{obj.get('version')}!")
+
+        code = []
+        for instruction in obj["code"]:
+            instruction = dict(instruction, opcode=Opcode(instruction["opcode"]))
+            if instruction.get(LOCATION) is not None:
+                instruction[LOCATION] = SourceLocation(*instruction[LOCATION])
+            for field in REGISTER_FIELDS:
+                if instruction.get(field) is not None:
+                    instruction[field] = Register(instruction[field])
+            code.append(instruction)
+
+        return cls(
+            obj["name"], code, obj["labels"], obj["patches"], obj["body_start"], obj["procedures"],
+            obj["data"], obj["bss_size"], obj["symbols"],
+            {int(port): handler for port, handler in obj["vectors"].items()},
+            obj["requires"], obj["source"],
+            {word: effect_from_json(effect) for word, effect in obj["effects"].items()}, effect_from_json(obj["body_effect"]),
+            UnrollPolicy(*obj["unroll"]) if obj.get("unroll") is not None else None
+        )
+
+
+def save_object(module: ObjectModule, path: str):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(module.to_dict(), file)
+
+
+def load_object(path: str) -> ObjectModule:
+    with open(path, "r", encoding="utf-8") as file:
+        return ObjectModule.from_dict(json.load(file))
+
+
+def __port_value(port, dm: DataLayout) -> int:
+    if isinstance(port, Number):
+        return int(port.value)
+    if isinstance(port, Const):
+        if (port.number is not None) and isinstance(port.number, Number):
+            return int(port.number.value)
+        return int(dm.resolve_const_value(port.ident.value))
+    raise ValueError("vector <num|const> : <handler> — неверный тип порта!")
+
+
+def compile_module(ast: Program, name: str, imports: List[ObjectModule] = (),
+                   unroll: UnrollPolicy = DEFAULT_UNROLL, evaluate: bool = True) -> ObjectModule:
+    """Трансляция одного модуля; `imports` -- модули, символы которых ему доступны;
+    без `evaluate` вызовы чистых слов не вычисляются при трансляции (см. `partial_eval.py`)"""
+    dm = DataLayout()
+    em = Emitter()
+    em.unroll = unroll
+
+    imported_procedures: Dict[str, Any] = {}
+    for module in imports:
+        for symbol, meta in module.symbols.items():
+            dm.add_extern(symbol, meta)
+        for procedure in module.procedures:
+            imported_procedures[procedure] = None
+
+    # consts
+    for binding in ast.bindings:
+        if isinstance(binding, Const):
+            if not isinstance(binding.number, Number):
+                raise ValueError(f"const {binding.ident.value} должен иметь числовое значение!")
+            dm.add_const(binding.ident.value, binding.number.value)
+
+    # str_lits
+    for binding in ast.bindings:
+        if isinstance(binding, StringLiteral):
+            string = binding.string.value
+            dm.add_pstr(binding.ident.value, string, binding.packed)
+
+    # vars
+    for binding in ast.bindings:
+        if isinstance(binding, Variable):
+            dm.add_var(binding.ident.value)
+
+    # allocs
+    for binding in ast.bindings:
+        if isinstance(binding, Alloc):
+            if isinstance(binding.number, Number):
+                size = binding.number.value
+            elif isinstance(binding.number, Const):
+                if (binding.number.number is not None) and isinstance(binding.number.number, Number):
+                    size = binding.number.number.value
+                else:
+                    size = dm.resolve_const_value(binding.number.ident.value)
+            else:
+                raise ValueError(f"alloc {binding.ident.value} требует число или const!")
+            dm.add_alloc(binding.ident.value, size)
+
+    # procedures/vectors
+    vectors: Dict[int, str] = {}
+    procedure_bodies: Dict[str, Any] = {}
+    definitions: Dict[str, Definition] = {}
+    for binding in ast.bindings:
+        if isinstance(binding, Definition):
+            procedure_bodies[binding.ident.value] = binding.body
+            definitions[binding.ident.value] = binding
+
+        elif isinstance(binding, Vector):
+            port_val = __port_value(binding.port, dm)
+            if port_val in vectors:
+                raise ValueError(f"повторное определение обработчика порта {port_val}!")
+            vectors[port_val] = binding.ident.value
+
+    # standard library words are the lowest priority: they never shadow data symbols or definitions
+    procedure_map = {word: None for word in STDLIB_WORDS if word not in dm.symbols}
+    procedure_map.update(imported_procedures)
+    procedure_map.update(procedure_bodies)
+
+    # calls of pure words on constant arguments are evaluated now
+    if evaluate:
+        evaluator = PartialEvaluator(
+            procedure_bodies,
+            {symbol: meta["value"] for symbol, meta in dm.symbols.items() if meta["kind"] == CONST_KIND},
+            {word for word in STDLIB_WORDS if word in procedure_map and word not in imported_procedures
+             and word not in procedure_bodies}
+        )
+        for body in list(procedure_bodies.values()) + [ast.body]:
+            evaluator.fold_body(body)
+        for word, count in evaluator.folded.items():
+            print(f"Evaluated at compile time: {word} x{count}")
+
+    # procedures (`ret` in the end)
+    for procedure, body in procedure_bodies.items():
+        em.mark(procedure)
+        em.location = definitions[procedure].loc
+        gen_body(em, body, procedure_map, dm)
+        em.location = definitions[procedure].end_loc
+        em.emit(
+            {"opcode": Opcode.RET}
+        )
+
+    # top-level body
+    body_start = len(em.code)
+    em.location = None
+    gen_body(em, ast.body, procedure_map, dm)
+
+    # stack effects
+    known = {word: effect for word, effect in STDLIB_STACK_EFFECTS.items() if word not in dm.symbols}
+    for module in imports:
+        known.update(module.effects)
+
+    analyzer = StackAnalyzer(procedure_bodies, known, dm.symbols)
+    effects = {procedure: analyzer.word(procedure) for procedure in procedure_bodies}
+    body_effect = analyzer.body(ast.body)
+    if body_effect is not None and body_effect.low < 0:
+        analyzer.warn(name, f"код верхнего уровня снимает со стека данных {-body_effect.low} значений сверх положенных")
+    for warning in analyzer.warnings:
+        print(f"Предупреждение: {warning}")
+
+    return ObjectModule(
+        name, em.code, em.label_index, em.patches, body_start, list(procedure_bodies),
+        dm.words(), dm.bss_size, dm.local_symbols(), vectors,
+        effects=effects, body_effect=body_effect, unroll=unroll
+    )
+
+
+# copy code[start:end] of `module` into `em`, renaming module-local labels
+def __splice(em: Emitter, module: ObjectModule, start: int, end: int, prefix: str, include_end: bool):
+    def rename(label: str) -> str:
+        if label in module.procedures or label not in module.labels:
+            return label  # exported or external
+        return f"{prefix}{label}"
+
+    marks: Dict[int, List[str]] = {}
+    for label, index in module.labels.items():
+        if start <= index < end or (include_end and index == end):
+            marks.setdefault(index, []).append(label)
+
+    patches: Dict[int, List[Dict[str, Any]]] = {}
+    for patch in module.patches:
+        if start <= patch["idx"] < end:
+            patches.setdefault(patch["idx"], []).append(patch)
+
+    for index in range(start, end + 1):
+        for label in marks.get(index, ()):
+            em.mark(rename(label))
+        if index == end:
+            break
+
+        for patch in patches.get(index, ()):
+            patch = dict(patch, idx=len(em.code))
+            if "label" in patch:
+                patch["label"] = rename(patch["label"])
+            em.patches.append(patch)
+        em.emit(dict(module.code[index]))
+
+
+def stdlib_module(words: List[str]) -> ObjectModule:
+    em = Emitter()
+    emit_stdlib_words(em, words)
+    return ObjectModule(
+        STDLIB_NAME, em.code, em.label_index, em.patches, len(em.code), list(words),
+        [], 0, {}, {},
+        effects={word: STDLIB_STACK_EFFECTS[word] for word in words}
+    )
+
+
+# standard library words referenced by `modules` and not defined in them
+def __stdlib_references(modules: List[ObjectModule]) -> List[str]:
+    defined = {procedure for module in modules for procedure in module.procedures}
+    referenced = {label for module in modules for label in module.imports()}
+    return [word for word in STDLIB_WORDS if word in referenced and word not in defined]
+
+
+# (procedure, start, end) code ranges of a module: procedures are emitted back to back before the top-level body
+def __procedure_ranges(module: ObjectModule) -> List[Tuple[str, int, int]]:
+    starts = sorted((module.labels[procedure], procedure) for procedure in module.procedures)
+    return [
+        (procedure, start, starts[k + 1][0] if k + 1 < len(starts) else module.body_start)
+        for k, (start, procedure) in enumerate(starts)
+    ]
+
+
+# code of a procedure up to label names: references to its own labels become offsets
+def __body_key(module: ObjectModule, k: int, procedure: str, start: int, end: int, aliases: Dict[str, str]) -> Tuple:
+    patches: Dict[int, List[Dict[str, Any]]] = {}
+    for patch in module.patches:
+        if start <= patch["idx"] < end:
+            patches.setdefault(patch["idx"], []).append(patch)
+
+    key = []
+    for index in range(start, end):
+        instruction = {field: value for field, value in module.code[index].items() if field != LOCATION}
+        for patch in patches.get(index, ()):
+            if "symbol" in patch:
+                instruction[patch["field"]] = ("symbol", patch["symbol"])
+                continue
+            label = patch["label"]
+            target = module.labels.get(label)
+            if label == procedure or (label not in module.procedures and target is not None and start <= target < end):
+                instruction[patch["field"]] = ("offset", target - start)
+            elif label in module.procedures or target is None:
+                instruction[patch["field"]] = ("label", aliases.get(label, label))  # another procedure or an external word
+            else:
+                instruction[patch["field"]] = ("label", k, label)  # module-local label elsewhere
+        key.append(tuple(sorted(instruction.items(), key=lambda item: item[0])))
+
+    return tuple(key)
+
+
+def __identical_procedures(modules: List[ObjectModule]) -> Dict[str, str]:
+    """Процедуры с одинаковым кодом (с точностью до имён меток): повтор -> первая такая процедура.
+    Вызовы свёрнутых процедур считаются вызовами оставшейся, поэтому проход повторяется до неподвижной точки"""
+    aliases: Dict[str, str] = {}
+    while True:
+        first: Dict[Tuple, str] = {}
+        found: Dict[str, str] = {}
+        for k, module in enumerate(modules):
+            for procedure, start, end in __procedure_ranges(module):
+                key = __body_key(module, k, procedure, start, end, aliases)
+                if key in first:
+                    found[procedure] = first[key]
+                else:
+                    first[key] = procedure
+        if found == aliases:
+            return aliases
+        aliases = found
+
+
+def link_modules(modules: List[ObjectModule], outline: bool = False) -> Tuple[List[Dict[str, Any]], DataLayout, Dict[str, Tuple[int, int]]]:
+    """Компоновка: данные всех модулей, затем их bss; таблица векторов, процедуры
+    (и нужные слова стандартной библиотеки), код верхнего уровня модулей в порядке `modules` и `halt`.
+    С `outline` повторяющиеся последовательности инструкций выносятся в подпрограммы (см. `outliner.py`)"""
+    stdlib_words = __stdlib_references(modules)
+    if stdlib_words:
+        modules = list(modules) + [stdlib_module(stdlib_words)]
+
+    dm = DataLayout()
+    em = Emitter()
+
+    # data layout: initialized words of every module first, then every bss
+    init_base: List[int] = []
+    for module in modules:
+        init_base.append(len(dm.mem))
+        dm.mem.extend(module.data)
+
+    bss_base: List[int] = []
+    for module in modules:
+        bss_base.append(len(dm.mem) + dm.bss_size)
+        dm.bss_size += module.bss_size
+    dm.cursor = len(dm.mem) + dm.bss_size
+
+    for k, module in enumerate(modules):
+        for name, meta in module.symbols.items():
+            if name in dm.symbols:
+                raise LinkError(f"символ данных `{name}` определён в нескольких модулях (`{module.name}`)!")
+            if meta.get("bss"):
+                address = bss_base[k] + meta["addr"] - len(module.data)
+            else:
+                address = init_base[k] + meta["addr"]
+            dm.symbols[name] = dict(meta, addr=address)
+
+    em.symbols = {name: meta["addr"] for name, meta in dm.symbols.items()}
+
+    procedures: Dict[str, str] = {}
+    vectors: Dict[int, str] = {}
+    for module in modules:
+        for procedure in module.procedures:
+            if procedure in procedures or procedure in dm.symbols:
+                raise LinkError(f"слово `{procedure}` определено в нескольких модулях (`{module.name}`)!")
+            procedures[procedure] = module.name
+        for port, handler in module.vectors.items():
+            if port in vectors:
+                raise LinkError(f"повторное определение обработчика порта {port} (`{module.name}`)!")
+            vectors[port] = handler
+
+    # vectors table
+    em.mark(VECTORS_LABEL)
+    em.emit_jmp_to_label(ENTRY_LABEL, Opcode.JMP, relative=False)
+
+    while em.pc_words < VECTOR_BASE:
+        em.emit(
+            {"opcode": Opcode.NOP}
+        )
+
+    for port, handler in sorted(vectors.items()):
+        while em.pc_words < VECTOR_BASE + port:
+            em.emit(
+                {"opcode": Opcode.NOP}
+            )
+        em.emit_jmp_to_label(handler, Opcode.JMP, relative=False)
+
+    code_start = len(em.code)
+
+    # identical code folding: a repeated body is not emitted, its name marks the first copy
+    aliases = __identical_procedures(modules)
+    folded: Dict[str, List[str]] = {}
+    for alias, procedure in aliases.items():
+        folded.setdefault(procedure, []).append(alias)
+
+    kept: Dict[str, Tuple[int, int]] = {}
+    for k, module in enumerate(modules):
+        for procedure, start, end in __procedure_ranges(module):
+            if procedure in aliases:
+                continue
+            for alias in folded.get(procedure, ()):
+                em.mark(alias)
+            kept[procedure] = (len(em.code), len(em.code) + end - start)
+            __splice(em, module, start, end, f"{k}:", include_end=False)
+
+    em.mark(ENTRY_LABEL)
+    for k, module in enumerate(modules):
+        __splice(em, module, module.body_start, len(module.code), f"{k}:", include_end=True)
+    em.emit(
+        {"opcode": Opcode.HALT}
+    )
+
+    outlined = None
+    if outline:
+        unoutlined = copy.deepcopy(em)
+        outlined = outline_code(em, code_start)
+        em = outlined.em
+
+    try:
+        em.patch_all()
+    except ValueError as error:
+        raise LinkError(f"неразрешённая ссылка: {error}") from error
+
+    if outlined is not None:
+        unoutlined.patch_all()
+        saved = unoutlined.pc_words - em.pc_words
+        print(
+            f"Outlining: {outlined.replaced} sequences -> {len(outlined.names)} subroutines, "
+            f"{saved} words ({saved * BYTES_PER_WORD} bytes) saved"
+        )
+
+    if aliases:
+        # `kept` indexes the code before outlining
+        spliced = unoutlined if outlined is not None else em
+        saved = 0
+        for alias, procedure in aliases.items():
+            start, end = kept[procedure]
+            words = sum(instruction_len(instruction) for instruction in spliced.code[start:end])
+            saved += words
+            print(f"Folded: {alias} -> {procedure} ({words} words)")
+        print(f"Identical code folding: {len(aliases)} procedures, {saved} words ({saved * BYTES_PER_WORD} bytes) saved")
+
+    # stacks: sized exactly when the depth is bounded statically
+    effects: Dict[str, Optional[Effect]] = {}
+    for module in modules:
+        effects.update(module.effects)
+    analyzer = StackAnalyzer({}, effects, ())
+    handlers = [analyzer.handler(handler) for handler in vectors.values()]
+    for warning in analyzer.warnings:
+        print(f"Предупреждение: {warning}")
+
+    usage = stack_usage([module.body_effect for module in modules], handlers)
+    if usage is not None and outlined is not None:
+        # calls of outlined subroutines keep their return addresses on the return stack;
+        # a handler may enter them while the interrupted code is inside one too
+        nesting = 2 if handlers else 1
+        usage = usage._replace(ret=usage.ret + nesting * outlined.depth)
+    if usage is not None:
+        dm.data_stack_size, dm.return_stack_size = usage
+        print(f"Stacks: data {usage.data}, return {usage.ret} cells")
+    else:
+        print("Stacks: depth is not bounded statically, default sizes are used")
+
+    dm.dump_symbols(hex_mode=True)
+    return em.code, dm, em.symbol_map([VECTORS_LABEL] + list(procedures) + [ENTRY_LABEL] + (outlined.names if outlined is not None else []))
+
+
+def compile_program(ast, outline: bool = False, unroll: UnrollPolicy = DEFAULT_UNROLL, evaluate: bool = True) -> Tuple[List[Dict[str, Any]], DataLayout, Dict[str, Tuple[int, int]]]:
+    """Трансляция программы, собранной в одну единицу препроцессором"""
+    return link_modules([compile_module(ast, "main", unroll=unroll, evaluate=evaluate)], outline)
+
+
+def object_path(source_file: str, object_dir: str = None) -> str:
+    """Объектный файл рядом с исходным текстом, а в общем каталоге `object_dir` --
+    с хешем полного пути в имени: одноимённые модули из разных каталогов не совпадают"""
+    stem = os.path.splitext(os.path.basename(source_file))[0]
+    if object_dir is None:
+        return os.path.join(os.path.dirname(source_file), stem + OBJECT_EXT)
+    digest = hashlib.sha1(os.path.abspath(source_file).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(object_dir, f"{stem}-{digest}{OBJECT_EXT}")
+
+
+def build_objects(source_file: str, object_dir: str = None,
+                  unroll: UnrollPolicy = DEFAULT_UNROLL) -> List[ObjectModule]:
+    """Раздельная трансляция: модуль и его `#require`-зависимости в объектные файлы.
+
+    Модуль транслируется заново, только если объектного файла нет, он старше
+    исходного текста или объектного файла какой-либо зависимости, собран из
+    другого файла или с другими параметрами. Возвращает модули в порядке компоновки (зависимости раньше).
+    """
+    if object_dir is not None:
+        os.makedirs(object_dir, exist_ok=True)
+
+    ordered: List[ObjectModule] = []
+    built: Dict[str, Tuple[ObjectModule, float, List[str]]] = {}  # path -> (module, object mtime, closure)
+    visiting: List[str] = []
+
+    def visit(path: str):
+        if path in built:
+            return
+        if path in visiting:
+            raise PreprocessError(f"циклическая зависимость: {' -> '.join(visiting + [path])}!")
+        visiting.append(path)
+
+        source, requires = split_requires(path)
+        closure: List[str] = []
+        for required in requires:
+            visit(required)
+            for dependency in built[required][2] + [required]:
+                if dependency not in closure:
+                    closure.append(dependency)
+
+        target = object_path(path, object_dir)
+        module = None
+        if os.path.exists(target):
+            object_mtime = os.path.getmtime(target)
+            fresh = object_mtime >= os.path.getmtime(path) and \
+                all(built[dependency][1] <= object_mtime for dependency in closure)
+            if fresh:
+                try:
+                    module = load_object(target)
+                except LinkError:
+                    module = None  # older object format
+                if module is not None and (module.source != path or module.requires != requires
+                                           or module.unroll != unroll):
+                    module = None
+
+        if module is None:
+            print(f"Compiling {path}...")
+            ast = Parser(tokenize(source, path)).parse()
+            imports = [built[dependency][0] for dependency in closure]
+            module = compile_module(ast, os.path.splitext(os.path.basename(path))[0], imports, unroll)
+            module.requires = requires
+            module.source = path
+            save_object(module, target)
+
+        built[path] = (module, os.path.getmtime(target), closure)
+        ordered.append(module)
+        visiting.pop()
+
+    visit(os.path.abspath(source_file))
+    return ordered
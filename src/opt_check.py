@@ -0,0 +1,184 @@
+#!/usr/bin/python3
+
+"""Проверка оптимизаций, переписывающих код: вывод не должен меняться.
+
+Каждая программа (примеры из `examples/` и короткие случаи `CASES`) транслируется
+без оптимизаций (без вычисления при трансляции, развёртки и выноса повторов) и с
+каждой из них (`VARIANTS`); выводы и статусы прогонов на `simt` должны совпадать
+с неоптимизированной сборкой. Печатается таблица тактов и размеров кода.
+
+Граф потока управления (`cfg.py`), на котором держатся анализы регистров,
+проверяется отдельно (`check_cfg`) на программе с `if`/`else`, `times`, `begin`/`until` и вызовом.
+"""
+
+import contextlib
+import glob
+import io
+import os
+import sys
+from typing import List, Dict, Tuple, Any
+
+from isa import Opcode, to_bytes as isa_to_bytes
+from preprocessor import preprocess
+from tokenizer import tokenize
+from parser import Parser
+from codegen import Emitter, UnrollPolicy
+from linker import compile_module, compile_program
+from cfg import CFG, Block
+from image import ProgramImage
+from simt import run_simt
+from translator import data_to_bytes, stack_sizes
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples")
+
+# example -> input runs
+EXAMPLE_INPUTS: Dict[str, List[str]] = {
+    "hello_user": ["Alice", ""],
+}
+
+CASES: Dict[str, str] = {
+    "r@ under if": "4 times r@ 2 mod 0 = if r@ . else r@ neg . then next",
+    "nested times": "3 times r@ . 2 times r@ 10 * . next r@ . next",
+    "count 0": "0 times r@ . next 0 times 7 . next",
+    "computed count": "0 2 - times r@ . next",
+    "const count": "const N 6\nN times r@ . next N 2 * times 1 . next",
+    "long loop": "37 times 5 . next 100 times r@ drop next 9 .",
+    "r@ in begin": "3 times 2 begin r@ . 1 - dup 0 = until drop next",
+    ">r in times": "3 times 1 >r r@ . r> . next",
+    "alloc buf": "const N 8\nalloc buf N\nN times r@ buf r@ 1 - + ! next N times buf r@ 1 - + @ . next",
+    "pure words": ": sq dup * ;\n: fact dup 1 > if dup 1 - fact * then ;\n"
+                  "4 sq . 5 fact . 3 sq sq . 7 0 max . 0 5 - abs .",
+    "repeats": ": a 1 + 2 * 3 - . ;\n: b 5 1 + 2 * 3 - . ;\n4 a b 10 1 + 2 * 3 - .",
+    # the interrupt comes inside the shared sequence, the handler enters it again
+    "shared in handler": ": h key 1 + 2 * 3 - . _enable_int_ _iret_ ;\nvector 1 : h\n"
+                         "5 1 + 2 * 3 - . _enable_int_ _disable_int_ 6 1 + 2 * 3 - . _enable_int_ _disable_int_",
+}
+
+# case -> input runs
+CASE_INPUTS: Dict[str, List[str]] = {
+    "shared in handler": ["ab"],
+}
+
+CFG_CASE = ": sq dup * ;\n3 times r@ 2 mod 0 = if 1 . else 2 . then next 5 begin 1 - dup 0 = until drop 4 sq ."
+
+BASE = {"evaluate": False, "unroll": UnrollPolicy(budget=0), "outline": False}
+
+VARIANTS: Dict[str, Dict[str, Any]] = {
+    "evaluate": dict(BASE, evaluate=True),
+    "unroll (partial)": dict(BASE, unroll=UnrollPolicy(factor=2, budget=8)),
+    "unroll (full)": dict(BASE, unroll=UnrollPolicy(factor=1, budget=1000)),
+    "outline": dict(BASE, outline=True),
+    "all": {"evaluate": True, "unroll": UnrollPolicy(), "outline": True},
+}
+
+
+def build(source: str, line_map=None, **options) -> ProgramImage:
+    with contextlib.redirect_stdout(io.StringIO()):
+        code, dm, _ = compile_program(Parser(tokenize(source, line_map=line_map)).parse(), **options)
+    image = ProgramImage.from_bytes(isa_to_bytes(code), data_to_bytes(dm.words(), dm.bss_size))
+    image.stacks = stack_sizes(dm)  # as in a container: the run gets exactly the computed stacks
+    return image
+
+
+def programs() -> List[Tuple[str, str, Any, List[List[int]]]]:
+    """(имя, текст, карта строк, входы) всех проверяемых программ"""
+    result = []
+    for path in sorted(glob.glob(os.path.join(EXAMPLES_DIR, "*.forth"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        line_map: List[Tuple[str, int]] = []
+        source = preprocess(path, line_map=line_map)
+        runs = [[ord(char) for char in text] for text in EXAMPLE_INPUTS.get(name, [""])]
+        result.append((name, source, line_map, runs))
+    for name, source in CASES.items():
+        runs = [[ord(char) for char in text] for text in CASE_INPUTS.get(name, [""])]
+        result.append((name, source, None, runs))
+    return result
+
+
+def outcome(results: List[Dict[str, Any]]) -> List[Tuple[str, List[int]]]:
+    return [(result["status"], result["output"]) for result in results]
+
+
+def check() -> List[Tuple[str, str, int, int, int, int]]:
+    """(программа, вариант, такты без оптимизаций, с ней, слова кода без и с ней)"""
+    rows = []
+    for name, source, line_map, runs in programs():
+        base_image = build(source, line_map, **BASE)
+        base = run_simt(base_image, runs)
+        for variant, options in VARIANTS.items():
+            image = build(source, line_map, **options)
+            results = run_simt(image, runs)
+            if outcome(results) != outcome(base):
+                raise RuntimeError(
+                    f"{name}, {variant}: вывод отличается от сборки без оптимизаций!\n"
+                    f"    без оптимизаций: {outcome(base)}\n    {variant}: {outcome(results)}"
+                )
+            rows.append((name, variant, base[0]["ticks"], results[0]["ticks"], base_image.code_words, image.code_words))
+    return rows
+
+
+def check_cfg() -> CFG:
+    """Блоки и рёбра графа кода верхнего уровня `CFG_CASE`"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        module = compile_module(Parser(tokenize(CFG_CASE)).parse(), "main",
+                                unroll=BASE["unroll"], evaluate=BASE["evaluate"])
+    em = Emitter()
+    em.code, em.label_index, em.patches = module.code, module.labels, module.patches
+    graph = CFG(em, module.body_start, procedures=module.procedures)
+    blocks = graph.blocks
+
+    def expect(condition: bool, message: str):
+        if not condition:
+            raise RuntimeError(f"cfg: {message}!\n{graph}")
+
+    def labelled(prefix: str) -> Block:
+        found = [block for block in blocks.values() if any(label.startswith(prefix) for label in block.labels)]
+        expect(len(found) == 1, f"ожидается один блок с меткой {prefix}*")
+        return found[0]
+
+    for start, block in blocks.items():
+        for successor in block.successors:
+            expect(start in blocks[successor].predecessors, f"ребро {start} -> {successor} без обратного")
+    expect(graph.reachable() == set(blocks), "есть недостижимые блоки")
+    expect(list(blocks.values())[-1].exits, "последний блок должен выходить из кода")
+
+    # times: `loop` -- обратное ребро на начало тела и выход из цикла
+    head = labelled("times_loop")
+    loops = [block for block in blocks.values() if graph.code[block.end - 1]["opcode"] == Opcode.LOOP]
+    expect(len(loops) == 1 and set(loops[0].successors) == {head.start, loops[0].end}, "`loop` не замыкает `times`")
+
+    # if/else: условный переход на `else`, обе ветви сходятся в `then`
+    branch, join = labelled("if_else"), labelled("if_end")
+    expect(any(branch.start in block.successors and len(block.successors) == 2 for block in blocks.values()),
+           "нет условного перехода на `else`")
+    expect(len(join.predecessors) == 2, "ветви `if` не сходятся")
+
+    # begin/until: условное обратное ребро
+    begin = labelled("begin_loop")
+    untils = [start for start in begin.predecessors if start >= begin.start]
+    expect(len(untils) == 1 and len(blocks[untils[0]].successors) == 2, "`until` не замыкает `begin`")
+
+    # вызов: блок продолжается адресом возврата
+    calls = [block for block in blocks.values() if block.callee == "sq"]
+    expect(len(calls) == 1 and calls[0].successors == (calls[0].end,) and not calls[0].exits, "вызов `sq` не распознан")
+    return graph
+
+
+def report(rows: List[Tuple[str, str, int, int, int, int]]) -> str:
+    lines = [
+        "| программа | вариант | такты (без) | такты | код (без) | код |",
+        "|---|---|---|---|---|---|",
+    ]
+    for name, variant, base_ticks, ticks, base_size, size in rows:
+        lines.append(f"| {name} | {variant} | {base_ticks} | {ticks} | {base_size} | {size} |")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    try:
+        check_cfg()
+        print(report(check()))
+    except RuntimeError as error:
+        print(error)
+        sys.exit(1)
@@ -0,0 +1,203 @@
+"""Вынос повторяющихся последовательностей инструкций в подпрограммы (оптимизация размера).
+
+Проход работает по коду компоновщика до разрешения меток. Повторы ищутся
+перебором окон длиной от `MIN_OUTLINE` до `MAX_OUTLINE` инструкций; жадно
+выбирается последовательность с наибольшей выгодой в словах, её вхождения
+(без перекрытий) заменяются вызовом
+
+        push_rs #ret
+        jmp __outlined_<n>
+    ret:
+
+а сама последовательность с `ret` размещается после кода верхнего уровня.
+Поиск повторяется, пока есть выгодные последовательности.
+
+Не выносятся переходы, `ret/iret/halt`, работа со стеком возвратов (`>r`, `r>`,
+`r@`, `loop` и вызовы видят на нём адрес возврата подпрограммы) и окна, в
+середину которых ведёт метка. Флаги вызов и возврат не меняют.
+"""
+
+from typing import List, Dict, Any, Tuple, NamedTuple
+
+from isa import Opcode, Register, JUMP_OPS
+from definitions import *
+from codegen import Emitter, instruction_len
+
+
+MIN_OUTLINE = 2
+MAX_OUTLINE = 20
+CALL_WORDS = 4  # push_rs #ret + jmp, both may take the long form
+OUTLINED_PREFIX = "__outlined_"
+
+KEEP_OPS = JUMP_OPS | {
+    Opcode.RET, Opcode.IRET, Opcode.HALT, Opcode.PUSH_RS, Opcode.POP_RS,
+}
+
+
+class Item(NamedTuple):
+    labels: List[str]               # marked right before the instruction
+    instruction: Dict[str, Any]
+    patches: List[Dict[str, Any]]   # without `idx`
+
+
+def __items(em: Emitter, start: int) -> Tuple[List[Item], List[str]]:
+    """Код с `start` в виде списка; метки после последней инструкции -- отдельно"""
+    marks: Dict[int, List[str]] = {}
+    for label, index in em.label_index.items():
+        marks.setdefault(index, []).append(label)
+    patches: Dict[int, List[Dict[str, Any]]] = {}
+    for patch in em.patches:
+        patches.setdefault(patch["idx"], []).append({key: value for key, value in patch.items() if key != "idx"})
+
+    items = [
+        Item(marks.get(index, []), em.code[index], patches.get(index, []))
+        for index in range(start, len(em.code))
+    ]
+    return items, marks.get(len(em.code), [])
+
+
+def __outlinable(item: Item) -> bool:
+    if item.instruction["opcode"] in KEEP_OPS:
+        return False
+    if any("label" in patch for patch in item.patches):
+        return False
+    return all(item.instruction.get(field) != Register.RP for field in (DST_REG, SRC1_REG, SRC2_REG))
+
+
+def __key(item: Item) -> Tuple:
+    instruction = tuple(sorted(
+        ((field, value) for field, value in item.instruction.items() if field != LOCATION),
+        key=lambda entry: entry[0]
+    ))
+    patches = tuple(sorted((patch["field"], patch["symbol"]) for patch in item.patches))
+    return instruction, patches
+
+
+# (gain in words, length, starts of non-overlapping occurrences) of the most profitable sequence
+def __best_sequence(items: List[Item]) -> Tuple[int, int, List[int]]:
+    tokens: List[int] = []
+    ids: Dict[Tuple, int] = {}
+    for k, item in enumerate(items):
+        if __outlinable(item):
+            tokens.append(ids.setdefault(__key(item), len(ids)))
+        else:
+            tokens.append(-1 - k)  # never equal to anything
+    sizes = [instruction_len(item.instruction) for item in items]
+
+    best = (0, 0, [])
+    for length in range(MAX_OUTLINE, MIN_OUTLINE - 1, -1):
+        windows: Dict[Tuple[int, ...], List[int]] = {}
+        for start in range(len(items) - length + 1):
+            window = tokens[start:start + length]
+            if min(window) < 0 or any(items[k].labels for k in range(start + 1, start + length)):
+                continue
+            windows.setdefault(tuple(window), []).append(start)
+
+        for starts in windows.values():
+            occurrences = []
+            for start in starts:
+                if not occurrences or start >= occurrences[-1] + length:
+                    occurrences.append(start)
+            if len(occurrences) < 2:
+                continue
+
+            words = sum(sizes[occurrences[0]:occurrences[0] + length])
+            gain = len(occurrences) * (words - CALL_WORDS) - words - 1
+            if gain > best[0]:
+                best = (gain, length, occurrences)
+
+    return best
+
+
+class Outlined(NamedTuple):
+    em: Emitter
+    names: List[str]     # subroutines, in code order
+    replaced: int        # occurrences replaced by calls
+    depth: int           # extra return stack cells: the longest chain of nested subroutines
+
+
+def outline(em: Emitter, start: int) -> Outlined:
+    """Новый код с вынесенными последовательностями (код до `start` не меняется)"""
+    items, trailing = __items(em, start)
+    bodies: List[List[Item]] = []
+    replaced = 0
+
+    while True:
+        gain, length, occurrences = __best_sequence(items + [item for body in bodies for item in body])
+        if gain <= 0:
+            break
+
+        name = f"{OUTLINED_PREFIX}{len(bodies)}"
+        combined = items + [item for body in bodies for item in body]
+        first = occurrences[0]
+        body = [
+            Item([], {field: value for field, value in item.instruction.items() if field != LOCATION}, item.patches)
+            for item in combined[first:first + length]
+        ]
+        body[0] = body[0]._replace(labels=[name])
+        body.append(Item([], {"opcode": Opcode.RET}, []))
+
+        # replace from the end, so that earlier starts stay valid
+        for k, occurrence in enumerate(reversed(occurrences)):
+            ret_label = f"{name}.ret{len(occurrences) - 1 - k}"
+            location = combined[occurrence].instruction.get(LOCATION)
+            call = [
+                Item(combined[occurrence].labels, {"opcode": Opcode.PUSH_RS, "rs1_addr_t": IMMEDIATE_ADDR_T, "imm": 0},
+                     [{"label": ret_label, "field": IMMEDIATE, "relative": False}]),
+                Item([], {"opcode": Opcode.JMP, "rs1_addr_t": IMMEDIATE_ADDR_T, "imm": 0, RELATIVE: True},
+                     [{"label": name, "field": IMMEDIATE, "relative": True}]),
+            ]
+            if location is not None:
+                for item in call:
+                    item.instruction[LOCATION] = location
+            after = combined[occurrence + length]
+            combined[occurrence + length] = after._replace(labels=[ret_label] + after.labels)
+            combined[occurrence:occurrence + length] = call
+            replaced += 1
+
+        # split back into the main code and the subroutines
+        sizes = [len(items)] + [len(body) for body in bodies]
+        shrink = [0] * len(sizes)
+        for occurrence in occurrences:
+            position = occurrence
+            for k, size in enumerate(sizes):
+                if position < size:
+                    shrink[k] += length - 2
+                    break
+                position -= size
+
+        parts = []
+        offset = 0
+        for size, removed in zip(sizes, shrink):
+            parts.append(combined[offset:offset + size - removed])
+            offset += size - removed
+        items, bodies = parts[0], parts[1:] + [body]
+
+    result = Emitter()
+    result.symbols = em.symbols
+    for instruction in em.code[:start]:
+        result.emit(instruction)
+    result.patches = [patch for patch in em.patches if patch["idx"] < start]
+    for label, index in em.label_index.items():
+        if index < start:
+            result.labels[label] = em.labels[label]
+            result.label_index[label] = index
+
+    # labels after the last instruction of the main code keep their place before the subroutines
+    for item in items + [Item(trailing, None, [])] + [item for body in bodies for item in body]:
+        for label in item.labels:
+            result.mark(label)
+        if item.instruction is None:
+            continue
+        for patch in item.patches:
+            result.patches.append(dict(patch, idx=len(result.code)))
+        result.emit(item.instruction)
+
+    names = [f"{OUTLINED_PREFIX}{k}" for k in range(len(bodies))]
+    depths: Dict[str, int] = {}
+    for name, body in reversed(list(zip(names, bodies))):
+        # a subroutine only calls the ones outlined after it
+        callees = [patch["label"] for item in body for patch in item.patches if patch.get("label") in depths]
+        depths[name] = 1 + max((depths[callee] for callee in callees), default=0)
+
+    return Outlined(result, names, replaced, max(depths.values(), default=0))
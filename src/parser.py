@@ -16,6 +16,7 @@ class Keyword(str, Enum):
     VAR = "var"
     CONST = "const"
     STR = "str"
+    CSTR = "cstr"
     ALLOC = "alloc"
     VECTOR = "vector"
 
@@ -45,12 +46,19 @@ class Parser:
             return None
         return self.tokens[self.i]
 
+    @staticmethod
+    def __located(node: Node, loc, end_loc) -> Node:
+        node.loc = loc
+        node.end_loc = end_loc
+        return node
+
     def __parse_string(self) -> String:
         token = self.__get_current_token()
         if not token or token.kind != TokenType.STRING:
             raise ParseError(f"ожидаемый тип ввода - строковый литерал, но считан EOF!")
         
         string = String(value=token.value)
+        string.loc = token.loc
         self.__go_to_next_token()
 
         return string
@@ -64,6 +72,7 @@ class Parser:
             raise ParseError(f"имя определения {token.value} является ключевым словом! Выберите другое!")
 
         ident = Ident(value=token.value)
+        ident.loc = token.loc
         self.__go_to_next_token()
         
         return ident
@@ -86,6 +95,7 @@ class Parser:
         return Body(statements=statements)
 
     def __parse_if(self) -> IfStatement:
+        loc = self.__get_current_token().loc
         self.__go_to_next_token() # skip `if` keyword
 
         ifbody = self.__parse_body(stop_syms={Keyword.ELSE.value, Keyword.THEN.value})
@@ -100,15 +110,16 @@ class Parser:
                 raise ParseError(f"ожидался `then`-блок после `else`-блока!")
             
             self.__go_to_next_token() # skip `then` keyword
-            return IfStatement(ifbody=ifbody, elsebody=elsebody)
+            return self.__located(IfStatement(ifbody=ifbody, elsebody=elsebody), loc, token.loc)
 
         if not (token and token.value == Keyword.THEN.value):
             raise ParseError(f"ожидался `then`-блок после `if`!")
 
         self.__go_to_next_token()
-        return IfStatement(ifbody=ifbody, elsebody=None)
+        return self.__located(IfStatement(ifbody=ifbody, elsebody=None), loc, token.loc)
 
     def __parse_begin(self) -> BeginLoop:
+        loc = self.__get_current_token().loc
         self.__go_to_next_token() # skip `begin` keyword
 
         body = self.__parse_body(stop_syms={Keyword.UNTIL.value})
@@ -117,9 +128,10 @@ class Parser:
             raise ParseError(f"ожидался `until` после `begin`-блока!")
         
         self.__go_to_next_token()
-        return BeginLoop(body=body)
+        return self.__located(BeginLoop(body=body), loc, token.loc)
 
     def __parse_times(self) -> TimesLoop:
+        loc = self.__get_current_token().loc
         self.__go_to_next_token() # skip `times` keyword
 
         body = self.__parse_body(stop_syms={Keyword.NEXT.value})
@@ -128,7 +140,7 @@ class Parser:
             raise ParseError(f"ожидался `next` после `times`-блока!")
 
         self.__go_to_next_token()
-        return TimesLoop(body=body)
+        return self.__located(TimesLoop(body=body), loc, token.loc)
 
     def __parse_number(self) -> Number:
         token = self.__get_current_token()
@@ -140,6 +152,7 @@ class Parser:
             raise ParseError(f"ожидаем тип токена - {str(TokenType.NUMBER)}, но считанный - {str(token.kind)}!")
 
         num = Number(value=int(token.value))
+        num.loc = token.loc
         self.__go_to_next_token()
 
         return num
@@ -177,6 +190,7 @@ class Parser:
         return self.__parse_ident()
 
     def __parse_definition(self) -> Definition:
+        loc = self.__get_current_token().loc
         self.__go_to_next_token() # skip `:`
 
         ident : Ident = self.__parse_ident()
@@ -187,7 +201,7 @@ class Parser:
             raise ParseError(f"ожидался символ `;` после тела определения!")
         
         self.__go_to_next_token()
-        return Definition(ident=ident, body=body)
+        return self.__located(Definition(ident=ident, body=body), loc, token.loc)
     
     def __parse_declaration(self) -> Declaration:
         keyword = self.__get_current_token()
@@ -197,11 +211,11 @@ class Parser:
             ident = self.__parse_ident()
             return Variable(ident=ident, number=None)
         
-        if keyword.value == Keyword.STR.value:
+        if keyword.value in (Keyword.STR.value, Keyword.CSTR.value):
             ident = self.__parse_ident()
             string = self.__parse_string()
 
-            return StringLiteral(ident=ident, string=string)
+            return StringLiteral(ident=ident, string=string, packed=keyword.value == Keyword.CSTR.value)
 
         if keyword.value == Keyword.CONST.value:
             ident = self.__parse_ident()
@@ -243,7 +257,7 @@ class Parser:
                 continue
 
             if token.kind == TokenType.WORD and token.value in \
-                (Keyword.VAR.value, Keyword.STR.value, Keyword.CONST.value, \
+                (Keyword.VAR.value, Keyword.STR.value, Keyword.CSTR.value, Keyword.CONST.value, \
                  Keyword.ALLOC.value, Keyword.VECTOR.value):
                 bindings.append(self.__parse_declaration())
                 continue
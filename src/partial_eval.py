@@ -0,0 +1,330 @@
+"""Вычисление вызовов чистых слов при трансляции.
+
+Слово чистое, если его тело (и тела вызываемых им слов) не работает с вводом-выводом,
+памятью данных, прерываниями и `_exit_`: только числа, константы, арифметика,
+сравнения, перестановки стека, `>r`/`r>`/`r@`, `if`, `begin/until` и `times/next`.
+Вызов чистого слова, перед которым в том же теле стоят числа и константы, исполняется
+интерпретатором AST, а числа и вызов заменяются результатами:
+
+    : sq dup * ;    4 sq  ->  16
+
+Интерпретатор повторяет семантику кода транслятора (32-битная арифметика, деление с
+округлением к нулю, `times` исполняет тело `max(n, 1)` раз). Вызов остаётся как есть,
+если не хватает константных аргументов, при делении на ноль, при обращении за адрес
+возврата на стеке возвратов и при исчерпании топлива (`FUEL` шагов на вызов).
+"""
+
+from typing import List, Dict, Optional, Callable, Set
+
+from definitions import PRINT_STRING_SYM
+from ast_nodes import Body, Number, Ident, IfStatement, BeginLoop, TimesLoop
+from stack_effect import PRIMITIVES
+
+
+FUEL = 100_000       # interpreted statements per folded call
+MAX_DEPTH = 200      # nested calls of the interpreter
+MAX_RESULTS = 8      # a call is folded only if it leaves at most this many numbers
+
+MASK32 = 0xFFFFFFFF
+
+
+class EvalError(Exception):
+    """Вызов нельзя вычислить при трансляции"""
+    pass
+
+
+def to_signed(value: int) -> int:
+    value &= MASK32
+    return value - (1 << 32) if value >= 1 << 31 else value
+
+
+def __flag(condition: bool) -> int:
+    return -1 if condition else 0
+
+
+def __div(a: int, b: int) -> int:
+    if b == 0:
+        raise EvalError("деление на ноль")
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+def __mod(a: int, b: int) -> int:
+    return a - __div(a, b) * b
+
+
+# (a b) -> result, on signed values; the result is wrapped to 32 bits by the caller
+BINARY: Dict[str, Callable[[int, int], int]] = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": __div,
+    "mod": __mod,
+    "and": lambda a, b: a & b,
+    "or": lambda a, b: a | b,
+    "lshift": lambda a, b: a << (b & 31),
+    "rshift": lambda a, b: (a & MASK32) >> (b & 31),
+    "=": lambda a, b: __flag(a == b),
+    "<": lambda a, b: __flag(a < b),
+    ">": lambda a, b: __flag(a > b),
+    "<=": lambda a, b: __flag(a <= b),
+    ">=": lambda a, b: __flag(a >= b),
+}
+
+UNARY: Dict[str, Callable[[int], int]] = {
+    "not": lambda a: ~a,
+    "neg": lambda a: -a,
+}
+
+STACK_WORDS = {"dup", "swap", "drop", "over", "rot", "nip", ">r", "r>", "r@"}
+
+# pure words of the standard library (see `stdlib.py`)
+STDLIB_PURE: Dict[str, Callable[[int, int], int]] = {
+    "min": min,
+    "max": max,
+}
+STDLIB_PURE_UNARY: Dict[str, Callable[[int], int]] = {
+    "abs": abs,
+}
+
+
+class PartialEvaluator:
+    """Свёртка вызовов чистых слов в телах модуля.
+
+    - `procedures` -- слово -> тело (слова модуля)
+    - `constants` -- константа -> значение
+    - `library` -- доступные слова стандартной библиотеки (не перекрытые программой)
+    """
+
+    def __init__(self, procedures: Dict[str, Body], constants: Dict[str, int], library: Set[str] = frozenset(),
+                 fuel: int = FUEL):
+        self.procedures = procedures
+        self.constants = constants
+        self.library = library
+        self.fuel_limit = fuel
+        self.purity: Dict[str, bool] = {}
+        self.folded: Dict[str, int] = {}
+
+    # words compiled inline by `codegen.gen_body`: they take precedence over definitions
+    @staticmethod
+    def __is_builtin(word: str) -> bool:
+        return word in PRIMITIVES or word in BINARY or word in UNARY
+
+    @staticmethod
+    def __is_pure_builtin(word: str) -> bool:
+        return word in BINARY or word in UNARY or word in STACK_WORDS
+
+    def __is_library(self, word: str) -> bool:
+        return word in self.library and (word in STDLIB_PURE or word in STDLIB_PURE_UNARY)
+
+    def is_pure(self, word: str) -> bool:
+        if word in self.purity:
+            return self.purity[word]
+        if self.__is_library(word):
+            return True
+        if word not in self.procedures:
+            return False
+
+        self.purity[word] = True  # recursion: assumed pure until shown otherwise
+        self.purity[word] = self.__body_is_pure(self.procedures[word])
+        return self.purity[word]
+
+    def __body_is_pure(self, body: Body) -> bool:
+        for statement in body.statements:
+            if isinstance(statement, Number):
+                continue
+            if isinstance(statement, IfStatement):
+                if not self.__body_is_pure(statement.ifbody):
+                    return False
+                if statement.elsebody is not None and not self.__body_is_pure(statement.elsebody):
+                    return False
+                continue
+            if isinstance(statement, (BeginLoop, TimesLoop)):
+                if not self.__body_is_pure(statement.body):
+                    return False
+                continue
+            if isinstance(statement, Ident):
+                word = statement.value
+                if self.__is_builtin(word):
+                    if self.__is_pure_builtin(word):
+                        continue
+                elif self.is_pure(word) or (word not in self.procedures and word in self.constants):
+                    continue
+            return False
+        return True
+
+    def __literal(self, statement) -> Optional[int]:
+        if isinstance(statement, Number):
+            return to_signed(statement.value)
+        if isinstance(statement, Ident) and statement.value in self.constants \
+                and statement.value not in self.procedures and not self.__is_builtin(statement.value):
+            return to_signed(self.constants[statement.value])
+        return None
+
+    # --- interpreter ---
+
+    def run(self, word: str, stack: List[int]) -> List[int]:
+        """Стек данных после вызова `word` на стеке `stack` (значения со знаком)"""
+        self.fuel = self.fuel_limit
+        stack = list(stack)
+        self.__call(word, stack, [], 0)
+        return stack
+
+    def __call(self, word: str, stack: List[int], rstack: List[int], depth: int):
+        if word not in self.procedures and word in STDLIB_PURE:
+            b, a = self.__pop(stack), self.__pop(stack)
+            stack.append(to_signed(STDLIB_PURE[word](a, b)))
+            return
+        if word not in self.procedures and word in STDLIB_PURE_UNARY:
+            stack.append(to_signed(STDLIB_PURE_UNARY[word](self.__pop(stack))))
+            return
+
+        if depth > MAX_DEPTH:
+            raise EvalError("слишком глубокая рекурсия")
+        base = len(rstack)
+        self.__body(self.procedures[word], stack, rstack, base, depth)
+        if len(rstack) != base:
+            raise EvalError(f"`{word}` оставляет значения на стеке возвратов")
+
+    @staticmethod
+    def __pop(stack: List[int]) -> int:
+        if not stack:
+            raise EvalError("не хватает константных аргументов")
+        return stack.pop()
+
+    def __body(self, body: Body, stack: List[int], rstack: List[int], base: int, depth: int):
+        for statement in body.statements:
+            self.fuel -= 1
+            if self.fuel < 0:
+                raise EvalError("топливо исчерпано")
+
+            if isinstance(statement, Number):
+                stack.append(to_signed(statement.value))
+
+            elif isinstance(statement, IfStatement):
+                if self.__pop(stack) != 0:
+                    self.__body(statement.ifbody, stack, rstack, base, depth)
+                elif statement.elsebody is not None:
+                    self.__body(statement.elsebody, stack, rstack, base, depth)
+
+            elif isinstance(statement, BeginLoop):
+                while True:
+                    self.__body(statement.body, stack, rstack, base, depth)
+                    if self.__pop(stack) != 0:
+                        break
+                    self.fuel -= 1
+                    if self.fuel < 0:
+                        raise EvalError("топливо исчерпано")
+
+            # loop: decrement the counter on top of the return stack, repeat while it is positive
+            elif isinstance(statement, TimesLoop):
+                rstack.append(self.__pop(stack))
+                while True:
+                    self.__body(statement.body, stack, rstack, base, depth)
+                    if len(rstack) <= base:
+                        raise EvalError("счётчик цикла снят со стека возвратов")
+                    rstack[-1] = to_signed(rstack[-1] - 1)
+                    if rstack[-1] <= 0:
+                        break
+                rstack.pop()
+
+            else:
+                self.__word(statement.value, stack, rstack, base, depth)
+
+    def __word(self, word: str, stack: List[int], rstack: List[int], base: int, depth: int):
+        pop = self.__pop
+
+        if word in BINARY:
+            b, a = pop(stack), pop(stack)
+            stack.append(to_signed(BINARY[word](a, b)))
+        elif word in UNARY:
+            stack.append(to_signed(UNARY[word](pop(stack))))
+        elif word == "dup":
+            a = pop(stack)
+            stack += [a, a]
+        elif word == "swap":
+            b, a = pop(stack), pop(stack)
+            stack += [b, a]
+        elif word == "drop":
+            pop(stack)
+        elif word == "over":
+            b, a = pop(stack), pop(stack)
+            stack += [a, b, a]
+        elif word == "rot":
+            c, b, a = pop(stack), pop(stack), pop(stack)
+            stack += [b, c, a]
+        elif word == "nip":
+            b = pop(stack)
+            pop(stack)
+            stack.append(b)
+        elif word == ">r":
+            rstack.append(pop(stack))
+        elif word in ("r>", "r@"):
+            if len(rstack) <= base:
+                raise EvalError("обращение к адресу возврата")
+            stack.append(rstack.pop() if word == "r>" else rstack[-1])
+        elif word in self.procedures or self.__is_library(word):
+            self.__call(word, stack, rstack, depth + 1)
+        else:
+            stack.append(to_signed(self.constants[word]))
+
+    # --- folding ---
+
+    def fold_body(self, body: Body):
+        """Заменяет в `body` (и во вложенных телах) вычислимые вызовы их результатами"""
+        out = []
+        statements = body.statements
+        i = 0
+        while i < len(statements):
+            statement = statements[i]
+            i += 1
+
+            if isinstance(statement, IfStatement):
+                self.fold_body(statement.ifbody)
+                if statement.elsebody is not None:
+                    self.fold_body(statement.elsebody)
+            elif isinstance(statement, (BeginLoop, TimesLoop)):
+                self.fold_body(statement.body)
+            elif isinstance(statement, Ident) and statement.value == PRINT_STRING_SYM:
+                out.append(statement)
+                if i < len(statements):
+                    out.append(statements[i])  # the string
+                    i += 1
+                continue
+            elif isinstance(statement, Ident) and not self.__is_builtin(statement.value) \
+                    and self.is_pure(statement.value):
+                folded = self.__fold_call(statement, out)
+                if folded is not None:
+                    out = folded
+                    continue
+
+            out.append(statement)
+
+        body.statements = out
+
+    def __fold_call(self, call: Ident, out: list) -> Optional[list]:
+        k = len(out)
+        while k > 0 and self.__literal(out[k - 1]) is not None:
+            k -= 1
+        arguments = [self.__literal(statement) for statement in out[k:]]
+
+        try:
+            results = self.run(call.value, arguments)
+        except EvalError:
+            return None
+        if len(results) > MAX_RESULTS:
+            return None
+
+        # arguments left untouched at the bottom keep their nodes
+        kept = 0
+        while kept < min(len(results), len(arguments)) and results[kept] == arguments[kept]:
+            kept += 1
+
+        numbers = []
+        for value in results[kept:]:
+            number = Number(value & MASK32)
+            number.loc = call.loc
+            numbers.append(number)
+
+        self.folded[call.value] = self.folded.get(call.value, 0) + 1
+        return out[:k + kept] + numbers
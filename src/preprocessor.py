@@ -1,4 +1,6 @@
 import os
+from typing import List, Tuple, Optional
+
 from definitions import REQUIRE_DIRECTIVE
 
 
@@ -6,7 +8,37 @@ class PreprocessError(Exception):
     pass
 
 
-def preprocess(source_file: str, included_files=None) -> str:
+def __require_path(sline: str, path: str) -> str:
+    if "<" not in sline or ">" not in sline:
+        raise SyntaxError(f"неверный синтаксис {REQUIRE_DIRECTIVE} в {path}:\n{sline}!")
+
+    file_to_include = sline[sline.index("<") + 1 : sline.index(">")].strip()
+    return os.path.abspath(os.path.join(os.path.dirname(path), file_to_include))
+
+
+def split_requires(source_file: str) -> Tuple[str, List[str]]:
+    """Исходный текст модуля без `#require` и абсолютные пути требуемых модулей (для раздельной трансляции)"""
+    path = os.path.abspath(source_file)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"файл {path} не найден!")
+
+    out = []
+    requires = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            sline = line.strip()
+            if sline.startswith(REQUIRE_DIRECTIVE):
+                requires.append(__require_path(sline, path))
+                out.append("\n")  # keep line numbers
+            else:
+                out.append(line)
+
+    return "".join(out), requires
+
+
+def preprocess(source_file: str, included_files=None, line_map: Optional[List[Tuple[str, int]]] = None) -> str:
+    """Текст программы с подставленными `#require`; в `line_map` (если задан)
+    добавляется исходная позиция (файл, строка) каждой строки результата"""
     if included_files is None:
         included_files = set()
 
@@ -19,22 +51,20 @@ def preprocess(source_file: str, included_files=None) -> str:
         raise FileNotFoundError(f"файл {path} не найден!")
 
     included_files.add(path)
-    base_directory = os.path.dirname(path) 
     out = []
 
     with open(path, "r", encoding="utf-8") as file:
-        for line in file:
+        for number, line in enumerate(file, start=1):
             sline = line.strip()
 
             if sline.startswith(REQUIRE_DIRECTIVE):
-                if "<" not in sline or ">" not in sline:
-                    raise SyntaxError(f"неверный синтаксис {REQUIRE_DIRECTIVE} в {path}:\n{sline}!")
-
-                file_to_include = sline[sline.index("<") + 1 : sline.index(">")].strip()
-                include_path = os.path.join(base_directory, file_to_include)
-                out.append(preprocess(include_path, included_files))
+                include_path = __require_path(sline, path)
+                out.append(preprocess(include_path, included_files, line_map))
 
             else:
-                out.append(line)
+                # the last line of an included file must not run into the next one
+                out.append(line if line.endswith("\n") else line + "\n")
+                if line_map is not None:
+                    line_map.append((path, number))
 
     return "".join(out)
\ No newline at end of file
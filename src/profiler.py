@@ -0,0 +1,172 @@
+#!/usr/bin/python3
+
+import bisect
+import sys
+from typing import List, Dict, Tuple
+
+from isa import Opcode, binary_to_opcode, addr_kind
+from definitions import IMMEDIATE_ADDR_T
+from tracer import read_trace
+from codegen import VECTORS_LABEL
+
+
+UNKNOWN_PROCEDURE = "??"
+
+# rs1 addressing kind: bits 9..8 of the first word (set in the short immediate form too)
+RS1_ADDR_T_SHIFT = 8
+IMM_ADDR_T = addr_kind[IMMEDIATE_ADDR_T]
+
+
+def load_symbol_map(path: str) -> Dict[str, Tuple[int, int]]:
+    """Читает карту символов (`<start> <end> <name>` в строке), записанную транслятором"""
+    symbol_map: Dict[str, Tuple[int, int]] = {}
+
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            start, end, name = line.split(maxsplit=2)
+            symbol_map[name] = (int(start), int(end))
+
+    return symbol_map
+
+
+class Profiler:
+    """Распределяет такты и число инструкций по процедурам.
+
+    Стек вызовов строится по парам `push_rs #ret` + `jmp` -> `ret` (вызов узнаётся
+    по коду операции и непосредственному операнду в слове инструкции -- и в короткой
+    форме, без слова расширения); переход из таблицы векторов в процедуру считается
+    входом в обработчик прерывания и снимается со стека по `iret`.
+
+    Инструкции подаются в `on_instruction` или хуком трассы `record`
+    (аргументы `TraceRecorder.record`, см. `simt.SimtEngine`).
+    """
+
+    def __init__(self, symbol_map: Dict[str, Tuple[int, int]]):
+        ranges = sorted((start, end, name) for name, (start, end) in symbol_map.items())
+        self.starts = [start for start, _, _ in ranges]
+        self.ranges = ranges
+        self.entry_points = {start: name for start, _, name in ranges}
+
+        self.self_ticks: Dict[str, int] = {}
+        self.total_ticks: Dict[str, int] = {}
+        self.instructions: Dict[str, int] = {}
+        self.calls: Dict[str, int] = {}
+        self.folded: Dict[Tuple[str, ...], int] = {}
+
+        # frames: (procedure name, entered by interrupt)
+        self.stack: List[Tuple[str, bool]] = []
+        self.pending_call = False
+        self.prev_opcode = None
+        self.prev_pc = None
+        self.last = None  # (tick, pc, word) of the traced instruction whose ticks are not known yet
+
+    def procedure_of(self, pc: int) -> str:
+        k = bisect.bisect_right(self.starts, pc) - 1
+        if k >= 0:
+            start, end, name = self.ranges[k]
+            if start <= pc < end:
+                return name
+        return UNKNOWN_PROCEDURE
+
+    def __enter(self, name: str, by_interrupt: bool):
+        self.stack.append((name, by_interrupt))
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def on_instruction(self, pc: int, word: int, ticks: int):
+        opcode = binary_to_opcode.get(word & 0x3F, Opcode.NOP)
+        name = self.procedure_of(pc)
+
+        if name == VECTORS_LABEL and self.prev_pc is not None and \
+                self.procedure_of(self.prev_pc) != VECTORS_LABEL:
+            # interrupt: pc jumped into the vectors table from outside
+            self.__enter(name, True)
+        elif pc in self.entry_points and self.prev_opcode == Opcode.JMP:
+            if self.pending_call:
+                self.__enter(name, False)
+                self.pending_call = False
+            elif self.stack and self.stack[-1] == (VECTORS_LABEL, True):
+                self.stack.pop()
+                self.__enter(name, True)
+
+        if not self.stack:
+            self.__enter(name, False)
+        elif len(self.stack) == 1 and self.stack[0][0] != name:
+            # top level: follow the region the pc is in
+            self.stack[0] = (name, False)
+
+        self.self_ticks[name] = self.self_ticks.get(name, 0) + ticks
+        self.instructions[name] = self.instructions.get(name, 0) + 1
+
+        frames = tuple(frame for frame, _ in self.stack)
+        self.folded[frames] = self.folded.get(frames, 0) + ticks
+        for frame in set(frames):
+            self.total_ticks[frame] = self.total_ticks.get(frame, 0) + ticks
+
+        if opcode == Opcode.PUSH_RS and (word >> RS1_ADDR_T_SHIFT) & 0b11 == IMM_ADDR_T:
+            self.pending_call = True
+        elif opcode == Opcode.RET and len(self.stack) > 1 and not self.stack[-1][1]:
+            self.stack.pop()
+        elif opcode == Opcode.IRET and len(self.stack) > 1 and self.stack[-1][1]:
+            self.stack.pop()
+
+        self.prev_opcode = opcode
+        self.prev_pc = pc
+
+    def record(self, tick: int, pc: int, word: int, immediate: int = None, flags: int = 0,
+               reg_deltas=(), mem_writes=()):
+        """Хук трассы: такты инструкции -- разница с тактом следующей"""
+        if self.last is not None:
+            last_tick, last_pc, last_word = self.last
+            self.on_instruction(last_pc, last_word, tick - last_tick)
+        self.last = (tick, pc, word)
+
+    def finish(self, end_tick: int = None):
+        """Учитывает последнюю инструкцию; без `end_tick` ей приписывается 1 такт"""
+        if self.last is not None:
+            last_tick, last_pc, last_word = self.last
+            self.on_instruction(last_pc, last_word, 1 if end_tick is None else end_tick - last_tick)
+            self.last = None
+
+    def to_folded(self) -> str:
+        """Формат folded stacks (`a;b;c <ticks>`) для flamegraph.pl/speedscope"""
+        return "\n".join(
+            f"{';'.join(frames)} {ticks}"
+            for frames, ticks in sorted(self.folded.items())
+        )
+
+    def report(self) -> str:
+        total = sum(self.self_ticks.values()) or 1
+        lines = [f"{'self':>10} {'%':>6} {'total':>10} {'instr':>10} {'calls':>6}  procedure"]
+
+        for name, ticks in sorted(self.self_ticks.items(), key=lambda item: -item[1]):
+            lines.append(
+                f"{ticks:>10} {100 * ticks / total:>6.2f} {self.total_ticks.get(name, 0):>10} "
+                f"{self.instructions.get(name, 0):>10} {self.calls.get(name, 0):>6}  {name}"
+            )
+
+        return "\n".join(lines)
+
+
+def profile_trace(trace_file: str, symbol_map: Dict[str, Tuple[int, int]]) -> Profiler:
+    """Профилирование по трассе: такты инструкции -- разница тиков соседних записей"""
+    profiler = Profiler(symbol_map)
+    for record in read_trace(trace_file):
+        profiler.record(record["tick"], record["pc"], record["word"])
+    profiler.finish()
+    return profiler
+
+
+if __name__ == "__main__":
+    assert (
+        len(sys.argv) in (3, 4)
+    ), "Неверные аргументы: profiler.py <trace_file> <symbols_file> [<folded_output_file>]"
+
+    profiler = profile_trace(sys.argv[1], load_symbol_map(sys.argv[2]))
+    print(profiler.report())
+
+    if len(sys.argv) == 4:
+        with open(sys.argv[3], "w", encoding="utf-8") as file:
+            file.write(profiler.to_folded())
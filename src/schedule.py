@@ -0,0 +1,141 @@
+import heapq
+from typing import List, Tuple, Iterator, Iterable, Optional
+
+from definitions import COMMENT_SYM
+
+
+# (tick, port, token)
+Event = Tuple[int, int, int]
+
+CHAR_ESCAPES = {
+    "\\n": "\n",
+    "\\r": "\r",
+    "\\t": "\t",
+    "\\s": " ",
+    "\\\\": "\\",
+}
+
+
+class ScheduleError(Exception):
+    pass
+
+
+def parse_token(text: str) -> int:
+    """Токен ввода: символ в кавычках (`'a'`, `'\\n'`) или число (`65`, `0x41`)"""
+    if len(text) >= 3 and text[0] == "'" and text[-1] == "'":
+        char = text[1:-1]
+        char = CHAR_ESCAPES.get(char, char)
+        if len(char) != 1:
+            raise ScheduleError(f"некорректный символьный токен: {text}!")
+        return ord(char)
+
+    try:
+        return int(text, 0) & 0xFFFFFFFF
+    except ValueError:
+        raise ScheduleError(f"некорректный токен: {text}!")
+
+
+def read_schedule(path: str) -> Iterator[Event]:
+    """Лениво читает расписание ввода: строки `<tick> <port> <token>`.
+
+    Такты в файле должны не убывать -- это позволяет не читать файл целиком.
+    Строки, начинающиеся с `\\`, и пустые строки пропускаются.
+    """
+    last_tick = 0
+
+    with open(path, "r", encoding="utf-8") as file:
+        for line_no, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line or line.startswith(COMMENT_SYM):
+                continue
+
+            parts = line.split(maxsplit=2)
+            if len(parts) != 3:
+                raise ScheduleError(f"{path}:{line_no}: ожидается `<tick> <port> <token>`!")
+
+            try:
+                tick, port = int(parts[0], 0), int(parts[1], 0)
+            except ValueError:
+                raise ScheduleError(f"{path}:{line_no}: некорректный такт или порт: `{parts[0]} {parts[1]}`!")
+            if tick < last_tick:
+                raise ScheduleError(f"{path}:{line_no}: такты в расписании должны не убывать!")
+            if not 0 <= port < 1024:
+                raise ScheduleError(f"{path}:{line_no}: некорректный порт {port}!")
+
+            last_tick = tick
+            try:
+                token = parse_token(parts[2])
+            except ScheduleError as error:
+                raise ScheduleError(f"{path}:{line_no}: {error}")
+            yield tick, port, token
+
+
+class EventQueue:
+    """Очередь событий ввода, упорядоченная по такту (min-heap).
+
+    Из каждого источника в куче лежит не больше одного события -- следующее
+    подтягивается только когда предыдущее извлечено, поэтому длинные
+    расписания не загружаются в память целиком.
+    """
+
+    def __init__(self, sources: Iterable[Iterable[Event]] = ()):
+        # (tick, seq, port, token, source)
+        self.heap: List[Tuple[int, int, int, int, Optional[Iterator[Event]]]] = []
+        self.seq = 0
+
+        for source in sources:
+            self.add_source(source)
+
+    def __pull(self, source: Iterator[Event]):
+        event = next(source, None)
+        if event is not None:
+            tick, port, token = event
+            heapq.heappush(self.heap, (tick, self.seq, port, token, source))
+            self.seq += 1
+
+    def add_source(self, source: Iterable[Event]):
+        self.__pull(iter(source))
+
+    def push(self, tick: int, port: int, token: int):
+        heapq.heappush(self.heap, (tick, self.seq, port, token, None))
+        self.seq += 1
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def next_tick(self) -> Optional[int]:
+        """Такт ближайшего события или `None`, если событий больше нет"""
+        if not self.heap:
+            return None
+        return self.heap[0][0]
+
+    def run_limit(self, tick: int, max_tick: int) -> int:
+        """До какого такта модель может исполнять команды, не проверяя очередь"""
+        next_tick = self.next_tick()
+        if next_tick is None:
+            return max_tick
+        return max(tick, min(next_tick, max_tick))
+
+    def peek(self, tick: int) -> Optional[Event]:
+        if self.heap and self.heap[0][0] <= tick:
+            event_tick, _, port, token, _ = self.heap[0]
+            return event_tick, port, token
+        return None
+
+    def pop(self, tick: int) -> Optional[Event]:
+        """Извлекает ближайшее событие, если оно наступило к такту `tick`"""
+        if not (self.heap and self.heap[0][0] <= tick):
+            return None
+
+        event_tick, _, port, token, source = heapq.heappop(self.heap)
+        if source is not None:
+            self.__pull(source)
+        return event_tick, port, token
+
+    def pop_due(self, tick: int) -> List[Event]:
+        events = []
+        event = self.pop(tick)
+        while event is not None:
+            events.append(event)
+            event = self.pop(tick)
+        return events
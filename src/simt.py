@@ -0,0 +1,575 @@
+#!/usr/bin/python3
+
+import sys
+from typing import List, Dict, Any, Sequence, Union, Callable
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency: only the lock-step engine needs it
+    np = None
+
+from isa import Opcode, Register, binary_to_opcode, register_to_id, addr_kind
+from definitions import *
+from image import ProgramImage, ROW_SIZE, F_OPCODE, F_RD_T, F_RS1_T, F_RS2_T, bytes_to_words_be
+from image import F_RD, F_RS1, F_RS2, F_IMM, F_LEN, F_PORT, NO_INSTRUCTION
+from ticks import instruction_ticks, block_ticks, INTERRUPT_TICKS
+from codegen import STDIN_PORT, STDOUT_PORT, VECTOR_BASE
+from devices import PortBus, StdoutCapture, ScheduledInput
+from schedule import ScheduleError
+from tracer import TraceRecorder, FLAG_N, FLAG_Z, FLAG_V, FLAG_C, FLAG_IE
+from profiler import Profiler, load_symbol_map
+from container import is_container, load_image
+
+
+MASK32 = 0xFFFFFFFF
+
+REG_ADDR_T = addr_kind[REG_TO_REG_ADDR_T]
+IMM_ADDR_T = addr_kind[IMMEDIATE_ADDR_T]
+IND_ADDR_T = addr_kind[INDIRECT_ADDR_T]
+IND_IMM_ADDR_T = addr_kind[INDIRECT_IMM_OFFSET_ADDR_T]
+
+DR_ID = register_to_id[Register.DR]
+SP_ID = register_to_id[Register.SP]
+RP_ID = register_to_id[Register.RP]
+
+# iret: EAX..EFX <- r6..r10
+SAVED_REGS = [register_to_id[reg] for reg in (Register.EAX, Register.EBX, Register.ECX, Register.EDX, Register.EFX)]
+SHADOW_REGS = [register_to_id[reg] for reg in (Register.r6, Register.r7, Register.r8, Register.r9, Register.r10)]
+
+DEFAULT_MEMORY_SIZE = 1 << 14
+DEFAULT_STACK_SIZE = 1024
+
+NO_REQUEST = 1 << 62  # interrupt tick of an instance without pending device requests
+
+STATUS_RUNNING = 0
+STATUS_HALTED = 1
+STATUS_ERROR = 2
+STATUS_LIMIT = 3
+
+STATUS_NAMES = {
+    STATUS_RUNNING: "running",
+    STATUS_HALTED: "ok",
+    STATUS_ERROR: "error",
+    STATUS_LIMIT: "limit",
+}
+
+ALU_OPS = {
+    Opcode.ADD, Opcode.ADC, Opcode.SUB, Opcode.MUL, Opcode.DIV, Opcode.MOD,
+    Opcode.NEG, Opcode.CMP, Opcode.AND, Opcode.OR, Opcode.XOR, Opcode.NOT,
+    Opcode.SHL, Opcode.SHR, Opcode.SAR,
+}
+
+
+class SimtEngine:
+    """Исполнение одной программы на N независимых экземплярах машины в режиме lock-step.
+
+    Регистры, флаги и память данных всех экземпляров хранятся в массивах NumPy
+    формы (N, ...). На каждом шаге выбирается минимальный PC среди работающих
+    экземпляров, и его инструкция исполняется один раз для всех экземпляров с этим PC
+    (остальные замаскированы) -- расходящиеся ветвления сходятся обратно по минимальному PC.
+
+    Память данных адресуется словами. Стек данных растёт вниз от `memory_size - stack_size`,
+    стек возвратов -- вверх от той же границы. Если размеры стеков известны из образа
+    (статический анализ транслятора) и не заданы явно, память -- ровно образ данных и оба стека.
+
+    Порты каждого экземпляра -- свой `devices.PortBus`: на STDOUT_PORT захват вывода
+    (`StdoutCapture`), ввод -- `ScheduledInput`: расписание событий или токены на
+    STDIN_PORT, доступные с такта 0. Запрос прерывания устройства доставляется
+    по вектору его порта, как только такт экземпляра дошёл до события и прерывания разрешены.
+
+    Каждая инструкция экземпляра `trace_instance` передаётся функциям `trace_hooks`
+    с аргументами `TraceRecorder.record`: такт перед инструкцией, PC, машинное слово,
+    расширение immediate (или `None`), флаги, изменённые регистры и записи в память.
+    """
+
+    def __init__(self, image: ProgramImage, inputs: Sequence[Union[Sequence[int], ScheduledInput]],
+                 memory_size: int = None, stack_size: int = None, max_output: int = 4096,
+                 trace_hooks: Sequence[Callable[..., None]] = (), trace_instance: int = 0):
+        if np is None:
+            raise ImportError("для lock-step исполнения требуется numpy: pip install numpy!")
+
+        if memory_size is None and stack_size is None and image.stacks is not None:
+            data_stack, return_stack = image.stacks
+            stack_base = image.data_size + data_stack
+            memory_size = max(stack_base + return_stack, 1)
+        else:
+            memory_size = DEFAULT_MEMORY_SIZE if memory_size is None else memory_size
+            stack_size = DEFAULT_STACK_SIZE if stack_size is None else stack_size
+            if image.data_size + 2 * stack_size > memory_size:
+                raise ValueError(f"образ данных и стеки не помещаются в {memory_size} слов памяти!")
+            stack_base = memory_size - stack_size
+
+        n = len(inputs)
+        self.n = n
+        self.memory_size = memory_size
+        self.max_output = max_output
+
+        self.table = np.asarray(image.table, dtype=np.int64).reshape(-1, ROW_SIZE)
+        self.code_words = self.table.shape[0]
+        self.opcodes = [binary_to_opcode.get(int(code), None) for code in self.table[:, F_OPCODE]]
+        self.rows = [tuple(int(field) for field in row) for row in self.table]
+        self.row_ticks = [
+            instruction_ticks(opcode, row[F_LEN], row[F_RD_T], row[F_RS1_T], row[F_RS2_T])
+            if opcode is not None else 0
+            for opcode, row in zip(self.opcodes, self.rows)
+        ]
+
+        self.regs = np.zeros((n, 16), dtype=np.int64)
+        self.mem = np.zeros((n, memory_size), dtype=np.int64)
+        if len(image.data):
+            self.mem[:, : len(image.data)] = np.asarray(image.data, dtype=np.int64)
+        self.regs[:, SP_ID] = stack_base
+        self.regs[:, RP_ID] = stack_base - 1
+        self.stack_floor = image.data_size
+
+        self.trace_hooks = list(trace_hooks)
+        self.trace_instance = trace_instance
+        self.words = bytes_to_words_be(image.code) if self.trace_hooks else None
+        self.mem_writes = None  # (addr, value) of the traced instruction
+
+        self.pc = np.zeros(n, dtype=np.int64)
+        self.spc = np.zeros(n, dtype=np.int64)
+        self.ticks = np.zeros(n, dtype=np.int64)
+        self.flag_n = np.zeros(n, dtype=bool)
+        self.flag_z = np.zeros(n, dtype=bool)
+        self.flag_v = np.zeros(n, dtype=bool)
+        self.flag_c = np.zeros(n, dtype=bool)
+        self.ie = np.zeros(n, dtype=bool)
+        self.in_interrupt = np.zeros(n, dtype=bool)
+        self.status = np.zeros(n, dtype=np.int8)
+        self.errors: Dict[int, str] = {}
+
+        self.buses: List[PortBus] = []
+        self.stdout: List[StdoutCapture] = []
+        for source in inputs:
+            bus = PortBus()
+            self.stdout.append(bus.attach(STDOUT_PORT, StdoutCapture()))
+            device = source if isinstance(source, ScheduledInput) else ScheduledInput.from_tokens(int(token) for token in source)
+            for port in device.ports:
+                bus.attach(port, device)
+            self.buses.append(bus)
+
+        # nearest device request of every instance, refreshed after each access to its bus
+        self.irq_tick = np.full(n, NO_REQUEST, dtype=np.int64)
+        self.irq_port = np.zeros(n, dtype=np.int64)
+        for k in range(n):
+            self.__poll(k)
+
+    # ---- helpers over a subset of instances `idx` ----
+
+    def __poll(self, k: int):
+        request = self.buses[k].next_interrupt()
+        self.irq_tick[k], self.irq_port[k] = request if request is not None else (NO_REQUEST, 0)
+
+    def __port_read(self, idx, port: int):
+        for k in idx.tolist():
+            self.regs[k, DR_ID] = self.buses[k].read(port, int(self.ticks[k]))
+            self.__poll(k)
+
+    def __port_write(self, idx, port: int, values):
+        for k, value in zip(idx.tolist(), values.tolist()):
+            self.buses[k].write(port, int(self.ticks[k]), value)
+            self.__poll(k)
+
+    def __output_full(self, idx, count):
+        """Экземпляры, вывод которых не помещается в `max_output` токенов"""
+        captured = np.fromiter((len(self.stdout[k].tokens) for k in idx.tolist()), dtype=np.int64, count=len(idx))
+        full = captured + count > self.max_output
+        if full.any():
+            self.__fail(idx[full], "переполнение буфера вывода!")
+        return full
+
+    def __fail(self, idx, message: str):
+        for k in idx.tolist():
+            if self.status[k] == STATUS_RUNNING:
+                self.errors[k] = message
+        self.status[idx] = STATUS_ERROR
+
+    def __check_addr(self, idx, addr):
+        addr = addr & MASK32
+        bad = addr >= self.memory_size
+        if bad.any():
+            self.__fail(idx[bad], f"обращение за пределы памяти данных: {int(addr[bad][0])}!")
+            addr = np.where(bad, 0, addr)
+        return addr
+
+    def __load(self, idx, addr):
+        return self.mem[idx, self.__check_addr(idx, addr)]
+
+    def __store(self, idx, addr, values):
+        addr = self.__check_addr(idx, addr)
+        values = values & MASK32
+        self.mem[idx, addr] = values
+        if self.mem_writes is not None:
+            addr, values = np.broadcast_to(addr, idx.shape), np.broadcast_to(values, idx.shape)
+            for k in np.nonzero(idx == self.trace_instance)[0].tolist():
+                self.mem_writes.append((int(addr[k]), int(values[k])))
+
+    # byte address: word `addr // BYTES_PER_WORD`, bits 8*(addr % BYTES_PER_WORD) and up
+    def __load_byte(self, idx, addr):
+        addr = addr & MASK32
+        words = self.__load(idx, addr // BYTES_PER_WORD)
+        return (words >> (8 * (addr % BYTES_PER_WORD))) & 0xFF
+
+    def __store_byte(self, idx, addr, values):
+        addr = addr & MASK32
+        word_addr = addr // BYTES_PER_WORD
+        shift = 8 * (addr % BYTES_PER_WORD)
+        words = self.__load(idx, word_addr)
+        words = (words & ~(0xFF << shift)) | ((values & 0xFF) << shift)
+        self.__store(idx, word_addr, words)
+
+    def __effective_addr(self, idx, kind: int, reg: int, imm: int):
+        if kind == IMM_ADDR_T:
+            return np.full(len(idx), imm, dtype=np.int64)
+        if kind == IND_ADDR_T:
+            return self.regs[idx, reg]
+        return self.regs[idx, reg] + imm
+
+    def __read(self, idx, kind: int, reg: int, imm: int):
+        if kind == REG_ADDR_T:
+            return self.regs[idx, reg]
+        if kind == IMM_ADDR_T:
+            return np.full(len(idx), imm & MASK32, dtype=np.int64)
+        return self.__load(idx, self.__effective_addr(idx, kind, reg, imm))
+
+    def __write(self, idx, kind: int, reg: int, imm: int, values):
+        if kind == REG_ADDR_T:
+            self.regs[idx, reg] = values & MASK32
+        else:
+            self.__store(idx, self.__effective_addr(idx, kind, reg, imm), values)
+
+    def __set_flags(self, idx, result, carry=None, overflow=None):
+        result = result & MASK32
+        self.flag_n[idx] = (result >> 31) & 1 == 1
+        self.flag_z[idx] = result == 0
+        self.flag_c[idx] = False if carry is None else carry
+        self.flag_v[idx] = False if overflow is None else overflow
+
+    @staticmethod
+    def __signed(values):
+        values = values & MASK32
+        return np.where(values >= 1 << 31, values - (1 << 32), values)
+
+    def __alu(self, idx, opcode: Opcode, row):
+        a = self.__read(idx, row[F_RS1_T], row[F_RS1], row[F_IMM])
+        b = None
+        if opcode not in (Opcode.NEG, Opcode.NOT):
+            b = self.__read(idx, row[F_RS2_T], row[F_RS2], row[F_IMM])
+
+        carry = overflow = None
+        if opcode in (Opcode.ADD, Opcode.ADC):
+            result = a + b + (self.flag_c[idx].astype(np.int64) if opcode == Opcode.ADC else 0)
+            carry = result > MASK32
+            overflow = (((a ^ result) & (b ^ result)) >> 31) & 1 == 1
+        elif opcode in (Opcode.SUB, Opcode.CMP):
+            result = a - b
+            carry = a < b
+            overflow = (((a ^ b) & (a ^ result)) >> 31) & 1 == 1
+        elif opcode == Opcode.MUL:
+            result = self.__signed(a) * self.__signed(b)
+            overflow = (result < -(1 << 31)) | (result >= 1 << 31)
+        elif opcode in (Opcode.DIV, Opcode.MOD):
+            sa, sb = self.__signed(a), self.__signed(b)
+            zero = sb == 0
+            if zero.any():
+                self.__fail(idx[zero], "деление на ноль!")
+                sb = np.where(zero, 1, sb)
+            # truncating division, remainder has the sign of the dividend
+            quotient = np.abs(sa) // np.abs(sb) * np.sign(sa) * np.sign(sb)
+            result = quotient if opcode == Opcode.DIV else sa - quotient * sb
+        elif opcode in (Opcode.SHL, Opcode.SHR, Opcode.SAR):
+            # shift count is taken modulo 32, CF is the last bit shifted out
+            count = b & 31
+            shifted = count > 0
+            if opcode == Opcode.SHL:
+                result = a << count
+                carry = shifted & ((a >> (32 - count)) & 1 == 1)
+            else:
+                source = self.__signed(a) if opcode == Opcode.SAR else a
+                result = source >> count
+                carry = shifted & ((source >> np.maximum(count - 1, 0)) & 1 == 1)
+        elif opcode == Opcode.NEG:
+            result = -a
+        elif opcode == Opcode.NOT:
+            result = ~a
+        elif opcode == Opcode.AND:
+            result = a & b
+        elif opcode == Opcode.OR:
+            result = a | b
+        else:
+            result = a ^ b
+
+        self.__set_flags(idx, result, carry, overflow)
+        if opcode != Opcode.CMP:
+            self.__write(idx, row[F_RD_T], row[F_RD], row[F_IMM], result)
+
+    def __condition(self, idx, opcode: Opcode):
+        n, z, v, c = self.flag_n[idx], self.flag_z[idx], self.flag_v[idx], self.flag_c[idx]
+        if opcode == Opcode.JMP:
+            return np.ones(len(idx), dtype=bool)
+        if opcode == Opcode.JCC:
+            return ~c
+        if opcode == Opcode.JCS:
+            return c
+        if opcode == Opcode.JEQ:
+            return z
+        if opcode == Opcode.JNE:
+            return ~z
+        if opcode == Opcode.JLT:
+            return n != v
+        if opcode == Opcode.JGT:
+            return ~z & (n == v)
+        if opcode == Opcode.JLE:
+            return z | (n != v)
+        return n == v
+
+    def __block(self, idx, opcode: Opcode, row):
+        """outs/outsb/movs/fills: по ячейке (символу) за итерацию, экземпляры с меньшей длиной замаскированы"""
+        if opcode in (Opcode.OUTS, Opcode.OUTSB):
+            src = self.regs[idx, row[F_RS1]] + 1
+            count = np.maximum(self.__signed(self.__load(idx, src - 1)), 0)
+            count = np.where(self.__output_full(idx, count), 0, count)
+        else:
+            dst = self.regs[idx, row[F_RD]]
+            src = self.regs[idx, row[F_RS1]]
+            count = np.maximum(self.__signed(self.regs[idx, row[F_RS2]]), 0)
+
+        self.ticks[idx] += np.fromiter((block_ticks(opcode, n) for n in count.tolist()), dtype=np.int64, count=len(idx))
+
+        for k in range(int(count.max(initial=0))):
+            active = count > k
+            sub = idx[active]
+            if opcode == Opcode.OUTS:
+                self.__port_write(sub, row[F_PORT], self.__load(sub, src[active] + k))
+            elif opcode == Opcode.OUTSB:
+                self.__port_write(sub, row[F_PORT], self.__load_byte(sub, src[active] * BYTES_PER_WORD + k))
+            elif opcode == Opcode.MOVS:
+                self.__store(sub, dst[active] + k, self.__load(sub, src[active] + k))
+            else:
+                self.__store(sub, dst[active] + k, src[active])
+
+    def __interrupts(self):
+        pending = (self.status == STATUS_RUNNING) & self.ie & ~self.in_interrupt & (self.irq_tick <= self.ticks)
+        if not pending.any():
+            return
+
+        idx = np.nonzero(pending)[0]
+        self.spc[idx] = self.pc[idx]
+        self.regs[np.ix_(idx, SHADOW_REGS)] = self.regs[np.ix_(idx, SAVED_REGS)]
+        self.pc[idx] = VECTOR_BASE + self.irq_port[idx]
+        self.in_interrupt[idx] = True
+        for k in idx.tolist():
+            self.buses[k].intack(int(self.irq_port[k]), int(self.ticks[k]))
+            self.__poll(k)
+        self.ticks[idx] += INTERRUPT_TICKS
+
+    # ---- execution ----
+
+    def step(self) -> bool:
+        """Исполняет одну инструкцию для всех экземпляров с минимальным PC"""
+        self.__interrupts()
+
+        running = self.status == STATUS_RUNNING
+        if not running.any():
+            return False
+
+        pc = int(self.pc[running].min())
+        idx = np.nonzero(running & (self.pc == pc))[0]
+
+        if not 0 <= pc < self.code_words or self.opcodes[pc] is None or self.rows[pc][F_OPCODE] == NO_INSTRUCTION:
+            self.__fail(idx, f"некорректная инструкция по адресу {pc}!")
+            return True
+
+        opcode = self.opcodes[pc]
+        row = self.rows[pc]
+        traced = bool(self.trace_hooks) and bool((idx == self.trace_instance).any())
+        if traced:
+            k = self.trace_instance
+            tick, regs = int(self.ticks[k]), self.regs[k].copy()
+            self.mem_writes = []
+
+        self.__execute(idx, pc, opcode, row)
+
+        if traced:
+            self.__trace(pc, row, tick, regs)
+        return True
+
+    def __trace(self, pc: int, row, tick: int, regs):
+        k = self.trace_instance
+        immediate = self.words[pc + 1] if row[F_LEN] == 2 else None
+        flags = (
+            FLAG_N * bool(self.flag_n[k]) | FLAG_Z * bool(self.flag_z[k]) | FLAG_V * bool(self.flag_v[k])
+            | FLAG_C * bool(self.flag_c[k]) | FLAG_IE * bool(self.ie[k])
+        )
+        reg_deltas = [(reg, int(self.regs[k, reg])) for reg in np.nonzero(self.regs[k] != regs)[0].tolist()]
+        mem_writes, self.mem_writes = self.mem_writes, None
+        for hook in self.trace_hooks:
+            hook(tick, pc, self.words[pc], immediate, flags, reg_deltas, mem_writes)
+
+    def __execute(self, idx, pc: int, opcode: Opcode, row):
+        next_pc = pc + row[F_LEN]
+        self.ticks[idx] += self.row_ticks[pc]
+        self.pc[idx] = next_pc
+
+        if opcode in ALU_OPS:
+            self.__alu(idx, opcode, row)
+
+        elif opcode == Opcode.MOV:
+            values = self.__read(idx, row[F_RS1_T], row[F_RS1], row[F_IMM])
+            self.__write(idx, row[F_RD_T], row[F_RD], row[F_IMM], values)
+
+        elif opcode == Opcode.PUSH_DS:
+            values = self.__read(idx, row[F_RS1_T], row[F_RS1], row[F_IMM])
+            self.regs[idx, SP_ID] -= 1
+            overflow = self.regs[idx, SP_ID] < self.stack_floor
+            if overflow.any():
+                self.__fail(idx[overflow], "переполнение стека данных!")
+            self.__store(idx, self.regs[idx, SP_ID], values)
+
+        elif opcode == Opcode.POP_DS:
+            values = self.__load(idx, self.regs[idx, SP_ID])
+            self.regs[idx, SP_ID] += 1
+            self.__write(idx, row[F_RD_T], row[F_RD], row[F_IMM], values)
+
+        elif opcode == Opcode.PUSH_RS:
+            values = self.__read(idx, row[F_RS1_T], row[F_RS1], row[F_IMM])
+            self.regs[idx, RP_ID] += 1
+            self.__store(idx, self.regs[idx, RP_ID], values)
+
+        elif opcode == Opcode.POP_RS:
+            values = self.__load(idx, self.regs[idx, RP_ID])
+            self.regs[idx, RP_ID] -= 1
+            self.__write(idx, row[F_RD_T], row[F_RD], row[F_IMM], values)
+
+        elif opcode == Opcode.RET:
+            self.pc[idx] = self.__load(idx, self.regs[idx, RP_ID])
+            self.regs[idx, RP_ID] -= 1
+
+        elif opcode == Opcode.LOOP:
+            counter = self.__load(idx, self.regs[idx, RP_ID]) - 1
+            self.__store(idx, self.regs[idx, RP_ID], counter)
+            self.pc[idx] = np.where(self.__signed(counter) > 0, row[F_IMM], next_pc)
+
+        elif opcode in (Opcode.JMP, Opcode.JCC, Opcode.JCS, Opcode.JEQ, Opcode.JNE,
+                        Opcode.JLT, Opcode.JGT, Opcode.JLE, Opcode.JGE):
+            taken = self.__condition(idx, opcode)
+            self.pc[idx] = np.where(taken, row[F_IMM], next_pc)
+
+        elif opcode == Opcode.OUT:
+            ok = idx[~self.__output_full(idx, 1)]
+            self.__port_write(ok, row[F_PORT], self.regs[ok, DR_ID])
+
+        elif opcode == Opcode.LDB:
+            self.regs[idx, row[F_RD]] = self.__load_byte(idx, self.regs[idx, row[F_RS1]])
+
+        elif opcode == Opcode.STB:
+            self.__store_byte(idx, self.regs[idx, row[F_RD]], self.regs[idx, row[F_RS1]])
+
+        elif opcode in (Opcode.OUTS, Opcode.MOVS, Opcode.FILLS, Opcode.OUTSB):
+            self.__block(idx, opcode, row)
+
+        elif opcode == Opcode.IN:
+            self.__port_read(idx, row[F_PORT])
+
+        elif opcode == Opcode.EN_INT:
+            self.ie[idx] = True
+
+        elif opcode == Opcode.DIS_INT:
+            self.ie[idx] = False
+
+        elif opcode == Opcode.IRET:
+            self.pc[idx] = self.spc[idx]
+            self.regs[np.ix_(idx, SAVED_REGS)] = self.regs[np.ix_(idx, SHADOW_REGS)]
+            self.in_interrupt[idx] = False
+
+        elif opcode == Opcode.HALT:
+            self.pc[idx] = pc
+            self.status[idx] = STATUS_HALTED
+
+    def run(self, max_steps: int = 10_000_000) -> List[Dict[str, Any]]:
+        steps = 0
+        while steps < max_steps and self.step():
+            steps += 1
+
+        self.status[self.status == STATUS_RUNNING] = STATUS_LIMIT
+        return self.results()
+
+    def results(self) -> List[Dict[str, Any]]:
+        results = []
+        for k in range(self.n):
+            status = STATUS_NAMES[int(self.status[k])]
+            if k in self.errors:
+                status = f"{status}: {self.errors[k]}"
+            results.append(
+                {
+                    "output": list(self.stdout[k].tokens),
+                    "ticks": int(self.ticks[k]),
+                    "status": status,
+                }
+            )
+        return results
+
+
+def run_simt(image: ProgramImage, inputs: Sequence[Sequence[int]], **options) -> List[Dict[str, Any]]:
+    max_steps = options.pop("max_steps", 10_000_000)
+    return SimtEngine(image, inputs, **options).run(max_steps)
+
+
+SCHEDULE_OPTION = "--schedule="
+TRACE_OPTION = "--trace="
+PROFILE_OPTION = "--profile="
+
+
+if __name__ == "__main__":
+    options = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    schedules = [option[len(SCHEDULE_OPTION):] for option in options if option.startswith(SCHEDULE_OPTION)]
+    traces = [option[len(TRACE_OPTION):] for option in options if option.startswith(TRACE_OPTION)]
+    profiles = [option[len(PROFILE_OPTION):] for option in options if option.startswith(PROFILE_OPTION)]
+    assert (
+        len(args) >= 1 and len(schedules) + len(traces) + len(profiles) == len(options)
+        and len(traces) <= 1 and len(profiles) <= 1
+    ), f"Неверные аргументы: simt.py [{SCHEDULE_OPTION}<schedule_file> ...] [{TRACE_OPTION}<trace_file>] " \
+       f"[{PROFILE_OPTION}<symbols_file>] (<container_file> | <instructions_file> <data_file>) [<input_string> ...]"
+
+    if is_container(args[0]):
+        program = load_image(args[0])
+        texts = args[1:]
+    else:
+        assert len(args) >= 2, "Неверные аргументы: не задан файл памяти данных"
+        program = ProgramImage.from_files(args[0], args[1])
+        texts = args[2:]
+
+    # one run per input string and per schedule file
+    runs: List[Union[List[int], ScheduledInput]] = [[ord(char) for char in text] for text in texts]
+    try:
+        runs += [ScheduledInput.from_file(path) for path in schedules]
+    except ScheduleError as error:
+        print(f"Ошибка расписания: {error}")
+        sys.exit(1)
+
+    # the trace and the profile are taken for the first run
+    hooks = []
+    trace_file = open(traces[0], "wb") if traces else None
+    recorder = TraceRecorder(sink=trace_file) if trace_file is not None else None
+    if recorder is not None:
+        hooks.append(recorder.record)
+    profiler = Profiler(load_symbol_map(profiles[0])) if profiles else None
+    if profiler is not None:
+        hooks.append(profiler.record)
+
+    results = run_simt(program, runs or [[]], trace_hooks=hooks)
+    if trace_file is not None:
+        recorder.flush()
+        trace_file.close()
+    if profiler is not None:
+        profiler.finish(results[0]["ticks"])
+
+    for result in results:
+        text = "".join(chr(token) if token < 0x110000 else f"<{token}>" for token in result["output"])
+        print(f"{result['status']:>6} {result['ticks']:>10} ticks: {text!r}")
+
+    if profiler is not None:
+        print()
+        print(profiler.report())
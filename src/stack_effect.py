@@ -0,0 +1,269 @@
+"""Статический анализ стековых эффектов.
+
+Эффект фрагмента программы -- изменение глубины стека данных и стека возвратов
+и крайние глубины, достигаемые по пути (относительно глубины на входе). Эффекты
+слов вычисляются по их телам с учётом `if/else`, `begin/until`, `times/next`,
+`>r`/`r>` и вызовов; по ним оцениваются наибольшие глубины стеков программы
+с учётом обработчиков прерываний.
+
+Глубина не ограничена статически (эффект `None`) при рекурсии, при цикле,
+увеличивающем глубину на каждой итерации, и при обработчике прерывания,
+оставляющем значения на стеке.
+"""
+
+from typing import List, Dict, Tuple, Optional, NamedTuple, Iterable
+
+from definitions import DOT_SYM, PRINT_STRING_SYM
+from ast_nodes import Body, Number, Ident, String, IfStatement, BeginLoop, TimesLoop
+
+
+class Effect(NamedTuple):
+    delta: int = 0          # data stack depth at the end, relative to the entry
+    low: int = 0            # lowest data stack depth on the way (-cells consumed)
+    high: int = 0           # highest data stack depth on the way
+    rs_delta: int = 0
+    rs_low: int = 0
+    rs_high: int = 0
+    falls: bool = True      # the end is reachable (no `_exit_`/`_iret_` on every path)
+    irets: Tuple[int, ...] = ()  # data stack depths at `_iret_`
+
+
+# (cells popped, cells pushed): every primitive pops its arguments before pushing the results
+def primitive(inputs: int, outputs: int, rs_inputs: int = 0, rs_outputs: int = 0) -> Effect:
+    return Effect(
+        outputs - inputs, -inputs, max(0, outputs - inputs),
+        rs_outputs - rs_inputs, -rs_inputs, max(0, rs_outputs - rs_inputs)
+    )
+
+
+PUSH = primitive(0, 1)
+NOTHING = Effect()
+
+PRIMITIVES: Dict[str, Effect] = {
+    DOT_SYM: primitive(1, 0),
+    "emit": primitive(1, 0),
+    "type": primitive(1, 0),
+    "ctype": primitive(1, 0),
+    "c@": primitive(1, 1),
+    "c!": primitive(2, 0),
+    "cmove": primitive(3, 0),
+    "fill": primitive(3, 0),
+    "key": primitive(0, 1),
+    "cr": NOTHING,
+    "dup": primitive(1, 2),
+    "swap": primitive(2, 2),
+    "drop": primitive(1, 0),
+    "over": primitive(2, 3),
+    "rot": primitive(3, 3),
+    "nip": primitive(2, 1),
+    ">r": primitive(1, 0, 0, 1),
+    "r>": primitive(0, 1, 1, 0),
+    "r@": primitive(0, 1, 1, 1),
+    "@": primitive(1, 1),
+    "!": primitive(2, 0),
+    "not": primitive(1, 1),
+    "neg": primitive(1, 1),
+    "_enable_int_": NOTHING,
+    "_disable_int_": NOTHING,
+    "_exit_": Effect(falls=False),
+    "_iret_": Effect(falls=False, irets=(0,)),
+}
+for word in ("+", "-", "*", "/", "mod", "and", "or", "xor", "lshift", "rshift", "=", "<", ">", "<=", ">="):
+    PRIMITIVES[word] = primitive(2, 1)
+
+
+def sequence(first: Optional[Effect], second: Optional[Effect]) -> Optional[Effect]:
+    if first is None:
+        return None
+    if not first.falls:
+        return first  # the rest is unreachable
+    if second is None:
+        return None
+
+    return Effect(
+        first.delta + second.delta,
+        min(first.low, first.delta + second.low),
+        max(first.high, first.delta + second.high),
+        first.rs_delta + second.rs_delta,
+        min(first.rs_low, first.rs_delta + second.rs_low),
+        max(first.rs_high, first.rs_delta + second.rs_high),
+        second.falls,
+        first.irets + tuple(first.delta + depth for depth in second.irets),
+    )
+
+
+# both branches of `if`; the depth after it is taken from a branch that falls through
+def join(first: Optional[Effect], second: Optional[Effect]) -> Tuple[Optional[Effect], bool]:
+    """(эффект, сбалансированы ли ветви)"""
+    if first is None or second is None:
+        return None, True
+
+    falling = [effect for effect in (first, second) if effect.falls] or [first, second]
+    balanced = len({(effect.delta, effect.rs_delta) for effect in falling}) == 1
+
+    return Effect(
+        max(effect.delta for effect in falling),
+        min(first.low, second.low),
+        max(first.high, second.high),
+        max(effect.rs_delta for effect in falling),
+        min(first.rs_low, second.rs_low),
+        max(first.rs_high, second.rs_high),
+        first.falls or second.falls,
+        first.irets + second.irets,
+    ), balanced
+
+
+# procedure call: the return address is on the return stack while the callee runs
+def call(effect: Optional[Effect]) -> Optional[Effect]:
+    if effect is None:
+        return None
+    return effect._replace(rs_high=effect.rs_high + 1, rs_low=min(0, effect.rs_low + 1))
+
+
+class StackAnalyzer:
+    """Эффекты слов и тел; предупреждения копятся в `warnings`.
+
+    - `procedures` -- слово -> тело (слова текущей единицы трансляции)
+    - `known` -- эффекты слов, определённых вне её (другие модули, стандартная библиотека);
+      слово с эффектом `None` считается неограниченным
+    - `data_symbols` -- имена констант, переменных, строк и блоков данных
+    """
+
+    def __init__(self, procedures: Dict[str, Body], known: Dict[str, Optional[Effect]], data_symbols: Iterable[str]):
+        self.procedures = procedures
+        self.known = known
+        self.data_symbols = set(data_symbols)
+        self.effects: Dict[str, Optional[Effect]] = {}
+        self.warnings: List[str] = []
+        self.active: List[str] = []
+
+    def warn(self, location, message: str):
+        self.warnings.append(f"{location}: {message}" if location is not None else message)
+
+    def word(self, name: str) -> Optional[Effect]:
+        if name in self.effects:
+            return self.effects[name]
+        if name in self.active:
+            cycle = " -> ".join(self.active[self.active.index(name):] + [name])
+            self.warn(None, f"рекурсия {cycle}: глубина стеков статически не ограничена")
+            return None
+
+        self.active.append(name)
+        effect = self.body(self.procedures[name])
+        self.active.pop()
+
+        if effect is not None and effect.falls and effect.rs_delta != 0:
+            self.warn(None, f"`{name}`: несбалансированные >r/r> ({effect.rs_delta:+d} на стеке возвратов)")
+        if effect is not None and effect.rs_low < 0:
+            self.warn(None, f"`{name}`: r>/r@ без >r снимает адрес возврата")
+
+        self.effects[name] = effect
+        return effect
+
+    def __ident(self, name: str) -> Optional[Effect]:
+        if name in PRIMITIVES:
+            return PRIMITIVES[name]
+        if name in self.procedures:
+            return call(self.word(name))
+        if name in self.known:
+            return call(self.known[name])
+        if name in self.data_symbols:
+            return PUSH
+        raise ValueError(f"неизвестное слово: {name}!")
+
+    # one iteration must leave both stacks as they were, otherwise the depth drifts
+    def __loop(self, statement, iteration: Optional[Effect], what: str) -> Optional[Effect]:
+        if iteration is None or not iteration.falls:
+            return iteration
+        if iteration.delta != 0 or iteration.rs_delta != 0:
+            self.warn(
+                statement.loc,
+                f"{what}: итерация меняет глубину стека данных на {iteration.delta:+d}, "
+                f"стека возвратов -- на {iteration.rs_delta:+d}"
+            )
+            if iteration.delta > 0 or iteration.rs_delta > 0:
+                return None
+        return iteration
+
+    def body(self, body: Body) -> Optional[Effect]:
+        effect = NOTHING
+        statements = body.statements
+        i = 0
+
+        while i < len(statements):
+            statement = statements[i]
+            i += 1
+
+            if isinstance(statement, Number):
+                step = PUSH
+
+            elif isinstance(statement, String):
+                step = NOTHING
+
+            elif isinstance(statement, IfStatement):
+                taken = self.body(statement.ifbody)
+                skipped = self.body(statement.elsebody) if statement.elsebody is not None else NOTHING
+                branches, balanced = join(taken, skipped)
+                if not balanced:
+                    self.warn(
+                        statement.loc,
+                        f"ветви if несбалансированы ({taken.delta:+d} и {skipped.delta:+d} на стеке данных)"
+                    )
+                step = sequence(primitive(1, 0), branches)
+
+            elif isinstance(statement, BeginLoop):
+                iteration = sequence(self.body(statement.body), primitive(1, 0))
+                step = self.__loop(statement, iteration, "begin/until")
+
+            elif isinstance(statement, TimesLoop):
+                iteration = self.__loop(statement, self.body(statement.body), "times/next")
+                step = sequence(sequence(primitive(1, 0, 0, 1), iteration), primitive(0, 0, 1, 0))
+
+            elif isinstance(statement, Ident) and statement.value == PRINT_STRING_SYM:
+                step = NOTHING
+                i += 1  # the string
+
+            elif isinstance(statement, Ident):
+                step = self.__ident(statement.value)
+
+            else:
+                raise ValueError(f"необработанный узел AST в анализе стека: {statement}!")
+
+            effect = sequence(effect, step)
+            if effect is None:
+                return None
+
+        return effect
+
+    def handler(self, name: str) -> Optional[Effect]:
+        """Эффект обработчика прерывания; обработчик не должен менять глубину стеков"""
+        effect = self.word(name) if name in self.procedures else self.known.get(name)
+        if effect is None:
+            return None
+
+        leaks = sorted({depth for depth in effect.irets if depth != 0} |
+                       ({effect.delta} if effect.falls and effect.delta != 0 else set()))
+        if leaks:
+            self.warn(None, f"обработчик `{name}` завершается с изменённой глубиной стека данных ({leaks})")
+            return None
+        return effect
+
+
+class StackUsage(NamedTuple):
+    data: int
+    ret: int
+
+
+def stack_usage(bodies: List[Optional[Effect]], handlers: List[Optional[Effect]]) -> Optional[StackUsage]:
+    """Наибольшие глубины стеков: тела верхнего уровня исполняются подряд,
+    обработчик прерывания может сработать в любой точке (без вложенности)"""
+    program = NOTHING
+    for effect in bodies:
+        program = sequence(program, effect)
+    if program is None or any(effect is None for effect in handlers):
+        return None
+
+    return StackUsage(
+        program.high + max((effect.high for effect in handlers), default=0),
+        program.rs_high + max((effect.rs_high for effect in handlers), default=0),
+    )
@@ -0,0 +1,277 @@
+"""Стандартная библиотека слов.
+
+Слова заранее записаны инструкциями транслятора (вручную, без прохода через
+парсер и `gen_body`); компоновщик подключает только слова, на которые ссылается программа.
+Слово, определённое в программе, перекрывает библиотечное.
+
+    print_string ( pstr -- )     вывод строки
+    print_line   ( pstr -- )     вывод строки и \\r\\n
+    print_cstring ( cstr -- )    вывод плотно упакованной строки
+    print_cline  ( cstr -- )     вывод плотно упакованной строки и \\r\\n
+    print_num    ( n -- )        вывод числа со знаком в десятичной записи
+    min          ( a b -- min )
+    max          ( a b -- max )
+    abs          ( n -- |n| )
+    move         ( src dst n -- ) копирование n ячеек, области могут перекрываться
+    erase        ( addr n -- )   обнуление n ячеек
+"""
+
+from typing import List, Dict, Any, Callable
+
+from isa import Opcode, Register
+from definitions import *
+from codegen import Emitter, STDOUT_PORT
+from stack_effect import Effect, primitive
+
+
+STDLIB_NAME = "stdlib"
+
+EAX = Register.EAX
+EBX = Register.EBX
+ECX = Register.ECX
+EDX = Register.EDX
+DR = Register.DR
+SP = Register.SP
+
+MINUS_CHAR = 45
+ZERO_CHAR = 48
+
+
+def __pop(reg: Register) -> Dict[str, Any]:
+    return {"opcode": Opcode.POP_DS, "rd_addr_t": REG_TO_REG_ADDR_T, "rd": reg}
+
+
+def __push(reg: Register) -> Dict[str, Any]:
+    return {"opcode": Opcode.PUSH_DS, "rs1_addr_t": REG_TO_REG_ADDR_T, "rs1": reg}
+
+
+def __mov_imm(reg: Register, value: int) -> Dict[str, Any]:
+    return {"opcode": Opcode.MOV, "rd_addr_t": REG_TO_REG_ADDR_T, "rs1_addr_t": IMMEDIATE_ADDR_T, "rd": reg, "imm": value}
+
+
+def __mov(dst: Register, src: Register) -> Dict[str, Any]:
+    return {"opcode": Opcode.MOV, "rd_addr_t": REG_TO_REG_ADDR_T, "rs1_addr_t": REG_TO_REG_ADDR_T, "rd": dst, "rs1": src}
+
+
+# mov reg, [addr]
+def __load(reg: Register, addr: Register) -> Dict[str, Any]:
+    return {"opcode": Opcode.MOV, "rd_addr_t": REG_TO_REG_ADDR_T, "rs1_addr_t": INDIRECT_ADDR_T, "rd": reg, "rs1": addr}
+
+
+# mov [addr], reg
+def __store(addr: Register, reg: Register) -> Dict[str, Any]:
+    return {"opcode": Opcode.MOV, "rd_addr_t": INDIRECT_ADDR_T, "rs1_addr_t": REG_TO_REG_ADDR_T, "rd": addr, "rs1": reg}
+
+
+def __alu(opcode: Opcode, dst: Register, src1: Register, src2: Register) -> Dict[str, Any]:
+    return {
+        "opcode": opcode,
+        "rd_addr_t": REG_TO_REG_ADDR_T, "rs1_addr_t": REG_TO_REG_ADDR_T, "rs2_addr_t": REG_TO_REG_ADDR_T,
+        "rd": dst, "rs1": src1, "rs2": src2
+    }
+
+
+def __alu_imm(opcode: Opcode, dst: Register, src: Register, value: int) -> Dict[str, Any]:
+    return {
+        "opcode": opcode,
+        "rd_addr_t": REG_TO_REG_ADDR_T, "rs1_addr_t": REG_TO_REG_ADDR_T, "rs2_addr_t": IMMEDIATE_ADDR_T,
+        "rd": dst, "rs1": src, "imm": value & 0xFFFFFFFF
+    }
+
+
+def __cmp(src1: Register, src2: Register) -> Dict[str, Any]:
+    return {"opcode": Opcode.CMP, "rs1_addr_t": REG_TO_REG_ADDR_T, "rs2_addr_t": REG_TO_REG_ADDR_T, "rs1": src1, "rs2": src2}
+
+
+def __cmp_imm(src: Register, value: int) -> Dict[str, Any]:
+    return {"opcode": Opcode.CMP, "rs1_addr_t": REG_TO_REG_ADDR_T, "rs2_addr_t": IMMEDIATE_ADDR_T, "rs1": src, "imm": value & 0xFFFFFFFF}
+
+
+def __out_char(char: int) -> List[Dict[str, Any]]:
+    return [__mov_imm(DR, char), {"opcode": Opcode.OUT, "port": STDOUT_PORT}]
+
+
+#   pop EAX
+#   outs/outsb EAX
+def __out_string(em: Emitter, opcode: Opcode):
+    em.emit(__pop(EAX))
+    em.emit({"opcode": opcode, "rs1": EAX, "port": STDOUT_PORT})
+
+
+def __out_line(em: Emitter, opcode: Opcode):
+    __out_string(em, opcode)
+    for instruction in __out_char(CR_CHAR) + __out_char(NL_CHAR):
+        em.emit(instruction)
+
+
+def __print_string(em: Emitter):
+    __out_string(em, Opcode.OUTS)
+
+
+def __print_line(em: Emitter):
+    __out_line(em, Opcode.OUTS)
+
+
+def __print_cstring(em: Emitter):
+    __out_string(em, Opcode.OUTSB)
+
+
+def __print_cline(em: Emitter):
+    __out_line(em, Opcode.OUTSB)
+
+
+# digits of -|n| (covers -2^31), remainders are taken via mul instead of a second division:
+#       pop EAX
+#       mov ECX, #0             ; digit count
+#       cmp EAX, #0
+#       jlt .neg
+#       neg EAX
+#       jmp .digits
+#   .neg:
+#       '-' -> STDOUT
+#   .digits:
+#       div EDX, EAX, #10
+#       mul EBX, EDX, #10
+#       sub EBX, EBX, EAX       ; -(n mod 10)
+#       add EBX, EBX, #'0'
+#       push_ds EBX
+#       add ECX, ECX, #1
+#       mov EAX, EDX
+#       cmp EAX, #0
+#       jne .digits
+#   .out:
+#       pop_ds DR -> STDOUT
+#       sub ECX, ECX, #1
+#       jne .out
+def __print_num(em: Emitter):
+    em.emit(__pop(EAX))
+    em.emit(__mov_imm(ECX, 0))
+    em.emit(__cmp_imm(EAX, 0))
+    em.emit_jmp_to_label("print_num.neg", Opcode.JLT)
+    em.emit({"opcode": Opcode.NEG, "rd_addr_t": REG_TO_REG_ADDR_T, "rs1_addr_t": REG_TO_REG_ADDR_T, "rd": EAX, "rs1": EAX})
+    em.emit_jmp_to_label("print_num.digits", Opcode.JMP)
+
+    em.mark("print_num.neg")
+    for instruction in __out_char(MINUS_CHAR):
+        em.emit(instruction)
+
+    em.mark("print_num.digits")
+    em.emit(__alu_imm(Opcode.DIV, EDX, EAX, 10))
+    em.emit(__alu_imm(Opcode.MUL, EBX, EDX, 10))
+    em.emit(__alu(Opcode.SUB, EBX, EBX, EAX))
+    em.emit(__alu_imm(Opcode.ADD, EBX, EBX, ZERO_CHAR))
+    em.emit(__push(EBX))
+    em.emit(__alu_imm(Opcode.ADD, ECX, ECX, 1))
+    em.emit(__mov(EAX, EDX))
+    em.emit(__cmp_imm(EAX, 0))
+    em.emit_jmp_to_label("print_num.digits", Opcode.JNE)
+
+    em.mark("print_num.out")
+    em.emit(__pop(DR))
+    em.emit({"opcode": Opcode.OUT, "port": STDOUT_PORT})
+    em.emit(__alu_imm(Opcode.SUB, ECX, ECX, 1))
+    em.emit_jmp_to_label("print_num.out", Opcode.JNE)
+
+
+# second operand stays in place at [SP] unless it is replaced:
+#       pop EBX
+#       mov EAX, [SP]
+#       cmp EAX, EBX
+#       j<keep> .end
+#       mov [SP], EBX
+#   .end:
+def __select(em: Emitter, word: str, keep: Opcode):
+    em.emit(__pop(EBX))
+    em.emit(__load(EAX, SP))
+    em.emit(__cmp(EAX, EBX))
+    em.emit_jmp_to_label(f"{word}.end", keep)
+    em.emit(__store(SP, EBX))
+    em.mark(f"{word}.end")
+
+
+def __min(em: Emitter):
+    __select(em, "min", Opcode.JLE)
+
+
+def __max(em: Emitter):
+    __select(em, "max", Opcode.JGE)
+
+
+def __abs(em: Emitter):
+    em.emit(__load(EAX, SP))
+    em.emit(__cmp_imm(EAX, 0))
+    em.emit_jmp_to_label("abs.end", Opcode.JGE)
+    em.emit({"opcode": Opcode.NEG, "rd_addr_t": REG_TO_REG_ADDR_T, "rs1_addr_t": REG_TO_REG_ADDR_T, "rd": EAX, "rs1": EAX})
+    em.emit(__store(SP, EAX))
+    em.mark("abs.end")
+
+
+# movs copies forward; dst inside (src, src+n) is copied backward cell by cell
+def __move(em: Emitter):
+    em.emit(__pop(ECX))
+    em.emit(__pop(EBX))
+    em.emit(__pop(EAX))
+    em.emit(__cmp(EBX, EAX))
+    em.emit_jmp_to_label("move.forward", Opcode.JLE)
+    em.emit(__alu(Opcode.ADD, EDX, EAX, ECX))
+    em.emit(__cmp(EBX, EDX))
+    em.emit_jmp_to_label("move.forward", Opcode.JGE)
+
+    em.emit(__alu(Opcode.ADD, EBX, EBX, ECX))
+    em.mark("move.backward")
+    em.emit(__alu_imm(Opcode.SUB, EDX, EDX, 1))
+    em.emit(__alu_imm(Opcode.SUB, EBX, EBX, 1))
+    em.emit(__load(EAX, EDX))
+    em.emit(__store(EBX, EAX))
+    em.emit(__alu_imm(Opcode.SUB, ECX, ECX, 1))
+    em.emit_jmp_to_label("move.backward", Opcode.JGT)
+    em.emit({"opcode": Opcode.RET})
+
+    em.mark("move.forward")
+    em.emit(__alu(Opcode.MOVS, EBX, EAX, ECX))
+
+
+def __erase(em: Emitter):
+    em.emit(__pop(ECX))
+    em.emit(__pop(EBX))
+    em.emit(__mov_imm(EAX, 0))
+    em.emit(__alu(Opcode.FILLS, EBX, EAX, ECX))
+
+
+WORDS: Dict[str, Callable[[Emitter], None]] = {
+    "print_string": __print_string,
+    "print_line": __print_line,
+    "print_cstring": __print_cstring,
+    "print_cline": __print_cline,
+    "print_num": __print_num,
+    "min": __min,
+    "max": __max,
+    "abs": __abs,
+    "move": __move,
+    "erase": __erase,
+}
+
+STACK_EFFECTS: Dict[str, Effect] = {
+    "print_string": primitive(1, 0),
+    "print_line": primitive(1, 0),
+    "print_cstring": primitive(1, 0),
+    "print_cline": primitive(1, 0),
+    "print_num": Effect(delta=-1, low=-1, high=9),  # up to 10 digits of -2^31 after the pop
+    "min": primitive(2, 1),
+    "max": primitive(2, 1),
+    "abs": primitive(1, 1),
+    "move": primitive(3, 0),
+    "erase": primitive(2, 0),
+}
+
+
+def emit_words(em: Emitter, words: List[str]):
+    """Процедуры библиотечных слов `words`"""
+    for word in words:
+        if word not in WORDS:
+            raise ValueError(f"слова `{word}` нет в стандартной библиотеке!")
+        em.mark(word)
+        WORDS[word](em)
+        em.emit(
+            {"opcode": Opcode.RET}
+        )
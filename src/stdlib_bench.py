@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+"""Сравнение слов стандартной библиотеки с наивными определениями на Forth.
+
+Для каждого слова одна и та же программа транслируется дважды: с наивным
+определением слова (оно перекрывает библиотечное) и без него. Печатается
+таблица тактов и размера кода; выводы обеих версий должны совпадать.
+Аргументы чистых слов берутся из счётчика цикла, иначе вызовы вычисляются
+при трансляции (см. `partial_eval.py`).
+"""
+
+import contextlib
+import io
+from typing import List, Dict, Tuple
+
+from isa import to_bytes as isa_to_bytes
+from tokenizer import tokenize
+from parser import Parser
+from linker import compile_program
+from image import ProgramImage
+from simt import run_simt
+from translator import data_to_bytes
+
+
+NAIVE_PRINT_STRING = ": print_string dup @ swap 1 + swap times dup @ emit 1 + next drop ;"
+
+NAIVE_WORDS: Dict[str, str] = {
+    "print_string": NAIVE_PRINT_STRING,
+    "print_line": NAIVE_PRINT_STRING + "\n: print_line print_string cr ;",
+    "print_num": ": print_digits dup 10 / dup if print_digits else drop then 10 mod 48 + emit ;\n"
+                 ": print_num dup 0 < if 45 emit neg then print_digits ;",
+    "min": ": min over over > if swap then drop ;",
+    "max": ": max over over < if swap then drop ;",
+    "abs": ": abs dup 0 < if neg then ;",
+    "move": ": move times over @ over ! 1 + swap 1 + swap next drop drop ;",
+    "erase": ": erase times 0 over ! 1 + next drop ;",
+}
+
+BENCHMARKS: Dict[str, str] = {
+    "print_string": 'str s "benchmark"\n10 times s print_string next',
+    "print_line": 'str s "benchmark"\n10 times s print_line next',
+    "print_num": "10 times 0 123456 - print_num 7 print_num next",
+    "min": "10 times r@ 5 min 5 r@ min + . next",
+    "max": "10 times r@ 5 max 5 r@ max + . next",
+    "abs": "10 times 5 r@ - abs r@ abs + . next",
+    "move": "alloc buf 64\n10 times buf buf 32 + 32 move next buf 40 + @ .",
+    "erase": "alloc buf 64\n10 times buf 64 erase next buf 40 + @ .",
+}
+
+
+def run_source(source: str) -> Tuple[Dict, int]:
+    """(результат прогона, размер кода в словах)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        code, dm, _ = compile_program(Parser(tokenize(source)).parse())
+
+    image = ProgramImage.from_bytes(isa_to_bytes(code), data_to_bytes(dm.words(), dm.bss_size))
+    return run_simt(image, [[]])[0], image.code_words
+
+
+def benchmark() -> List[Tuple[str, int, int, int, int]]:
+    """(слово, такты наивной версии, такты библиотечной, слова кода наивной, библиотечной)"""
+    rows = []
+    for word, program in BENCHMARKS.items():
+        naive, naive_size = run_source(NAIVE_WORDS[word] + "\n" + program)
+        library, library_size = run_source(program)
+
+        for result in (naive, library):
+            if result["status"] != "ok":
+                raise RuntimeError(f"{word}: {result['status']}")
+        if naive["output"] != library["output"]:
+            raise RuntimeError(f"{word}: вывод библиотечной версии отличается от наивной!")
+
+        rows.append((word, naive["ticks"], library["ticks"], naive_size, library_size))
+    return rows
+
+
+def report(rows: List[Tuple[str, int, int, int, int]]) -> str:
+    lines = [
+        "| слово | такты (Forth) | такты (stdlib) | ускорение | код (Forth) | код (stdlib) |",
+        "|---|---|---|---|---|---|",
+    ]
+    for word, naive_ticks, library_ticks, naive_size, library_size in rows:
+        lines.append(
+            f"| `{word}` | {naive_ticks} | {library_ticks} | {naive_ticks / library_ticks:.2f}x "
+            f"| {naive_size} | {library_size} |"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    print(report(benchmark()))
@@ -0,0 +1,85 @@
+"""Потактовая модель стоимости инструкций.
+
+Инструкция стоит:
+    FETCH_TICKS на каждое машинное слово (im_read + latch_ir)
+  + EXECUTE_TICKS[opcode] (по умолчанию 1 такт)
+  + MEMORY_TICKS на каждое обращение к памяти данных (latch_ar + dm_read/dm_store):
+    косвенные операнды и работа со стеками
+"""
+
+from typing import Dict
+
+from isa import Opcode, addr_kind, opcode_uses_rd, opcode_uses_rs1, opcode_uses_rs2
+from definitions import *
+
+
+FETCH_TICKS = 1
+MEMORY_TICKS = 1
+DEFAULT_EXECUTE_TICKS = 1
+INTERRUPT_TICKS = 2  # intack + latch_spc/next_pc_int_vector
+
+EXECUTE_TICKS: Dict[Opcode, int] = {
+    Opcode.MUL: 4,
+    Opcode.DIV: 8,
+    Opcode.MOD: 8,
+}
+
+# implicit data memory accesses: stacks, length word of outs/outsb, byte access
+STACK_ACCESSES: Dict[Opcode, int] = {
+    Opcode.OUTS: 1,
+    Opcode.OUTSB: 1,
+    Opcode.LDB: 1,
+    Opcode.STB: 2,  # read-modify-write of the word holding the byte
+    Opcode.PUSH_DS: 1,
+    Opcode.POP_DS: 1,
+    Opcode.PUSH_RS: 1,
+    Opcode.POP_RS: 1,
+    Opcode.RET: 1,
+    Opcode.LOOP: 2,  # read-modify-write of the counter at M[RP]
+}
+
+# per cell: outs -- read + out, movs -- read + store, fills -- store;
+# outsb -- out per character, one read per BYTES_PER_WORD characters
+BLOCK_TICKS: Dict[Opcode, int] = {
+    Opcode.OUTS: MEMORY_TICKS + 1,
+    Opcode.MOVS: 2 * MEMORY_TICKS,
+    Opcode.FILLS: MEMORY_TICKS,
+    Opcode.OUTSB: 1,
+}
+
+MEMORY_ADDR_T = (
+    addr_kind[INDIRECT_ADDR_T],
+    addr_kind[INDIRECT_IMM_OFFSET_ADDR_T],
+)
+
+
+def memory_accesses(opcode: Opcode, rd_addr_t: int, rs1_addr_t: int, rs2_addr_t: int) -> int:
+    accesses = STACK_ACCESSES.get(opcode, 0)
+
+    if opcode_uses_rd(opcode) and rd_addr_t in MEMORY_ADDR_T:
+        accesses += 1
+    if opcode_uses_rs1(opcode) and rs1_addr_t in MEMORY_ADDR_T:
+        accesses += 1
+    if opcode_uses_rs2(opcode) and rs2_addr_t in MEMORY_ADDR_T:
+        accesses += 1
+
+    return accesses
+
+
+def instruction_ticks(opcode: Opcode, length: int,
+                      rd_addr_t: int = 0, rs1_addr_t: int = 0, rs2_addr_t: int = 0) -> int:
+    """Число тактов инструкции длиной `length` слов (типы адресации -- коды из `isa.addr_kind`)"""
+    return (
+        FETCH_TICKS * length
+        + EXECUTE_TICKS.get(opcode, DEFAULT_EXECUTE_TICKS)
+        + MEMORY_TICKS * memory_accesses(opcode, rd_addr_t, rs1_addr_t, rs2_addr_t)
+    )
+
+
+def block_ticks(opcode: Opcode, count: int) -> int:
+    """Переменная часть стоимости блочной инструкции над `count` ячейками"""
+    count = max(count, 0)
+    ticks = BLOCK_TICKS.get(opcode, 0) * count
+    if opcode == Opcode.OUTSB:
+        ticks += MEMORY_TICKS * -(-count // BYTES_PER_WORD)
+    return ticks
@@ -1,9 +1,23 @@
+import bisect
 from enum import Enum
-from typing import List
+from typing import List, NamedTuple, Optional, Tuple
 
 from definitions import *
 
 
+class SourceLocation(NamedTuple):
+    file: str
+    line: int
+    col: int
+
+    def __str__(self):
+        return f"{self.file}:{self.line}:{self.col}"
+
+    @property
+    def position(self) -> Tuple[str, int]:
+        return self.file, self.line
+
+
 class TokenType(str, Enum):
     NUMBER = "NUMBER"
     WORD = "WORD"
@@ -15,21 +29,37 @@ class TokenType(str, Enum):
 
 
 class Token:
-    def __init__(self, kind: TokenType, value: str):
+    def __init__(self, kind: TokenType, value: str, loc: Optional[SourceLocation] = None):
         self.kind = kind
         self.value = value
+        self.loc = loc
 
     def __repr__(self):
         return f"Token({self.kind}, {self.value})"
 
 
-def tokenize(source: str) -> List[Token]:
+# output line of the preprocessor -> (file, line) of its origin
+LineMap = List[Tuple[str, int]]
+
+
+def tokenize(source: str, file: str = None, line_map: Optional[LineMap] = None) -> List[Token]:
+    """Токены с позициями: `file` -- имя файла текста, `line_map` -- исходные позиции строк
+    текста после препроцессора (см. `preprocess`)"""
     tokens: List[Token] = list()
     i = 0
     source_len = len(source)
-    
+    line_starts = [0] + [k + 1 for k, char in enumerate(source) if char == NEWLINE_SYM]
+
+    def locate(start: int) -> SourceLocation:
+        line = bisect.bisect_right(line_starts, start)
+        col = start - line_starts[line - 1] + 1
+        if line_map is not None and line <= len(line_map):
+            return SourceLocation(line_map[line - 1][0], line_map[line - 1][1], col)
+        return SourceLocation(file, line, col)
+
     while i < source_len:
         char = source[i] 
+        token_start = i
 
         if char.isspace():
             i += 1
@@ -44,7 +74,7 @@ def tokenize(source: str) -> List[Token]:
                 raise SyntaxError("нет закрывающей кавычки для строкового литерала!")
 
             string_literal = source[start : i]
-            string_literal_token = Token(TokenType.STRING, string_literal)
+            string_literal_token = Token(TokenType.STRING, string_literal, locate(token_start))
             tokens.append(string_literal_token)
             i += 1 # skip closing quote
 
@@ -54,7 +84,7 @@ def tokenize(source: str) -> List[Token]:
             i + 1 < source_len and \
             source[i + 1] == STRING_QUOTE:
             
-            print_string_token = Token(TokenType.SYM, source[i : i + 2])
+            print_string_token = Token(TokenType.SYM, source[i : i + 2], locate(token_start))
             tokens.append(print_string_token)
             i += 2
 
@@ -65,7 +95,7 @@ def tokenize(source: str) -> List[Token]:
                 raise SyntaxError("нет закрывающей кавычки для строки на вывод!")
 
             string_to_print = source[start : i]
-            string_to_print_token = Token(TokenType.STRING, string_to_print)
+            string_to_print_token = Token(TokenType.STRING, string_to_print, locate(start))
             tokens.append(string_to_print_token)
             i += 1
             
@@ -96,6 +126,20 @@ def tokenize(source: str) -> List[Token]:
 
             continue
 
+        compound = next(
+            (
+                word for word in COMPOUND_WORDS
+                if source.startswith(word, i) and
+                (i + len(word) >= source_len or source[i + len(word)].isspace())
+            ),
+            None
+        )
+        if compound:
+            tokens.append(Token(TokenType.WORD, compound, locate(token_start)))
+            i += len(compound)
+
+            continue
+
         if char == ZERO_SYM and i + 1 < source_len:
             if (source[i + 1] == X_SYM):
                 i += 2
@@ -108,7 +152,7 @@ def tokenize(source: str) -> List[Token]:
                     i += 1
 
                 hex_str = source[hex_digit_start : i]
-                hex_digit_token = Token(TokenType.NUMBER, int(hex_str, 16))
+                hex_digit_token = Token(TokenType.NUMBER, int(hex_str, 16), locate(token_start))
                 tokens.append(hex_digit_token)
 
                 continue
@@ -119,7 +163,7 @@ def tokenize(source: str) -> List[Token]:
             while i < source_len and source[i].isdigit():
                 i += 1
 
-            digit_token = Token(TokenType.NUMBER, source[digit_start : i])
+            digit_token = Token(TokenType.NUMBER, source[digit_start : i], locate(token_start))
             tokens.append(digit_token)
 
             continue
@@ -130,12 +174,12 @@ def tokenize(source: str) -> List[Token]:
             while i < source_len and (source[i].isalnum() or source[i] == '_'):
                 i += 1
 
-            word_token = Token(TokenType.WORD, source[word_start : i])
+            word_token = Token(TokenType.WORD, source[word_start : i], locate(token_start))
             tokens.append(word_token)
 
             continue
 
-        tokens.append(Token(TokenType.SYM, char))
+        tokens.append(Token(TokenType.SYM, char, locate(token_start)))
         i += 1
 
     return tokens
\ No newline at end of file
@@ -0,0 +1,224 @@
+#!/usr/bin/python3
+
+import struct
+import sys
+from typing import List, Dict, Any, Tuple, Iterator, Iterable, BinaryIO
+
+from isa import format_instruction, id_to_register
+
+
+TRACE_MAGIC = b"FTRC"
+TRACE_VERSION = 1
+
+REG_SLOTS = 3
+MEM_SLOTS = 2
+
+# header: magic, version, record size
+HEADER = struct.Struct(">4sHH")
+
+# record (big-endian, fixed size):
+#   tick, pc, instruction word, immediate,
+#   flags (NZVC + IE), has_imm, regs count, mem writes count,
+#   reg ids[REG_SLOTS], reg values[REG_SLOTS],
+#   (mem addr, mem value)[MEM_SLOTS]
+RECORD = struct.Struct(
+    ">QIIIBBBB"
+    + "B" * REG_SLOTS + "x"
+    + "I" * REG_SLOTS
+    + "II" * MEM_SLOTS
+)
+RECORD_SIZE = RECORD.size
+
+FLAG_N = 1 << 3
+FLAG_Z = 1 << 2
+FLAG_V = 1 << 1
+FLAG_C = 1 << 0
+FLAG_IE = 1 << 4
+
+
+class TraceRecorder:
+    """Запись журнала исполнения в кольцевой буфер записей фиксированного размера.
+
+    Буфер выделяется один раз; при заполнении он целиком сбрасывается в `sink`
+    (если он задан), иначе самые старые записи перезаписываются.
+    Запись включается диапазонами тактов `tick_ranges` ([start, end) для каждого)
+    и/или точками останова: `start_pcs` включает запись, `stop_pcs` -- выключает.
+    Если не задано ни одно условие, записываются все такты.
+    """
+
+    def __init__(self, capacity: int = 65536, sink: BinaryIO = None,
+                 tick_ranges: Iterable[Tuple[int, int]] = (),
+                 start_pcs: Iterable[int] = (), stop_pcs: Iterable[int] = ()):
+        if capacity <= 0:
+            raise ValueError(f"размер буфера трассы должен быть положительным: {capacity}!")
+
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * RECORD_SIZE)
+        self.head = 0   # index of the next record slot
+        self.count = 0  # records currently held in the buffer
+        self.dropped = 0
+        self.sink = sink
+        self.header_written = False
+
+        self.tick_ranges = sorted(tick_ranges)
+        self.start_pcs = set(start_pcs)
+        self.stop_pcs = set(stop_pcs)
+        self.armed = not self.start_pcs
+
+    def enabled(self, tick: int, pc: int) -> bool:
+        if pc in self.start_pcs:
+            self.armed = True
+        elif pc in self.stop_pcs:
+            self.armed = False
+
+        if not self.armed:
+            return False
+
+        if not self.tick_ranges:
+            return True
+
+        for start, end in self.tick_ranges:
+            if start <= tick < end:
+                return True
+        return False
+
+    def record(self, tick: int, pc: int, word: int, immediate: int = None, flags: int = 0,
+               reg_deltas: List[Tuple[int, int]] = (), mem_writes: List[Tuple[int, int]] = ()):
+        if not self.enabled(tick, pc):
+            return
+
+        if self.count == self.capacity:
+            if self.sink is not None:
+                self.flush()
+            else:
+                self.dropped += 1
+                self.count -= 1
+
+        reg_ids = [0] * REG_SLOTS
+        reg_values = [0] * REG_SLOTS
+        for slot, (reg, value) in enumerate(reg_deltas[:REG_SLOTS]):
+            reg_ids[slot] = reg & 0xFF
+            reg_values[slot] = value & 0xFFFFFFFF
+
+        mem = [0] * (2 * MEM_SLOTS)
+        for slot, (addr, value) in enumerate(mem_writes[:MEM_SLOTS]):
+            mem[2 * slot] = addr & 0xFFFFFFFF
+            mem[2 * slot + 1] = value & 0xFFFFFFFF
+
+        RECORD.pack_into(
+            self.buffer, self.head * RECORD_SIZE,
+            tick, pc & 0xFFFFFFFF, word & 0xFFFFFFFF,
+            (immediate or 0) & 0xFFFFFFFF,
+            flags & 0xFF, immediate is not None,
+            min(len(reg_deltas), 0xFF), min(len(mem_writes), 0xFF),
+            *reg_ids, *reg_values, *mem
+        )
+
+        self.head = (self.head + 1) % self.capacity
+        self.count += 1
+
+    def flush(self):
+        """Сбрасывает накопленные записи в `sink` одной операцией записи"""
+        if self.sink is None:
+            raise ValueError("для сброса трассы не задан `sink`!")
+
+        if not self.header_written:
+            self.sink.write(HEADER.pack(TRACE_MAGIC, TRACE_VERSION, RECORD_SIZE))
+            self.header_written = True
+
+        self.sink.write(self.snapshot())
+        self.count = 0
+        self.head = 0
+
+    def snapshot(self) -> bytes:
+        """Записи буфера в хронологическом порядке"""
+        first = (self.head - self.count) % self.capacity
+        view = memoryview(self.buffer)
+
+        if first + self.count <= self.capacity:
+            return bytes(view[first * RECORD_SIZE : (first + self.count) * RECORD_SIZE])
+
+        return bytes(view[first * RECORD_SIZE :]) + bytes(view[: self.head * RECORD_SIZE])
+
+    def save(self, path: str):
+        with open(path, "wb") as file:
+            file.write(HEADER.pack(TRACE_MAGIC, TRACE_VERSION, RECORD_SIZE))
+            file.write(self.snapshot())
+
+
+def iter_records(data: bytes) -> Iterator[Dict[str, Any]]:
+    for fields in RECORD.iter_unpack(data):
+        tick, pc, word, immediate, flags, has_imm, regs_count, mem_count = fields[:8]
+        reg_ids = fields[8 : 8 + REG_SLOTS]
+        reg_values = fields[8 + REG_SLOTS : 8 + 2 * REG_SLOTS]
+        mem = fields[8 + 2 * REG_SLOTS :]
+
+        yield {
+            "tick": tick,
+            "pc": pc,
+            "word": word,
+            "imm": immediate if has_imm else None,
+            "flags": flags,
+            "regs": list(zip(reg_ids, reg_values))[: min(regs_count, REG_SLOTS)],
+            "regs_count": regs_count,
+            "mem": [(mem[2 * k], mem[2 * k + 1]) for k in range(min(mem_count, MEM_SLOTS))],
+            "mem_count": mem_count,
+        }
+
+
+def read_trace(path: str, chunk_records: int = 4096) -> Iterator[Dict[str, Any]]:
+    """Лениво читает файл трассы блоками по `chunk_records` записей"""
+    with open(path, "rb") as file:
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{path}: файл трассы слишком короткий!")
+
+        magic, version, record_size = HEADER.unpack(header)
+        if magic != TRACE_MAGIC or version != TRACE_VERSION or record_size != RECORD_SIZE:
+            raise ValueError(f"{path}: неподдерживаемый формат трассы!")
+
+        while True:
+            chunk = file.read(chunk_records * RECORD_SIZE)
+            if not chunk:
+                break
+            usable = len(chunk) - len(chunk) % RECORD_SIZE
+            yield from iter_records(chunk[:usable])
+            if usable != len(chunk):
+                break
+
+
+def __format_flags(flags: int) -> str:
+    return "".join(
+        name if flags & bit else "-"
+        for name, bit in (("N", FLAG_N), ("Z", FLAG_Z), ("V", FLAG_V), ("C", FLAG_C), ("I", FLAG_IE))
+    )
+
+
+def format_record(record: Dict[str, Any]) -> str:
+    """Формат: <tick> - <pc> - <HEXCODE> - <mnemonic> | <flags> | <deltas>"""
+    mnemonic = format_instruction(record["word"], record["imm"], record["pc"])
+    line = f"{record['tick']} - {record['pc']} - {record['word']:08X} - {mnemonic}"
+
+    deltas = [
+        f"{id_to_register.get(reg, f'reg?_{reg}')}={value:08X}"
+        for reg, value in record["regs"]
+    ]
+    deltas += [f"M[{addr}]={value:08X}" for addr, value in record["mem"]]
+    if record["regs_count"] > REG_SLOTS or record["mem_count"] > MEM_SLOTS:
+        deltas.append("...")
+
+    line += f" | {__format_flags(record['flags'])}"
+    if deltas:
+        line += " | " + " ".join(deltas)
+    return line
+
+
+def decode_trace(path: str) -> Iterator[str]:
+    for record in read_trace(path):
+        yield format_record(record)
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) == 2, "Неверные аргументы: tracer.py <trace_file>"
+    for line in decode_trace(sys.argv[1]):
+        print(line)
@@ -1,14 +1,19 @@
 #!/usr/bin/python3
 
+import os
 import sys
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 
 from ast_nodes import Program
 from tokenizer import Token, tokenize
 from preprocessor import preprocess
 from parser import Parser
 from isa import to_bytes as isa_to_bytes, to_hex as isa_to_hex, Opcode
-from codegen import compile_program
+from codegen import DataLayout, ENTRY_LABEL, VECTOR_BASE, UnrollPolicy, DEFAULT_UNROLL
+from linker import compile_program, build_objects, link_modules
+from image import DATA_HEADER, DATA_MAGIC
+from container import build_container, SPACE_CODE, SPACE_DATA
+from linemap import LineTable
 
 
 def words_to_bytes_be(words: List[int]) -> bytes:
@@ -27,9 +32,16 @@ def words_to_bytes_be(words: List[int]) -> bytes:
     return bytes(out)
 
 
-def translate(source_file : str) -> Tuple[List[Dict[str, Any]], List[int]]:
-    source : str = preprocess(source_file)
-    tokens : List[Token] = tokenize(source)
+# header (magic, initialized words, bss words) + initialized words; bss is not stored
+def data_to_bytes(words: List[int], bss_size: int) -> bytes:
+    return DATA_HEADER.pack(DATA_MAGIC, len(words), bss_size) + words_to_bytes_be(words)
+
+
+def translate(source_file : str, outline: bool = False,
+              unroll: UnrollPolicy = DEFAULT_UNROLL) -> Tuple[List[Dict[str, Any]], DataLayout, Dict[str, Tuple[int, int]]]:
+    line_map: List[Tuple[str, int]] = []
+    source : str = preprocess(source_file, line_map=line_map)
+    tokens : List[Token] = tokenize(source, line_map=line_map)
     
     print(source)
     print()
@@ -43,21 +55,102 @@ def translate(source_file : str) -> Tuple[List[Dict[str, Any]], List[int]]:
     print(ast)
     print()
 
-    instructions, data_words = compile_program(ast)
+    instructions, dm, symbol_map = compile_program(ast, outline, unroll)
+    if not instructions:
+        instructions = [
+            {"opcode": Opcode.HALT}
+        ]
+
+    return instructions, dm, symbol_map
+
+
+def translate_separately(source_file: str, object_dir: str = None,
+                         outline: bool = False, unroll: UnrollPolicy = DEFAULT_UNROLL) -> Tuple[List[Dict[str, Any]], DataLayout, Dict[str, Tuple[int, int]]]:
+    """Раздельная трансляция: `#require`-модули собираются в объектные файлы
+    (пересобираются только изменившиеся) и компонуются"""
+    modules = build_objects(source_file, object_dir, unroll)
+    instructions, dm, symbol_map = link_modules(modules, outline)
     if not instructions:
         instructions = [
             {"opcode": Opcode.HALT}
         ]
 
-    return instructions, data_words
+    return instructions, dm, symbol_map
+
+
+def symbol_map_to_text(symbol_map: Dict[str, Tuple[int, int]]) -> str:
+    return "\n".join(
+        f"{start} {end} {name}"
+        for name, (start, end) in sorted(symbol_map.items(), key=lambda item: item[1])
+    )
+
+
+def container_symbols(dm: DataLayout, symbol_map: Dict[str, Tuple[int, int]]) -> List[Tuple[int, str, str, int, int]]:
+    symbols = [
+        (SPACE_CODE, "proc", name, start, end - start)
+        for name, (start, end) in sorted(symbol_map.items(), key=lambda item: item[1])
+    ]
+    symbols += [
+        (SPACE_DATA, meta["kind"], name, meta["addr"], meta.get("size", 1))
+        for name, meta in dm.symbols.items()
+    ]
+    return symbols
+
+
+# exact stack sizes for the loader, if the static analysis bounded them
+def stack_sizes(dm: DataLayout) -> Optional[Tuple[int, int]]:
+    if dm.data_stack_size is None:
+        return None
+    return dm.data_stack_size, dm.return_stack_size
+
 
+def write_listings(instructions: List[Dict[str, Any]], symbol_map: Dict[str, Tuple[int, int]], dump_file: str,
+                   line_table: LineTable) -> None:
+    listing_file = dump_file + ".hex"
+    hex_listing = isa_to_hex(instructions)
+    with open(listing_file, "w", encoding="utf-8") as file:
+        file.write(hex_listing)
+
+    symbols_file = dump_file + ".sym"
+    with open(symbols_file, "w", encoding="utf-8") as file:
+        file.write(symbol_map_to_text(symbol_map))
 
-def main(source_file: str, instr_file: str, data_file: str) -> None:
-    """Функция запуска транслятора. Параметры -- исходный и целевой файлы."""
+    lines_file = dump_file + ".lines"
+    with open(lines_file, "w", encoding="utf-8") as file:
+        file.write(line_table.to_text())
 
-    instructions, data_words = translate(source_file)
+
+def main(source_file: str, instr_file: str, data_file: str = None,
+         object_dir: str = None, outline: bool = False, unroll: UnrollPolicy = DEFAULT_UNROLL) -> None:
+    """Функция запуска транслятора. Параметры -- исходный и целевой файлы.
+
+    Без `data_file` пишется один файл-контейнер (см. `container.py`),
+    иначе -- образы памяти команд и памяти данных отдельными файлами.
+    С `object_dir` модули транслируются раздельно (см. `linker.py`),
+    с `outline` повторы кода выносятся в подпрограммы (см. `outliner.py`),
+    `unroll` -- параметры развёртки циклов `times` (см. `codegen.UnrollPolicy`).
+    """
+
+    if object_dir is not None:
+        instructions, dm, symbol_map = translate_separately(source_file, object_dir, outline, unroll)
+    else:
+        instructions, dm, symbol_map = translate(source_file, outline, unroll)
     instruction_memory_bytes = isa_to_bytes(instructions)
-    data_memory_bytes = words_to_bytes_be(data_words)
+    line_table = LineTable.from_code(instructions)
+
+    if data_file is None:
+        container = build_container(
+            instruction_memory_bytes, words_to_bytes_be(dm.words()), dm.bss_size,
+            symbol_map[ENTRY_LABEL][0], VECTOR_BASE, container_symbols(dm, symbol_map),
+            line_table.entries, line_table.files, stack_sizes(dm)
+        )
+        with open(instr_file, "wb") as file:
+            file.write(container)
+
+        write_listings(instructions, symbol_map, os.path.splitext(instr_file)[0], line_table)
+        return
+
+    data_memory_bytes = data_to_bytes(dm.words(), dm.bss_size)
 
     with open(instr_file, "wb") as file:
         file.write(instruction_memory_bytes)
@@ -69,15 +162,32 @@ def main(source_file: str, instr_file: str, data_file: str) -> None:
     if ".bin" in instr_dump_file:
         instr_dump_file = instr_dump_file.split(".bin")[0]
 
-    listing_file = instr_dump_file + ".hex"
-    hex_listing = isa_to_hex(instructions)
-    with open(listing_file, "w", encoding="utf-8") as file:
-        file.write(hex_listing)
+    write_listings(instructions, symbol_map, instr_dump_file, line_table)
+
+
+OUTLINE_FLAG = "--outline"
+OBJECT_DIR_OPTION = "--object-dir="
+UNROLL_FACTOR_OPTION = "--unroll-factor="
+UNROLL_BUDGET_OPTION = "--unroll-budget="
 
 
 if __name__ == "__main__":
+    options = [arg for arg in sys.argv[1:] if arg.startswith("--")]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    object_dirs = [arg[len(OBJECT_DIR_OPTION):] for arg in options if arg.startswith(OBJECT_DIR_OPTION)]
+    factors = [arg[len(UNROLL_FACTOR_OPTION):] for arg in options if arg.startswith(UNROLL_FACTOR_OPTION)]
+    budgets = [arg[len(UNROLL_BUDGET_OPTION):] for arg in options if arg.startswith(UNROLL_BUDGET_OPTION)]
+    usage = f"Неверные аргументы: translator.py [{OUTLINE_FLAG}] [{OBJECT_DIR_OPTION}<dir>] " \
+            f"[{UNROLL_FACTOR_OPTION}<k>] [{UNROLL_BUDGET_OPTION}<words>] " \
+            f"<input_file> (<target_container_file> | <target_instructions_file> <target_data_file>)"
     assert (
-        len(sys.argv) == 4
-    ), "Неверные аргументы: translator.py <input_file> <target_instructions_file> <target_data_file>"
-    _, source_file, target_instructions_file, target_data_file = sys.argv
-    main(source_file, target_instructions_file, target_data_file)
+        len(args) in (2, 3)
+        and set(options) <= {OUTLINE_FLAG} | {OBJECT_DIR_OPTION + d for d in object_dirs}
+        | {UNROLL_FACTOR_OPTION + k for k in factors} | {UNROLL_BUDGET_OPTION + b for b in budgets}
+        and all(value.isdigit() for value in factors + budgets)
+    ), usage
+    unroll = DEFAULT_UNROLL._replace(
+        **({"factor": int(factors[-1])} if factors else {}), **({"budget": int(budgets[-1])} if budgets else {})
+    )
+    main(*args, object_dir=object_dirs[-1] if object_dirs else None,
+         outline=OUTLINE_FLAG in options, unroll=unroll)